@@ -0,0 +1,120 @@
+"""Benchmark `.ask` quote sampling against a synthetic user_logs database.
+
+Builds a multi-million-row database (nick activity is heavily skewed, as in a
+real channel), applies the user_logs schema migrations, then compares the old
+`ORDER BY RANDOM()` query with the indexed rowid sampler used by `dot_ask`.
+
+Usage:
+    python -m benchmarks.bench_ask --rows 3000000
+    python -m benchmarks.bench_ask --db /tmp/ask_bench.db --reuse
+"""
+import argparse
+import random
+import sqlite3
+import statistics
+import string
+import tempfile
+import time
+from pathlib import Path
+
+from src.channel_functions.general import _sample_quote
+from src.client.logger import migrate_user_logs
+
+
+_OLD_QUERY = """
+    SELECT message
+    FROM user_logs
+    WHERE nick = ?
+    AND target = ?
+    AND message GLOB '[A-Za-z0-9]*'
+    ORDER BY RANDOM()
+    LIMIT 1;
+"""
+
+
+def _synthetic_rows(n_rows, n_nicks, targets, seed):
+    """Yield `(nick, target, message, timestamp)` rows with Zipf-like nick
+    frequencies and a mix of quotable and unquotable messages."""
+    rng = random.Random(seed)
+    nicks = [f"user{i}" for i in range(n_nicks)]
+    weights = [1 / (rank + 1) for rank in range(n_nicks)]
+    words = ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 8))) for _ in range(2000)]
+    chunk = 10_000
+    ts = 1.6e9
+    for start in range(0, n_rows, chunk):
+        picked = rng.choices(nicks, weights=weights, k=min(chunk, n_rows - start))
+        for nick in picked:
+            ts += rng.random() * 5
+            message = " ".join(rng.choices(words, k=rng.randint(1, 15)))
+            if rng.random() < 0.1:
+                message = ":) " + message
+            yield nick, rng.choice(targets), message, ts
+
+
+def build_db(path, n_rows, n_nicks, seed):
+    """Populate a fresh database and migrate it, returning the backfill time."""
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("CREATE TABLE user_logs (nick text, target text, message text, timestamp real)")
+    started = time.perf_counter()
+    conn.executemany("INSERT INTO user_logs VALUES (?, ?, ?, ?)",
+                     _synthetic_rows(n_rows, n_nicks, ["#main", "#side"], seed))
+    conn.commit()
+    print(f"inserted {n_rows:,} rows in {time.perf_counter() - started:.1f}s")
+    started = time.perf_counter()
+    migrate_user_logs(conn)
+    backfill = time.perf_counter() - started
+    print(f"migrated (index + quote backfill) in {backfill:.1f}s")
+    conn.close()
+
+
+def _time_calls(func, iterations):
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.99) - 1]
+
+
+def run(path, iterations):
+    conn = sqlite3.connect(path)
+    counts = conn.execute(
+        "SELECT nick, n FROM quote_counts WHERE target = '#main' ORDER BY n DESC"
+    ).fetchall()
+    total = conn.execute("SELECT COUNT(*) FROM user_logs").fetchone()[0]
+    print(f"\n{total:,} rows, {len(counts)} nicks in #main\n")
+    cases = [("busiest", counts[0][0]), ("median", counts[len(counts) // 2][0]),
+             ("quietest", counts[-1][0]), ("unknown", "nobody")]
+    print(f"{'nick':<22}{'lines':>10}{'old p50':>12}{'old p99':>12}{'new p50':>12}{'new p99':>12}")
+    for label, nick in cases:
+        n = dict(counts).get(nick, 0)
+        old = _time_calls(lambda: conn.execute(_OLD_QUERY, (nick, "#main")).fetchone(),
+                          max(3, iterations // 100))
+        new = _time_calls(lambda: _sample_quote(conn, nick, "#main"), iterations)
+        print(f"{label + ' (' + nick + ')':<22}{n:>10,}"
+              + "".join(f"{v * 1000:>10.3f}ms" for v in (*old, *new)))
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=3_000_000)
+    parser.add_argument("--nicks", type=int, default=500)
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--db", type=Path, help="database path (default: a temp file)")
+    parser.add_argument("--reuse", action="store_true", help="skip building if --db exists")
+    args = parser.parse_args()
+
+    path = args.db or Path(tempfile.mkdtemp()) / "ask_bench.db"
+    if not (args.reuse and path.exists()):
+        path.unlink(missing_ok=True)
+        build_db(path, args.rows, args.nicks, args.seed)
+    run(path, args.iterations)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Benchmark the Dispatcher's per-line dispatch path, per trigger.
+
+Handlers are not run: the pool and every actor inbox are replaced with stubs
+that only count what they receive, so the numbers are the cost of parsing,
+filtering, scanning and binding arguments for one line.
+
+Usage:
+    python -m benchmarks.bench_dispatch --iterations 50000
+"""
+import argparse
+import time
+from types import SimpleNamespace
+
+from pydantic import SecretStr
+
+from src.client.dispatcher import Dispatcher
+
+
+_CHANNEL = "#bench"
+_NICK = "garybot"
+
+LINES = {
+    "chatter": "just some ordinary chatter about nothing much at all today",
+    "imagine": "imagine unironically liking pineapple on pizza",
+    "reason": "there is no reason to do that",
+    "youtube": "check this https://www.youtube.com/watch?v=dQw4w9WgXcQ out",
+    "mention": f"{_NICK}: what do you think about that",
+    ".help": ".help",
+    ".spaghetti": ".spaghetti",
+    ".ask": ".ask somebody",
+    ".wa": ".wa distance to the moon",
+    ".apod": ".apod",
+    ".haha": ".haha",
+    ".tr": ".tr b",
+    ".sb": ".sb nfl chiefs",
+    "ping": "PING :irc.example.net",
+    "server notice": f":irc.example.net 353 {_NICK} = {_CHANNEL} :alice bob carol",
+}
+
+
+class _Sink:
+    """Stands in for an actor inbox or the greenlet pool and just counts."""
+
+    def __init__(self):
+        self.count = 0
+
+    def put(self, item, *args, **kwargs):
+        self.count += 1
+
+    def spawn(self, func, *args, **kwargs):
+        self.count += 1
+
+
+def stub_config():
+    """An app config with the fields the Dispatcher reads and dummy secrets."""
+    secret = SecretStr("bench")
+    return SimpleNamespace(
+        irc_nick=_NICK,
+        irc_main_channel=_CHANNEL,
+        channels=[_CHANNEL],
+        irc_channel_commands={},
+        irc_ignore_list="NickServ,ChanServ",
+        irc_admin_nick="",
+        dispatcher_pool_size=10,
+        convo_max_lines=50,
+        convo_max_bytes=0,
+        irc_llm_model="bench-model",
+        project_root=".",
+        wolfram_api_key=secret,
+        odds_api_key=secret,
+        llm_api_key=secret,
+        nasa_api_key=secret,
+        youtube_api_key=secret,
+    )
+
+
+def build_dispatcher(app_config=None):
+    """Build a Dispatcher whose outputs all go to counting stubs."""
+    actor = SimpleNamespace(inbox=_Sink())
+    dispatcher = Dispatcher(_Sink(), actor, actor, None, app_config or stub_config(),
+                            user_logs_db=None, http=None, llm=None, youtube=None, odds=None,
+                            metrics=None)
+    dispatcher._pool = _Sink()
+    return dispatcher
+
+
+def raw_line(text):
+    if text.startswith(("PING", ":")):
+        return text
+    return f":alice!~alice@example.com PRIVMSG {_CHANNEL} :{text}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=50_000)
+    args = parser.parse_args()
+
+    dispatcher = build_dispatcher()
+    print(f"{'trigger':<16}{'ns/line':>10}{'lines/s':>14}")
+    for trigger, text in LINES.items():
+        line = raw_line(text)
+        dispatch = dispatcher._dispatch
+        started = time.perf_counter_ns()
+        for _ in range(args.iterations):
+            dispatch(line)
+        per_line = (time.perf_counter_ns() - started) / args.iterations
+        print(f"{trigger:<16}{per_line:>10.0f}{1e9 / per_line:>14,.0f}")
+
+
+if __name__ == "__main__":
+    main()
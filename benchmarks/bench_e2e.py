@@ -0,0 +1,294 @@
+"""End-to-end load test: the real client against a local fake ircd.
+
+Starts `fake_ircd` with a throwaway TLS certificate, runs the bot as a
+subprocess (`python -m src.main`) pointed at it with temporary databases,
+then has simulated users chat in its channel at a fixed total rate. A share
+of the lines are commands that need no network (`.help`, `.spaghetti` and
+the `reason` and `imagine` passive triggers), and each reply is matched back
+to its request. The server PINGs the bot throughout to see whether
+keepalives are held up by the load, and can optionally KICK it midway to
+time the rejoin.
+
+Reports the offered and answered rates, reply latency percentiles per
+command, PONG latency and the bot's resident memory after warmup and at the
+end. Flood pacing is raised well above anything real (`--flood-rate`) so
+the Listener → Dispatcher → Writer pipeline is measured, not the pacing.
+
+Usage:
+    python -m benchmarks.bench_e2e --users 50 --rate 200 --duration 30
+    python -m benchmarks.bench_e2e --mix help=1,imagine=1 --command-share 0.5 --kick
+"""
+import argparse
+import os
+import random
+import signal
+import sys
+import tempfile
+import time
+from collections import deque
+from pathlib import Path
+
+import gevent
+from gevent import subprocess
+
+from benchmarks.fake_ircd import FakeIRCd, make_self_signed_cert
+
+
+_NICK = "benchbot"
+_CHANNEL = "#bench"
+_WORDS = ("the", "game", "last", "night", "was", "pretty", "good", "honestly", "lol", "anyway",
+          "coffee", "time", "again", "maybe", "later", "weather", "nice", "today", "what", "ok")
+
+# command kind -> a request; replies are matched back by `_reply_key`
+COMMANDS = {
+    "help": lambda user, seq: (".help", ("help", user.lower())),
+    "spaghetti": lambda user, seq: (".spaghetti", ("spaghetti",)),
+    "reason": lambda user, seq: ("there is no reason to do that", ("reason",)),
+    "imagine": lambda user, seq: (f"imagine unironically liking take {seq}",
+                                  ("imagine", f"imagine unironically liking take {seq}")),
+}
+
+
+def _reply_key(text):
+    """Work out which request a bot reply answers."""
+    if text == "REASON WILL PREVAIL":
+        return ("reason",)
+    if "spaghetti" in text.lower():
+        return ("spaghetti",)
+    if text.lower().startswith("imagine unironically"):
+        return ("imagine", text.lower())
+    nick, sep, _ = text.partition(": ")
+    if sep:
+        return ("help", nick.lower())
+    return None
+
+
+def percentile(values, q):
+    """The `q`th percentile (0-100) by nearest rank, or None if empty."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(q / 100 * len(ordered)) - 1))]
+
+
+def rss_kib(pid):
+    """A process's resident set size in KiB, from /proc (Linux only)."""
+    try:
+        for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def parse_mix(text):
+    """Parse `help=4,imagine=1` into command weights."""
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in COMMANDS:
+            raise SystemExit(f"Unknown command {name!r}; choose from {', '.join(COMMANDS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+class LoadRun:
+    """Tracks requests in flight and the replies that answer them.
+
+    Attributes:
+        pending (dict[tuple, deque[tuple[str, float]]]): Send times of
+            unanswered requests, by reply key, oldest first.
+        latencies (dict[str, list[float]]): Reply latency per command.
+        sent (int): Lines sent to the bot.
+        commands_sent (int): How many of them were commands.
+        missed (int): Lines sent while the bot wasn't in the channel (after
+            a KICK), which it never sees.
+        replies (int): Bot PRIVMSGs received.
+        unmatched (int): Replies no request was waiting for.
+        joins (list[float]): When the bot joined the channel.
+    """
+
+    def __init__(self):
+        self.pending = {}
+        self.latencies = {name: [] for name in COMMANDS}
+        self.sent = 0
+        self.commands_sent = 0
+        self.missed = 0
+        self.replies = 0
+        self.unmatched = 0
+        self.joins = []
+
+    def request(self, kind, key):
+        self.pending.setdefault(key, deque()).append((kind, time.perf_counter()))
+        self.commands_sent += 1
+
+    def on_privmsg(self, session, target, text, received_at):
+        if session.nick.lower() != _NICK:
+            return
+        self.replies += 1
+        waiting = self.pending.get(_reply_key(text))
+        if not waiting:
+            self.unmatched += 1
+            return
+        kind, sent_at = waiting.popleft()
+        self.latencies[kind].append(received_at - sent_at)
+
+    def on_join(self, session, channel):
+        if session.nick.lower() == _NICK:
+            self.joins.append(time.perf_counter())
+
+    def outstanding(self):
+        return sum(len(waiting) for waiting in self.pending.values())
+
+
+def start_bot(directory, port, cert, flood_rate):
+    """Run the client as a subprocess against the fake server."""
+    env = dict(
+        os.environ,
+        IRC_NICK=_NICK, IRC_SERVER="localhost", IRC_PORT=str(port), IRC_CA_FILE=str(cert),
+        IRC_MAIN_CHANNEL=_CHANNEL, IRC_LLM_MODEL="bench-model", IRC_ADMIN_NICK="",
+        WOLFRAM_API_KEY="bench", ODDS_API_KEY="bench", LLM_API_KEY="bench",
+        NASA_API_KEY="bench", YOUTUBE_API_KEY="bench",
+        USER_LOGS_PATH=str(directory / "user_logs.db"),
+        ODDS_HISTORY_PATH=str(directory / "odds_history.db"),
+        TRIVIA_DB_PATH=str(directory / "trivia.db"),
+        WRITER_FLOOD_RATE=str(flood_rate), WRITER_FLOOD_BURST=str(max(10, int(flood_rate))),
+    )
+    log = open(directory / "bot.log", "w")
+    root = Path(__file__).resolve().parent.parent
+    return subprocess.Popen([sys.executable, "-m", "src.main"], cwd=root, env=env,
+                            stdout=log, stderr=subprocess.STDOUT)
+
+
+def chatter(server, run, users, rate, duration, command_share, mix, rng):
+    """Send lines from random users at `rate` per second for `duration`."""
+    kinds, weights = list(mix), list(mix.values())
+    interval = 1 / rate
+    next_at = time.perf_counter()
+    deadline = next_at + duration
+    seq = 0
+    while next_at < deadline:
+        user = rng.choice(users)
+        seq += 1
+        present = _NICK in server.members.get(_CHANNEL, ())
+        if rng.random() < command_share:
+            kind = rng.choices(kinds, weights)[0]
+            text, key = COMMANDS[kind](user, seq)
+            if present:
+                run.request(kind, key)
+        else:
+            text = " ".join(rng.choices(_WORDS, k=rng.randint(3, 12)))
+        server.say(user, _CHANNEL, text)
+        run.sent += 1
+        run.missed += not present
+        next_at += interval
+        gevent.sleep(max(0.0, next_at - time.perf_counter()))
+
+
+def pinger(server, interval):
+    while True:
+        server.ping(_NICK)
+        gevent.sleep(interval)
+
+
+def _fmt_ms(seconds):
+    return "-" if seconds is None else f"{seconds * 1000:.1f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=50, help="simulated users")
+    parser.add_argument("--rate", type=float, default=200, help="channel lines per second, all users together")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of load")
+    parser.add_argument("--warmup", type=float, default=3, help="seconds of load before memory is sampled")
+    parser.add_argument("--command-share", type=float, default=0.2, help="fraction of lines that are commands")
+    parser.add_argument("--mix", default="help=4,spaghetti=2,reason=2,imagine=2", help="command weights")
+    parser.add_argument("--ping-interval", type=float, default=0.5)
+    parser.add_argument("--flood-rate", type=float, default=10_000, help="WRITER_FLOOD_RATE for the bot")
+    parser.add_argument("--kick", action="store_true", help="kick the bot halfway and time the rejoin")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    mix = parse_mix(args.mix)
+    directory = Path(tempfile.mkdtemp(prefix="bench-e2e-"))
+    cert, key = make_self_signed_cert(directory)
+    server = FakeIRCd(cert, key)
+    run = LoadRun()
+    server.on_privmsg = run.on_privmsg
+    server.on_join = run.on_join
+    server.start()
+
+    bot = start_bot(directory, server.port, cert, args.flood_rate)
+    try:
+        with gevent.Timeout(30, False):
+            while not run.joins:
+                if bot.poll() is not None:
+                    break
+                gevent.sleep(0.05)
+        if not run.joins:
+            print(f"The bot never joined {_CHANNEL}; see {directory / 'bot.log'}")
+            return
+        users = [f"user{i}" for i in range(args.users)]
+        pings = gevent.spawn(pinger, server, args.ping_interval)
+
+        chatter(server, run, users, args.rate, args.warmup, args.command_share, mix, rng)
+        for kind in run.latencies:
+            run.latencies[kind].clear()
+        run.pending.clear()
+        del server.pong_latencies[:]
+        run.sent = run.commands_sent = run.missed = run.replies = 0
+        rss_start = rss_kib(bot.pid)
+
+        kicker = None
+        if args.kick:
+            kicked_at = []
+            kicker = gevent.spawn_later(args.duration / 2, lambda: (kicked_at.append(time.perf_counter()),
+                                                                    server.kick(_CHANNEL, _NICK)))
+        started = time.perf_counter()
+        chatter(server, run, users, args.rate, args.duration, args.command_share, mix, rng)
+        elapsed = time.perf_counter() - started
+        with gevent.Timeout(10, False):
+            while run.outstanding():
+                gevent.sleep(0.05)
+        rss_end = rss_kib(bot.pid)
+        pings.kill()
+    finally:
+        bot.send_signal(signal.SIGTERM)
+        try:
+            bot.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            bot.kill()
+        server.stop()
+
+    print(f"{'lines sent':<24}{run.sent:>10}   ({run.sent / elapsed:,.0f}/s over {elapsed:.1f}s, {args.users} users)")
+    print(f"{'commands sent':<24}{run.commands_sent:>10}")
+    print(f"{'replies received':<24}{run.replies:>10}   ({run.replies / elapsed:,.1f}/s)")
+    print(f"{'unanswered':<24}{run.outstanding():>10}")
+    if args.kick:
+        print(f"{'missed while kicked':<24}{run.missed:>10}")
+    print(f"{'unmatched replies':<24}{run.unmatched:>10}")
+    print()
+    print(f"{'reply latency (ms)':<20}{'n':>8}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}")
+    every = [value for values in run.latencies.values() for value in values]
+    for name, values in [*run.latencies.items(), ("all", every)]:
+        if name != "all" and name not in mix:
+            continue
+        print(f"{name:<20}{len(values):>8}{_fmt_ms(percentile(values, 50)):>9}{_fmt_ms(percentile(values, 90)):>9}"
+              f"{_fmt_ms(percentile(values, 99)):>9}{_fmt_ms(max(values, default=None)):>9}")
+    pongs = server.pong_latencies
+    print(f"{'PONG':<20}{len(pongs):>8}{_fmt_ms(percentile(pongs, 50)):>9}{_fmt_ms(percentile(pongs, 90)):>9}"
+          f"{_fmt_ms(percentile(pongs, 99)):>9}{_fmt_ms(max(pongs, default=None)):>9}")
+    print()
+    if rss_start and rss_end:
+        print(f"{'bot RSS (MiB)':<24}{rss_start / 1024:>10.1f} -> {rss_end / 1024:.1f} "
+              f"({(rss_end - rss_start) / 1024:+.1f})")
+    if kicker is not None:
+        rejoined = [t for t in run.joins if kicked_at and t > kicked_at[0]]
+        print(f"{'rejoin after KICK':<24}{(rejoined[0] - kicked_at[0]) * 1000 if rejoined else float('nan'):>10.0f} ms")
+    print(f"bot log: {directory / 'bot.log'}")
+
+
+if __name__ == "__main__":
+    main()
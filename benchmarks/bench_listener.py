@@ -0,0 +1,114 @@
+"""Benchmark Listener line splitting on a flood of incoming lines.
+
+A fake socket replays a large burst (NAMES-style server lines and channel
+chatter, a share of it multibyte) in reads of whatever size the Listener asks
+for. The current `_recv_lines` is compared with the previous implementation,
+which decoded every chunk and re-split a growing string.
+
+Usage:
+    python -m benchmarks.bench_listener --lines 200000
+"""
+import argparse
+import random
+import socket
+import time
+
+from src.client.listener import Listener
+
+
+class FloodSocket:
+    """Serves a fixed payload through `recv`/`recv_into`, then times out."""
+
+    def __init__(self, payload):
+        self._payload = memoryview(payload)
+        self._pos = 0
+
+    def _take(self, nbytes):
+        if self._pos >= len(self._payload):
+            raise socket.timeout()
+        piece = self._payload[self._pos:self._pos + nbytes]
+        self._pos += len(piece)
+        return piece
+
+    def recv(self, nbytes):
+        return bytes(self._take(nbytes))
+
+    def recv_into(self, buffer, nbytes=0):
+        piece = self._take(nbytes or len(buffer))
+        buffer[:len(piece)] = piece
+        return len(piece)
+
+
+class LegacyListener(Listener):
+    """The str-based receive path this module replaced, kept for comparison."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._recv_buffer = ""
+
+    def _recv_lines(self):
+        try:
+            chunk = self._socket.recv(4096)
+        except socket.timeout:
+            return []
+        if not chunk:
+            raise OSError("Server closed the connection")
+        try:
+            text = chunk.decode(self._encoding)
+        except UnicodeDecodeError:
+            text = chunk.decode("latin-1")
+        self._recv_buffer += text
+        *complete, self._recv_buffer = self._recv_buffer.split("\r\n")
+        return complete
+
+
+def build_flood(n_lines, seed):
+    """Build a burst of raw IRC lines, about a fifth of them multibyte."""
+    rng = random.Random(seed)
+    words = ["hello", "netsplit", "spaghetti", "ok", "lol", "naïve", "日本語", "🍝", "ça", "reason"]
+    lines = []
+    for i in range(n_lines):
+        if i % 3 == 0:
+            names = " ".join(f"nick{rng.randrange(10_000)}" for _ in range(40))
+            lines.append(f":irc.example.net 353 garybot = #bench :{names}")
+        else:
+            text = " ".join(rng.choices(words, k=rng.randint(3, 30)))
+            lines.append(f":u{i}!~u@host.example PRIVMSG #bench :{text}")
+    payload = ("\r\n".join(lines) + "\r\n").encode("utf-8")
+    return lines, payload
+
+
+def drain(listener_cls, payload):
+    """Read the whole payload through a listener; return (lines, seconds)."""
+    listener = listener_cls(None, FloodSocket(payload), None)
+    received = []
+    started = time.perf_counter()
+    while True:
+        try:
+            lines = listener._recv_lines()
+        except OSError:
+            break
+        if not lines and listener._socket._pos >= len(payload):
+            break
+        received.extend(lines)
+    return received, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, default=200_000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    expected, payload = build_flood(args.lines, args.seed)
+    print(f"{len(expected):,} lines, {len(payload) / 1e6:.1f} MB\n")
+    print(f"{'implementation':<16}{'seconds':>10}{'lines/s':>14}{'MB/s':>10}{'mangled':>10}")
+    for name, cls in (("legacy (str)", LegacyListener), ("bytearray", Listener)):
+        received, elapsed = drain(cls, payload)
+        mangled = sum(a != b for a, b in zip(received, expected)) + abs(len(received) - len(expected))
+        print(f"{name:<16}{elapsed:>10.3f}{len(received) / elapsed:>14,.0f}"
+              f"{len(payload) / elapsed / 1e6:>10.1f}{mangled:>10,}")
+
+
+if __name__ == "__main__":
+    main()
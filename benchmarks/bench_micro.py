@@ -0,0 +1,369 @@
+"""Microbenchmarks for the pure-Python hot paths, with saved results and a
+regression check between runs.
+
+Each case times one function on fixed, offline input: IRC line parsing,
+byte-safe slicing of long replies, the Listener's chunk handling, the
+sportsbook index, lookups and formatting, and drawing a trivia question. A
+case is run in samples of enough calls to last `--min-time` seconds (with
+the garbage collector off, as `timeit` does), and the time per call of each
+sample is kept.
+
+Results can be saved as JSON (by default to `benchmarks/results/<commit>.json`)
+and compared: each case's samples from the two runs are put through a
+two-sided Mann-Whitney U test, and a case is a regression when the
+difference is significant (`--alpha`) and its median is more than
+`--threshold` slower. Timing noise alone rarely passes both. The exit status
+is 1 if anything regressed, so it can gate a commit or drive `git bisect run`.
+
+Usage:
+    python -m benchmarks.bench_micro --save
+    python -m benchmarks.bench_micro --baseline benchmarks/results/1054fc4.json
+    python -m benchmarks.bench_micro --compare old.json new.json
+    python -m benchmarks.bench_micro -k slice --samples 40
+"""
+import argparse
+import gc
+import itertools
+import json
+import math
+import platform
+import random
+import statistics
+import subprocess
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from benchmarks.bench_dispatch import build_dispatcher
+from src.channel_functions.sportsbook import _build_index, _fmt_time, _format_reply, _search
+from src.channel_functions.trivia import Trivia
+from src.client.listener import Listener
+from src.client.writer import Writer
+
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+_TEAMS = (
+    "Arizona Cardinals", "Atlanta Falcons", "Baltimore Ravens", "Buffalo Bills", "Carolina Panthers",
+    "Chicago Bears", "Cincinnati Bengals", "Cleveland Browns", "Dallas Cowboys", "Denver Broncos",
+    "Detroit Lions", "Green Bay Packers", "Houston Texans", "Indianapolis Colts", "Jacksonville Jaguars",
+    "Kansas City Chiefs", "Las Vegas Raiders", "Los Angeles Chargers", "Los Angeles Rams", "Miami Dolphins",
+    "Minnesota Vikings", "New England Patriots", "New Orleans Saints", "New York Giants", "New York Jets",
+    "Philadelphia Eagles", "Pittsburgh Steelers", "San Francisco 49ers", "Seattle Seahawks",
+    "Tampa Bay Buccaneers", "Tennessee Titans", "Washington Commanders",
+)
+_ASCII_REPLY = " ".join(["the quick brown fox jumps over the lazy dog"] * 48)
+_MULTIBYTE_REPLY = " ".join(["naïve café ça 日本語のテキスト 🍝🍝 spaghetti"] * 48)
+
+
+def _time_calls(func, args, loops):
+    """Call `func(*args)` `loops` times and return the seconds taken."""
+    repeat = itertools.repeat(None, loops)
+    started = time.perf_counter()
+    for _ in repeat:
+        func(*args)
+    return time.perf_counter() - started
+
+
+class _LoopSocket:
+    """Serves a payload through `recv_into` endlessly, wrapping around."""
+
+    def __init__(self, payload):
+        self._payload = memoryview(payload)
+        self._pos = 0
+
+    def recv_into(self, buffer, nbytes=0):
+        nbytes = nbytes or len(buffer)
+        piece = self._payload[self._pos:self._pos + nbytes]
+        buffer[:len(piece)] = piece
+        self._pos = (self._pos + len(piece)) % len(self._payload)
+        return len(piece)
+
+
+def _games():
+    """A week of games with moneyline and spread markets, soonest first."""
+    rng = random.Random(1)
+    teams = list(_TEAMS)
+    rng.shuffle(teams)
+    games = []
+    for i, (away, home) in enumerate(zip(teams[::2], teams[1::2])):
+        point = rng.choice((1.5, 2.5, 3, 3.5, 6.5, 7, 10.5))
+        games.append({
+            "id": f"game{i}",
+            "commence_time": f"2026-09-{13 + i // 8:02d}T{17 + i % 4}:{(i % 2) * 30:02d}:00Z",
+            "away_team": away,
+            "home_team": home,
+            "bookmakers": [{"markets": [
+                {"key": "h2h", "outcomes": [{"name": away, "price": rng.randint(110, 300)},
+                                            {"name": home, "price": -rng.randint(120, 350)}]},
+                {"key": "spreads", "outcomes": [{"name": away, "point": point, "price": -110},
+                                                {"name": home, "point": -point, "price": -110}]},
+            ]}],
+        })
+    return games
+
+
+def parse_case(line):
+    dispatcher = build_dispatcher()
+    return lambda loops: _time_calls(dispatcher._parse_raw_msg, (line, 0.0), loops)
+
+
+def slice_case(text, slice_size=400):
+    line_bytes = text.encode("utf-8")
+    return lambda loops: _time_calls(Writer._slice_by_bytes, (line_bytes, slice_size), loops)
+
+
+def recv_case(block):
+    """One `_recv_lines` call per loop, on a steady flood of `block`."""
+    payload = block * 64
+    listener = Listener(None, _LoopSocket(payload), None)
+    return lambda loops: _time_calls(listener._recv_lines, (), loops)
+
+
+def _flood(multibyte, invalid=False):
+    """200 raw lines as bytes; with `invalid`, every tenth one is latin-1."""
+    rng = random.Random(1)
+    words = ["hello", "spaghetti", "ok", "lol", "reason", "imagine", "anyway"]
+    if multibyte:
+        words += ["naïve", "日本語", "🍝", "ça"]
+    lines = [f":u{i}!~u@host.example PRIVMSG #bench :{' '.join(rng.choices(words, k=rng.randint(3, 30)))}\r\n"
+             for i in range(200)]
+    if invalid:
+        lines[::10] = [line.replace(" :", " :café ", 1).encode("latin-1") for line in lines[::10]]
+    return b"".join(line if isinstance(line, bytes) else line.encode("utf-8") for line in lines)
+
+
+def sportsbook_case(name):
+    games = _games()
+    # the games dealt out into four leagues, searched together like `.sb <team>`
+    books = {f"league{i}": (games[i::4], _build_index(games[i::4])) for i in range(4)}
+    calls = {
+        "format_reply": (_format_reply, (games[5],)),
+        "fmt_time": (_fmt_time, (games[5]["commence_time"],)),
+        "build_index": (_build_index, (games,)),
+        "search/exact": (_search, (books, "chiefs")),
+        "search/typo": (_search, (books, "cheifs")),
+        "search/scan": (_search, (books, "ansas cit")),  # no index key, falls back to a scan
+    }
+    func, args = calls[name]
+    return lambda loops: _time_calls(func, args, loops)
+
+
+def trivia_case():
+    """Draw questions from a deck topped up (untimed) before each sample."""
+    questions = [{
+        "id": f"q{i}",
+        "category": "science_and_nature",
+        "question": {"text": f"Which of these is question number {i}?"},
+        "correctAnswer": f"Answer {i}",
+        "incorrectAnswers": [f"Wrong {i}a", f"Wrong {i}b", f"Wrong {i}c"],
+    } for i in range(600)]
+    trivia = Trivia(None, None, None, None)
+    trivia._refill = True  # as if a refill were running, so none is spawned
+
+    def run(loops):
+        random.seed(1)
+        trivia._deck.clear()
+        trivia._deck.extend(itertools.islice(itertools.cycle(questions), loops))
+        return _time_calls(trivia._create_trivia_question, (), loops)
+    return run
+
+
+CASES = {
+    "parse_raw_msg/privmsg": lambda: parse_case(
+        ":alice!~alice@example.com PRIVMSG #bench :just some ordinary chatter about nothing much at all"),
+    "parse_raw_msg/command": lambda: parse_case(":alice!~alice@example.com PRIVMSG #bench :.sb nfl chiefs"),
+    "parse_raw_msg/server": lambda: parse_case(":irc.example.net 353 garybot = #bench :alice bob carol"),
+    "slice_by_bytes/ascii": lambda: slice_case(_ASCII_REPLY),
+    "slice_by_bytes/multibyte": lambda: slice_case(_MULTIBYTE_REPLY),
+    "recv_lines/ascii": lambda: recv_case(_flood(False)),
+    "recv_lines/multibyte": lambda: recv_case(_flood(True)),
+    "recv_lines/latin-1": lambda: recv_case(_flood(False, invalid=True)),
+    "sportsbook/format_reply": lambda: sportsbook_case("format_reply"),
+    "sportsbook/fmt_time": lambda: sportsbook_case("fmt_time"),
+    "sportsbook/build_index": lambda: sportsbook_case("build_index"),
+    "sportsbook/search/exact": lambda: sportsbook_case("search/exact"),
+    "sportsbook/search/typo": lambda: sportsbook_case("search/typo"),
+    "sportsbook/search/scan": lambda: sportsbook_case("search/scan"),
+    "trivia/create_question": trivia_case,
+}
+
+
+def calibrate(run, min_time):
+    """The number of calls that makes one sample last at least `min_time`.
+
+    :param callable run: Takes a number of calls and returns the seconds
+        they took.
+    :param float min_time: The least time one sample should take.
+    :rtype: int
+    """
+    loops = 1
+    while (elapsed := run(loops)) < min_time:
+        loops = max(loops * 2, int(loops * min_time / max(elapsed, 1e-9) * 1.2))
+    return loops
+
+
+def measure(cases, samples, min_time):
+    """Time cases in rounds, one sample of each case per round.
+
+    Interleaving spreads every case's samples over the whole run, so a burst
+    of load on the machine or a frequency change skews a little of each case
+    instead of all of one.
+
+    :param dict[str, callable] cases: Each takes a number of calls and
+        returns the seconds they took.
+    :param int samples: How many samples to take of each case.
+    :param float min_time: The least time one sample should take.
+    :return: `{"loops": calls per sample, "ns": ns per call of each sample}`
+        per case.
+    :rtype: dict[str, dict]
+    """
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        results = {}
+        for name, run in cases.items():
+            loops = calibrate(run, min_time)
+            run(loops)  # warmup at the final size
+            results[name] = {"loops": loops, "ns": []}
+        for _ in range(samples):
+            for name, run in cases.items():
+                loops = results[name]["loops"]
+                results[name]["ns"].append(run(loops) / loops * 1e9)
+        return results
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+
+def mann_whitney_u(a, b):
+    """Two-sided Mann-Whitney U test.
+
+    Uses the normal approximation with a tie correction and a continuity
+    correction, which is close to exact from about ten samples a side.
+
+    :param list[float] a: The first sample.
+    :param list[float] b: The second sample.
+    :return: U for `a`, and the p-value that both samples come from the same
+        distribution.
+    :rtype: tuple[float, float]
+    """
+    n1, n2 = len(a), len(b)
+    pooled = sorted(itertools.chain(((value, 0) for value in a), ((value, 1) for value in b)))
+    n = n1 + n2
+    rank_sum = 0.0
+    tie_term = 0
+    i = 0
+    while i < n:
+        j = i
+        while j + 1 < n and pooled[j + 1][0] == pooled[i][0]:
+            j += 1
+        average_rank = (i + j) / 2 + 1
+        rank_sum += average_rank * sum(1 for k in range(i, j + 1) if pooled[k][1] == 0)
+        ties = j - i + 1
+        tie_term += ties ** 3 - ties
+        i = j + 1
+    u = rank_sum - n1 * (n1 + 1) / 2
+    mean = n1 * n2 / 2
+    variance = n1 * n2 / 12 * ((n + 1) - tie_term / (n * (n - 1)))
+    if variance <= 0:
+        return u, 1.0
+    z = (abs(u - mean) - 0.5) / math.sqrt(variance)
+    return u, min(1.0, math.erfc(max(z, 0.0) / math.sqrt(2)))
+
+
+def compare(old, new, alpha, threshold):
+    """Compare two result sets case by case.
+
+    :param dict old: Baseline results, as saved.
+    :param dict new: Results to check.
+    :param float alpha: The p-value below which a difference is significant.
+    :param float threshold: The least relative change in the median that
+        counts, e.g. 0.05 for 5%.
+    :return: `(case, old median ns, new median ns, change, p, verdict)` for
+        every case in both, where verdict is `slower`, `faster` or `same`.
+    :rtype: list[tuple]
+    """
+    rows = []
+    for name, result in new["results"].items():
+        if name not in old["results"]:
+            continue
+        before, after = old["results"][name]["ns"], result["ns"]
+        old_median, new_median = statistics.median(before), statistics.median(after)
+        change = new_median / old_median - 1
+        _, p = mann_whitney_u(before, after)
+        verdict = "same"
+        if p < alpha and abs(change) > threshold:
+            verdict = "slower" if change > 0 else "faster"
+        rows.append((name, old_median, new_median, change, p, verdict))
+    return rows
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True, cwd=RESULTS_DIR.parent).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_suite(pattern, samples, min_time):
+    cases = {name: factory() for name, factory in CASES.items() if not pattern or pattern in name}
+    results = measure(cases, samples, min_time)
+    print(f"{'case':<30}{'calls':>10}{'median ns':>12}{'min ns':>10}{'stdev':>8}")
+    for name, result in results.items():
+        ns = result["ns"]
+        median = statistics.median(ns)
+        print(f"{name:<30}{result['loops']:>10,}{median:>12,.1f}{min(ns):>10,.1f}"
+              f"{statistics.stdev(ns) / median:>8.1%}")
+    return {
+        "commit": _git_commit(),
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.platform(),
+        "samples": samples,
+        "results": results,
+    }
+
+
+def report(old, new, alpha, threshold):
+    """Print the comparison and return whether anything got slower."""
+    print(f"\n{old['commit']} -> {new['commit']} (alpha {alpha:g}, threshold {threshold:.0%})")
+    print(f"{'case':<30}{'old ns':>10}{'new ns':>10}{'change':>9}{'p':>9}  verdict")
+    rows = compare(old, new, alpha, threshold)
+    for name, old_median, new_median, change, p, verdict in rows:
+        print(f"{name:<30}{old_median:>10,.1f}{new_median:>10,.1f}{change:>+9.1%}{p:>9.2g}  {verdict}")
+    return any(verdict == "slower" for *_, verdict in rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-k", dest="pattern", help="only run cases whose name contains this")
+    parser.add_argument("--samples", type=int, default=20, help="samples per case")
+    parser.add_argument("--min-time", type=float, default=0.02, help="seconds per sample, at least")
+    parser.add_argument("--save", nargs="?", const="", metavar="PATH",
+                        help="save the results (default: benchmarks/results/<commit>.json)")
+    parser.add_argument("--baseline", metavar="PATH", help="compare this run against saved results")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two saved runs; no timing")
+    parser.add_argument("--alpha", type=float, default=0.01, help="significance level of the U test")
+    parser.add_argument("--threshold", type=float, default=0.05, help="smallest median change that counts")
+    args = parser.parse_args()
+
+    if args.compare:
+        old, new = (json.loads(Path(path).read_text()) for path in args.compare)
+    else:
+        old = json.loads(Path(args.baseline).read_text()) if args.baseline else None
+        new = run_suite(args.pattern, args.samples, args.min_time)
+        if args.save is not None:
+            path = Path(args.save) if args.save else RESULTS_DIR / f"{new['commit']}.json"
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(json.dumps(new, indent=1))
+            print(f"\nSaved to {path}")
+        if old is None:
+            return
+    if report(old, new, args.alpha, args.threshold):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
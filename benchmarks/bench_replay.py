@@ -0,0 +1,233 @@
+"""Replay logged channel traffic through the Dispatcher.
+
+Rows from a `user_logs` database are turned back into raw PRIVMSG lines and
+fed to a Dispatcher whose outbox, actor inboxes and handler pool are
+counting stubs (as in `bench_dispatch`), so the numbers are the dispatch
+path alone on a real message distribution. Inline handlers (`.help`) do
+run.
+
+The Logger never stores lines starting with `.`, `,` or `!`, so a logged
+database holds no commands at all and replaying it as-is only exercises
+`_route` through the passive triggers. `--command-share` turns that
+fraction of the rows into command lines, keeping their nick, channel and
+time and drawing the trigger from `--mix`; pass 0 to replay the log
+untouched.
+
+Three passes over the same lines:
+
+1. throughput: `_dispatch` with nothing else attached;
+2. stages: each of `_parse_raw_msg`, `_should_dispatch`, `_scan_passive`
+   plus `_route` (trigger matching and argument binding) and
+   `_update_current_convo` wrapped in a timer; the wrappers cost a little
+   themselves, which shows up as the gap to the throughput pass;
+3. memory: with tracemalloc on, the peak of memory allocated while
+   dispatching each line, above what was in use before it (Python keeps
+   no allocation count, so transient bytes per line stand in for it), and
+   what the whole pass left allocated.
+
+With `--pace` the lines are instead dispatched at their logged times
+(sped up by that factor), reporting how late each line was handled.
+
+Usage:
+    python -m benchmarks.bench_replay --db data/user_logs/user_logs.db
+    python -m benchmarks.bench_replay --synthetic 500000
+    python -m benchmarks.bench_replay --db data/user_logs/user_logs.db --pace 60 --limit 20000
+    python -m benchmarks.bench_replay --synthetic 500000 --command-share 0.1 --mix ask=1,tr=3
+"""
+import argparse
+import array
+import random
+import sqlite3
+import time
+import tracemalloc
+
+import gevent
+
+from benchmarks.bench_ask import _synthetic_rows
+from benchmarks.bench_dispatch import build_dispatcher, stub_config
+from src.client.commands import COMMANDS
+
+
+STAGES = ("_parse_raw_msg", "_should_dispatch", "_scan_passive", "_route", "_update_current_convo")
+
+
+def load_rows(path, limit, channel):
+    """Read `(nick, target, message, timestamp)` rows in logged order."""
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    sql = "SELECT nick, target, message, timestamp FROM user_logs"
+    params = []
+    if channel:
+        sql += " WHERE target = ?"
+        params.append(channel)
+    sql += " ORDER BY rowid"
+    if limit:
+        sql += " LIMIT ?"
+        params.append(limit)
+    rows = conn.execute(sql, params).fetchall()
+    conn.close()
+    return rows
+
+
+def parse_mix(text):
+    """Parse `help=4,ask=1` into weights per command trigger word."""
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        word = f".{name.lstrip('.')}"
+        if word not in COMMANDS:
+            raise SystemExit(f"Unknown command {name!r}; choose from {', '.join(c[1:] for c in COMMANDS)}")
+        mix[word] = float(weight or 1)
+    return mix
+
+
+def mix_commands(rows, share, mix, rng):
+    """Turn a `share` of the rows into command lines, each the logged
+    message behind a trigger word drawn from `mix`."""
+    words, weights = list(mix), list(mix.values())
+    mixed = []
+    for nick, target, message, ts in rows:
+        if rng.random() < share:
+            message = f"{rng.choices(words, weights)[0]} {message}"
+        mixed.append((nick, target, message, ts))
+    return mixed
+
+
+def raw_lines(rows):
+    """Rebuild the raw IRC lines the Listener would have handed over."""
+    return [f":{nick}!~{nick}@replay.host PRIVMSG {target} :{message}" for nick, target, message, _ in rows]
+
+
+def replay_dispatcher(rows):
+    """A stubbed Dispatcher that answers in every channel in the log."""
+    config = stub_config()
+    config.channels = sorted({target for _, target, _, _ in rows})
+    return build_dispatcher(config)
+
+
+def throughput(rows, lines):
+    dispatcher = replay_dispatcher(rows)
+    dispatch = dispatcher._dispatch
+    started = time.perf_counter()
+    for line in lines:
+        dispatch(line)
+    return time.perf_counter() - started
+
+
+def stage_times(rows, lines):
+    """Time each dispatch stage by shadowing the methods on one instance."""
+    dispatcher = replay_dispatcher(rows)
+    totals = {name: [0, 0.0] for name in STAGES}
+    for name in STAGES:
+        setattr(dispatcher, name, _timed(getattr(dispatcher, name), totals[name]))
+    started = time.perf_counter()
+    for line in lines:
+        dispatcher._dispatch(line)
+    return time.perf_counter() - started, totals
+
+
+def _timed(method, entry):
+    perf_counter = time.perf_counter
+
+    def wrapper(*args, **kwargs):
+        started = perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            entry[0] += 1
+            entry[1] += perf_counter() - started
+    return wrapper
+
+
+def memory(rows, lines):
+    """Transient bytes allocated per line, and bytes left allocated."""
+    dispatcher = replay_dispatcher(rows)
+    dispatch = dispatcher._dispatch
+    peaks = array.array("q", bytes(8 * len(lines)))  # preallocated, so it isn't measured
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    for i, line in enumerate(lines):
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        dispatch(line)
+        peaks[i] = tracemalloc.get_traced_memory()[1] - before
+    retained = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    return sorted(peaks), retained
+
+
+def paced(rows, lines, speed):
+    """Dispatch each line at its logged time (divided by `speed`) and
+    return how late each one finished, in seconds."""
+    dispatcher = replay_dispatcher(rows)
+    start_ts = rows[0][3]
+    started = time.perf_counter()
+    lateness = []
+    for (_, _, _, ts), line in zip(rows, lines):
+        due = started + (ts - start_ts) / speed
+        wait = due - time.perf_counter()
+        if wait > 0:
+            gevent.sleep(wait)
+        dispatcher._dispatch(line)
+        lateness.append(time.perf_counter() - due)
+    lateness.sort()
+    return lateness
+
+
+def _pct(ordered, q):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--db", help="a user_logs database to replay")
+    source.add_argument("--synthetic", type=int, metavar="ROWS", help="replay generated chatter instead")
+    parser.add_argument("--limit", type=int, default=0, help="replay at most this many rows")
+    parser.add_argument("--channel", help="only replay this channel")
+    parser.add_argument("--memory-lines", type=int, default=20_000, help="lines in the tracemalloc pass")
+    parser.add_argument("--pace", type=float, metavar="SPEEDUP", help="replay at logged pace, this many times faster")
+    parser.add_argument("--command-share", type=float, default=0.05,
+                        help="fraction of rows replayed as commands (logs contain none)")
+    parser.add_argument("--mix", default="help=2,ask=2,tr=4,sb=1,wa=1,haha=1,spaghetti=1", help="command weights")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    if args.db:
+        rows = load_rows(args.db, args.limit, args.channel)
+    else:
+        rows = list(_synthetic_rows(args.synthetic, 200, [args.channel or "#main"], seed=1))
+    if not rows:
+        raise SystemExit("Nothing to replay.")
+    if args.command_share:
+        rows = mix_commands(rows, args.command_share, parse_mix(args.mix), random.Random(args.seed))
+    lines = raw_lines(rows)
+    print(f"{len(lines):,} lines from {len({r[1] for r in rows})} channel(s), {len({r[0] for r in rows}):,} nicks, "
+          f"{args.command_share:.0%} commands\n")
+
+    if args.pace:
+        lateness = paced(rows, lines, args.pace)
+        print(f"paced x{args.pace:g}: lateness p50 {_pct(lateness, 0.5) * 1e6:.0f} µs, "
+              f"p99 {_pct(lateness, 0.99) * 1e6:.0f} µs, max {lateness[-1] * 1e6:.0f} µs")
+        return
+
+    elapsed = throughput(rows, lines)
+    print(f"{'throughput':<24}{len(lines) / elapsed:>12,.0f} lines/s   ({elapsed / len(lines) * 1e9:,.0f} ns/line)")
+
+    timed_elapsed, totals = stage_times(rows, lines)
+    print(f"\n{'stage':<24}{'calls':>12}{'ns/call':>10}{'ns/line':>10}{'share':>8}")
+    for name, (calls, seconds) in totals.items():
+        print(f"{name:<24}{calls:>12,}{seconds / max(calls, 1) * 1e9:>10,.0f}"
+              f"{seconds / len(lines) * 1e9:>10,.0f}{seconds / timed_elapsed:>8.0%}")
+    accounted = sum(seconds for _, seconds in totals.values())
+    print(f"{'other (incl. timers)':<24}{'':>12}{'':>10}{(timed_elapsed - accounted) / len(lines) * 1e9:>10,.0f}"
+          f"{(timed_elapsed - accounted) / timed_elapsed:>8.0%}")
+
+    sample = lines[:args.memory_lines]
+    peaks, retained = memory(rows, sample)
+    print(f"\nallocated per line (bytes, {len(sample):,} lines): p50 {_pct(peaks, 0.5):,}  "
+          f"p99 {_pct(peaks, 0.99):,}  max {peaks[-1]:,}")
+    print(f"retained after the pass: {retained:,} bytes ({retained / len(sample):,.1f} per line)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+"""A minimal TLS IRC server for running the real client against localhost.
+
+It speaks just enough IRC for the bot: registration (NICK/USER and the 001
+welcome), JOIN/PART with a NAMES reply, PING/PONG in both directions, KICK,
+dropping a client's connection and PRIVMSG fan-out to every other member of a channel. Simulated users
+don't need sockets of their own: `say` delivers a line from any nick to the
+channel's connected members, which is all the bot can observe anyway.
+
+`bench_e2e` drives it; it can also be run on its own to point a client at:
+
+Usage:
+    python -m benchmarks.fake_ircd --port 6697
+    IRC_SERVER=localhost IRC_PORT=6697 IRC_CA_FILE=<printed cert> python -m src.main
+"""
+import argparse
+import itertools
+import socket
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+from gevent import ssl
+from gevent.event import Event
+from gevent.lock import Semaphore
+from gevent.server import StreamServer
+
+
+SERVER_NAME = "irc.bench.local"
+
+
+def make_self_signed_cert(directory):
+    """Create a throwaway certificate for localhost with the openssl CLI.
+
+    :param pathlib.Path directory: Where to write `cert.pem` and `key.pem`.
+    :return: The certificate and key paths. The certificate doubles as the
+        CA file the client verifies against.
+    :rtype: tuple[pathlib.Path, pathlib.Path]
+    """
+    cert, key = directory / "cert.pem", directory / "key.pem"
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+         "-keyout", str(key), "-out", str(cert), "-subj", "/CN=localhost",
+         "-addext", "subjectAltName=DNS:localhost,IP:127.0.0.1"],
+        check=True, capture_output=True,
+    )
+    return cert, key
+
+
+class Session:
+    """One connected client.
+
+    Attributes:
+        nick (str | None): The client's nick, once sent.
+        user_sent (bool): Whether USER has been received.
+        registered (bool): Whether NICK and USER have both been received.
+        channels (set[str]): Channels joined, lowercased.
+        _sock (ssl.SSLSocket): The client's socket.
+        _lock (Semaphore): Serializes writes from different greenlets.
+    """
+
+    def __init__(self, sock):
+        self.nick = None
+        self.user_sent = False
+        self.registered = False
+        self.channels = set()
+        self._sock = sock
+        self._lock = Semaphore()
+
+    @property
+    def prefix(self):
+        """The client's `nick!user@host` prefix."""
+        return f"{self.nick}!{self.nick}@localhost"
+
+    def send(self, line):
+        """Send one line, ignoring a client that has gone away."""
+        with self._lock:
+            try:
+                self._sock.sendall(line.encode("utf-8") + b"\r\n")
+            except OSError:
+                pass
+
+    def close(self):
+        try:
+            self._sock.close()
+        except OSError:
+            pass
+
+
+class FakeIRCd:
+    """The server.
+
+    Attributes:
+        port (int): The port listened on (useful when started on port 0).
+        sessions (dict[str, Session]): Registered clients, by lowercased nick.
+        members (dict[str, set[str]]): Lowercased nicks of the connected
+            clients in each channel.
+        on_privmsg (callable | None): Called with `(session, target, text,
+            received_at)` for every PRIVMSG a client sends.
+        on_join (callable | None): Called with `(session, channel)`.
+        pong_latencies (list[float]): Seconds from each server PING to its
+            PONG.
+        _server (StreamServer): The TLS listener.
+        _pings (dict[str, float]): Outstanding PING tokens and when they
+            were sent.
+        _tokens (Iterator[int]): PING token sequence.
+    """
+
+    def __init__(self, certfile, keyfile, host="127.0.0.1", port=0):
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(certfile, keyfile)
+        self.sessions = {}
+        self.members = {}
+        self.on_privmsg = None
+        self.on_join = None
+        self.pong_latencies = []
+        self.port = None
+        self._server = StreamServer((host, port), self._handle, ssl_context=context)
+        self._pings = {}
+        self._tokens = itertools.count(1)
+
+    def start(self):
+        self._server.start()
+        self.port = self._server.server_port
+
+    def stop(self):
+        self._server.stop(timeout=1)
+
+    def say(self, nick, channel, text):
+        """Deliver a PRIVMSG from a simulated user to a channel's members."""
+        line = f":{nick}!{nick}@users.bench PRIVMSG {channel} :{text}"
+        for member in self.members.get(channel.lower(), ()):
+            session = self.sessions.get(member)
+            if session is not None:
+                session.send(line)
+
+    def ping(self, nick):
+        """Send a PING to a client; its PONG latency lands in `pong_latencies`."""
+        session = self.sessions.get(nick.lower())
+        if session is None:
+            return
+        token = f"bench{next(self._tokens)}"
+        self._pings[token] = time.perf_counter()
+        session.send(f"PING :{token}")
+
+    def kick(self, channel, nick, by="op", reason="bench"):
+        """Kick a client from a channel."""
+        line = f":{by}!{by}@users.bench KICK {channel} {nick} :{reason}"
+        for member in list(self.members.get(channel.lower(), ())):
+            self.sessions[member].send(line)
+        self._part(nick.lower(), channel.lower())
+
+    def disconnect(self, nick):
+        """Drop a client's connection, as a server restart or netsplit would."""
+        session = self.sessions.get(nick.lower())
+        if session is not None:
+            session.close()
+
+    def _handle(self, sock, address):
+        """Serve one client until it disconnects."""
+        # lines go out one by one; don't let Nagle hold them for delayed ACKs
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        session = Session(sock)
+        buffer = b""
+        try:
+            while True:
+                data = sock.recv(65536)
+                if not data:
+                    break
+                buffer += data
+                *lines, buffer = buffer.split(b"\r\n")
+                for raw in lines:
+                    if raw:
+                        self._command(session, raw.decode("utf-8", "replace"))
+        except OSError:
+            pass
+        finally:
+            if session.nick:
+                nick = session.nick.lower()
+                for channel in list(session.channels):
+                    self._part(nick, channel)
+                if self.sessions.get(nick) is session:
+                    del self.sessions[nick]
+            session.close()
+
+    def _command(self, session, line):
+        received_at = time.perf_counter()
+        command, _, rest = line.partition(" ")
+        command = command.upper()
+        if command == "NICK":
+            session.nick = rest.strip().lstrip(":")
+            self._maybe_welcome(session)
+        elif command == "USER":
+            session.user_sent = True
+            self._maybe_welcome(session)
+        elif command == "PING":
+            session.send(f":{SERVER_NAME} PONG {SERVER_NAME} {rest}")
+        elif command == "PONG":
+            token = rest.rsplit(":", 1)[-1].strip()
+            sent_at = self._pings.pop(token, None)
+            if sent_at is not None:
+                self.pong_latencies.append(received_at - sent_at)
+        elif command == "JOIN":
+            for channel in rest.split()[0].split(","):
+                self._join(session, channel)
+        elif command == "PART":
+            for channel in rest.split()[0].split(","):
+                self._part(session.nick.lower(), channel.lower())
+        elif command == "PRIVMSG":
+            target, _, text = rest.partition(" :")
+            out = f":{session.prefix} PRIVMSG {target} :{text}"
+            for member in self.members.get(target.lower(), ()):
+                if member != session.nick.lower():
+                    self.sessions[member].send(out)
+            if self.on_privmsg is not None:
+                self.on_privmsg(session, target, text, received_at)
+        elif command == "QUIT":
+            session.close()
+
+    def _maybe_welcome(self, session):
+        if session.registered or not (session.nick and session.user_sent):
+            return
+        session.registered = True
+        self.sessions[session.nick.lower()] = session
+        session.send(f":{SERVER_NAME} 001 {session.nick} :Welcome to the bench network")
+
+    def _join(self, session, channel):
+        key = channel.lower()
+        members = self.members.setdefault(key, set())
+        members.add(session.nick.lower())
+        session.channels.add(key)
+        join = f":{session.prefix} JOIN {channel}"
+        for member in members:
+            self.sessions[member].send(join)
+        names = " ".join(self.sessions[m].nick for m in members)
+        session.send(f":{SERVER_NAME} 353 {session.nick} = {channel} :{names}")
+        session.send(f":{SERVER_NAME} 366 {session.nick} {channel} :End of /NAMES list.")
+        if self.on_join is not None:
+            self.on_join(session, channel)
+
+    def _part(self, nick, channel):
+        self.members.get(channel, set()).discard(nick)
+        session = self.sessions.get(nick)
+        if session is not None:
+            session.channels.discard(channel)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=6697)
+    args = parser.parse_args()
+
+    directory = Path(tempfile.mkdtemp(prefix="fake-ircd-"))
+    cert, key = make_self_signed_cert(directory)
+    server = FakeIRCd(cert, key, port=args.port)
+    server.start()
+    print(f"Listening on localhost:{server.port} (TLS); IRC_CA_FILE={cert}")
+    try:
+        Event().wait()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
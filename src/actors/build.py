@@ -1,16 +1,102 @@
 """"""
-from src.client.logger import Logger
+from src.channel_functions.http_client import HttpClient
+from src.channel_functions.llm import LLMService
+from src.channel_functions.odds_history import OddsHistory
+from src.channel_functions.youtube import YouTubeMetadata
+from src.client.database import Database
+from src.client.logger import Logger, open_user_logs
+from src.client.metrics import Metrics, database_source, http_source
+from src.client.outbox import Outbox
+from src.client.tracing import Tracer
+from src.client.watchdog import Watchdog
 from src.client.writer import Writer
 from src.client.dispatcher import Dispatcher
 from src.client.listener import Listener
-from src.channel_functions.trivia import Trivia
+from src.channel_functions.sportsbook import OddsBook
+from src.channel_functions.trivia import Scoreboard, Trivia
 
 
-def build_actors(sock, stop_event, app_config):
-    """"""
-    writer = Writer(sock, stop_event)
-    logger_ = Logger(stop_event, app_config)
-    trivia = Trivia(writer, stop_event, app_config)
-    dispatcher = Dispatcher(writer, logger_, trivia, stop_event, app_config)
-    listener = Listener(dispatcher, sock, stop_event)
-    return [writer, logger_, trivia, dispatcher, listener]
+def build_actors(stop_event, app_config):
+    """Build everything that outlives a connection: the outbox, the
+    socket-independent actors and the watchdog supervising them.
+
+    :param Event stop_event: The process-wide stop event.
+    :param AppSettings app_config: The application configuration.
+    :return: The outbox, the dispatcher (which the Listener feeds), the
+        watchdog (whose `actors()` are the actors to start), the OddsBook, the
+        metrics registry, the Tracer (None unless tracing is enabled) and the
+        databases shared between actors, for the caller to close once every
+        actor has stopped.
+    :rtype: tuple[Outbox, Dispatcher, Watchdog, OddsBook, Metrics, Tracer | None, list[Database]]
+    """
+    metrics = Metrics(stop_event)
+    # migrated before any actor starts, so `.ask` never sees a half-built index
+    user_logs_db = open_user_logs(app_config.user_logs_path)
+    user_logs_reader = Database(app_config.user_logs_path, name="user_logs_reader",
+                                pragmas=("PRAGMA query_only=ON",))
+    http = HttpClient(pool_size=app_config.dispatcher_pool_size)
+    llm = LLMService(
+        app_config.llm_api_key.get_secret_value(),
+        app_config.irc_llm_model,
+        app_config.project_root / "prompt",
+        app_config.irc_nick,
+    )
+    youtube = YouTubeMetadata(app_config.youtube_api_key.get_secret_value(), http)
+    outbox = Outbox(burst=app_config.writer_flood_burst, rate=app_config.writer_flood_rate)
+    logger_ = Logger(stop_event, app_config, user_logs_db)
+    trivia_db = Database(app_config.trivia_db_path, name="trivia")
+    scoreboard = Scoreboard(trivia_db)
+    trivia = Trivia(outbox, stop_event, http, scoreboard)
+    odds_history_db = Database(app_config.odds_history_path, name="odds_history")
+    odds_history = OddsHistory(odds_history_db, retention_days=app_config.odds_history_days)
+    odds = OddsBook(stop_event, app_config, http, odds_history)
+    resources = dict(user_logs_db=user_logs_reader, http=http, llm=llm, youtube=youtube, odds=odds,
+                     metrics=metrics)
+    dispatcher = Dispatcher(outbox, logger_, trivia, stop_event, app_config, **resources)
+
+    watchdog = Watchdog(stop_event, stall_after=app_config.watchdog_stall_seconds)
+    watchdog.watch("logger", logger_,
+                   lambda old: Logger(stop_event, app_config, user_logs_db, inbox=old.inbox))
+    watchdog.watch("trivia", trivia,
+                   lambda old: Trivia(outbox, stop_event, http, scoreboard, inbox=old.inbox))
+    watchdog.watch("dispatcher", dispatcher,
+                   lambda old: Dispatcher(outbox, logger_, trivia, stop_event, app_config,
+                                          inbox=old.inbox, convos=old.convos, pool=old._pool, **resources))
+
+    # inboxes are handed on to replacements, so these stay valid across restarts
+    metrics.watch_queue("dispatcher", dispatcher.inbox)
+    metrics.watch_queue("writer", outbox)
+    metrics.watch_queue("logger", logger_.inbox)
+    metrics.watch_queue("trivia", trivia.inbox)
+    metrics.add_source(database_source(user_logs_db, user_logs_reader, trivia_db, odds_history_db))
+    metrics.add_source(http_source(http))
+    metrics.add_source(lambda: _supervision_samples(watchdog))
+    tracer = None
+    if app_config.trace_sample_rate:
+        tracer = Tracer(stop_event, app_config.trace_path, app_config.trace_sample_rate)
+    return outbox, dispatcher, watchdog, odds, metrics, tracer, [user_logs_db, user_logs_reader]
+
+
+def _supervision_samples(watchdog):
+    """Metrics samples for the handler pool and actor restarts."""
+    dispatcher = watchdog.actor("dispatcher")
+    if dispatcher is not None:
+        for name, value in dispatcher.pool_stats().items():
+            yield f"pool_{name}", {}, value, "gauge"
+    for name, count in watchdog.restarts.items():
+        yield "actor_restarts_total", {"actor": name}, count, "counter"
+
+
+def build_connection_actors(sock, conn_stop, outbox, dispatcher, tracer=None):
+    """Build the actors bound to one connection's socket.
+
+    :param ssl.SSLSocket sock: The connected, registered socket.
+    :param Event conn_stop: Set when the connection is done; either actor
+        sets it when the socket fails.
+    :param Outbox outbox: The long-lived outbound queue.
+    :param Dispatcher dispatcher: Receives the lines read from the socket.
+    :param Tracer | None tracer: Samples lines for latency tracing.
+    :return: The Writer and the Listener.
+    :rtype: tuple[Writer, Listener]
+    """
+    return Writer(sock, conn_stop, outbox), Listener(dispatcher, sock, conn_stop, tracer=tracer)
@@ -1,37 +1,10 @@
 import random
-import requests
 import urllib
 from html import unescape
 
-import sqlite3
-from google import genai
-from google.genai import types
-from pydantic import BaseModel, Field
 from loguru import logger
 
 
-class BotResponse(BaseModel):
-    """Structured schema for the IRC bot's reply to a user message.
- 
-    Captures the original message context alongside the bot's response
-    in multiple formats, including a reversed-text variant used for output.
- 
-    Attributes:
-        user_nick: IRC nick of the user who sent the message.
-        user_message: The raw message sent by the user.
-        bot_reply_intent: The intended meaning or goal of the bot's reply,
-            used as an intermediate reasoning step.
-        bot_reply_normal: The bot's reply written in plain text.
-        bot_reply_reverse_text: The bot's reply with characters in reverse
-            order, which is reversed back to normal before sending.
-    """
-    user_nick: str = Field(description="The IRC nick of the user who sent the message.")
-    user_message: str = Field(description="The message sent by the user.")
-    bot_reply_intent: str = Field(description="The idea or intention behind the bot's reply.")
-    bot_reply_normal: str = Field(description="The bot's reply in normal text.")
-    bot_reply_reverse_text: str = Field(description="The bot's reply with the text reversed")
-
-
 def imagine_without_iron(message):
     """Return the message with each character's case randomized.
  
@@ -47,36 +20,14 @@ def reason_will_prevail():
     return 'REASON WILL PREVAIL'
 
 
-def dot_youtube(match, youtube_api_key):
-    """"""
-    video_id = match.group(1)
-    response = requests.get(
-        "https://youtube.googleapis.com/youtube/v3/videos",
-        params={
-            "part": "snippet,contentDetails,statistics",
-            "id": video_id,
-            "key": youtube_api_key,
-        }
-    )
-    response.raise_for_status()  # Check if the request was successful
-    items = response.json().get("items", [])
-    if items:
-        video_info = items[0]
-        published = video_info["snippet"]["publishedAt"]
-        published = published.split("T")[0]  # Extract date part
-        title = video_info["snippet"]["title"]
-        channel = video_info["snippet"]["channelTitle"]
-        duration = video_info["contentDetails"]["duration"]
-        duration = duration[2:].lower()
-        views = video_info["statistics"].get("viewCount", "N/A")
-        views = format(int(views), ",") if views != "N/A" else views
-        likes = video_info["statistics"].get("likeCount", "N/A")
-        likes = format(int(likes), ",") if likes != "N/A" else likes
-        comments = video_info["statistics"].get("commentCount", "N/A")
-        comments = format(int(comments), ",") if comments != "N/A" else comments
-        return f"[YouTube] {title} | {channel} | {duration} | {published} | Views: {views} | Likes: {likes} | Comments: {comments}"
-    else:
-        return "[YouTube] Video not found."
+def dot_help(nick):
+    """Return a link to the command list.
+
+    :param str nick: The IRC nick of the requesting user, prepended to the reply.
+    :returns: A string in the form ``nick: <url>``.
+    :rtype: str
+    """
+    return f"{nick}: https://markdownpastebin.com/?id=ec96599a4ecc4673a182e6f55e36bb6b"
 
 
 def dot_spaghetti():
@@ -107,12 +58,13 @@ def dot_spaghetti():
     return random.choice(SPAGHETTI_LYRICS)
 
 
-def dot_ask(nick, word_list, target, user_logs_path):
+def dot_ask(nick, word_list, target, user_logs_db):
     """Fetch a random message from a user's log history in a given channel.
  
     :param str target: The channel name to scope the query to.
-    :param pathlib.Path user_logs_path: Filesystem path to the SQLite user
-        log database.
+    :param Database user_logs_db: A read connection to the user log
+        database. The query runs on its worker thread, so the hub keeps
+        serving sockets meanwhile.
     :returns: A formatted quote string ``<nick> message``.
     :rtype: str
     """
@@ -123,24 +75,41 @@ def dot_ask(nick, word_list, target, user_logs_path):
 
     queried_nick = word_list[1]
 
-    try:
-        with sqlite3.connect(user_logs_path) as db:
-            results = db.execute("""
-                SELECT message
-                FROM user_logs
-                WHERE nick = ?
-                AND target = ?
-                AND message GLOB '[A-Za-z0-9]*'
-                ORDER BY RANDOM()
-                LIMIT 1;
-            """, (queried_nick, target))
-            selection = results.fetchone()[0]
-        return f"<{queried_nick}> {selection}"
-    except TypeError:
+    selection = user_logs_db.run(_sample_quote, queried_nick, target, label="ask")
+    if selection is None:
         return f"{nick}: Sorry, I have no record of {queried_nick} in {target}."
+    return f"<{queried_nick}> {selection}"
 
 
-def dot_wolfram(nick, message, wolfram_api_key):
+def _sample_quote(conn, nick, target):
+    """Pick a uniformly random quotable line for a nick in a channel.
+
+    Quotable lines are numbered densely per (target, nick) in the `quotes`
+    table, so this costs two primary key lookups no matter how large the
+    history is. Runs on the database worker thread.
+
+    :param sqlite3.Connection conn: A connection to the user logs database.
+    :param str nick: The nick to quote.
+    :param str target: The channel the line must have been said in.
+    :returns: The message text, or None if the nick has no quotable lines.
+    :rtype: str | None
+    """
+    row = conn.execute(
+        "SELECT n FROM quote_counts WHERE target = ? AND nick = ?",
+        (target, nick),
+    ).fetchone()
+    if not row or not row[0]:
+        return None
+    row = conn.execute("""
+        SELECT u.message
+        FROM quotes q
+        JOIN user_logs u ON u.rowid = q.log_rowid
+        WHERE q.target = ? AND q.nick = ? AND q.seq = ?;
+    """, (target, nick, random.randrange(row[0]))).fetchone()
+    return row[0] if row else None
+
+
+def dot_wolfram(nick, message, wolfram_api_key, http):
     """Query the Wolfram Alpha short-answer API and return the result.
  
     :param str nick: The IRC nick of the requesting user, prepended to the
@@ -148,6 +117,7 @@ def dot_wolfram(nick, message, wolfram_api_key):
     :param str message: The full command string; everything after the first
         whitespace-delimited token is treated as the query.
     :param str wolfram_api_key: A valid Wolfram Alpha API application key.
+    :param HttpClient http: The shared HTTP client.
     :returns: A string in the form ``nick: <wolfram response>``.
     :rtype: str
     """
@@ -158,24 +128,25 @@ def dot_wolfram(nick, message, wolfram_api_key):
     apiquery = url + question + api_key + '&units=metric'
     
     # format and return the response
-    response = requests.get(apiquery)
+    response = http.get(apiquery)
     if response.status_code != 200:
         return f"{nick}: Sorry, I couldn't get an answer to that question."
     response = response.text[:400].replace("\n", "")
     return f"{nick}: {response}"
         
 
-def dot_apod(nick, nasa_api_key):
+def dot_apod(nick, nasa_api_key, http):
     """Fetch a random NASA Astronomy Picture of the Day and format it for IRC.
  
     :param str nick: The IRC nick of the requesting user, prepended to the
         reply.
     :param str nasa_api_key: A valid NASA API key.
+    :param HttpClient http: The shared HTTP client.
     :returns: A string in the form ``nick: <IRC-formatted APOD line>``.
     :rtype: str
     """
     apod_api = f"https://api.nasa.gov/planetary/apod?api_key={nasa_api_key}&count=1"
-    apod_data = requests.get(apod_api).json()[0]
+    apod_data = http.get(apod_api).json()[0]
     header = " AP🪐D "
     date = apod_data['date']
     title = apod_data['title']
@@ -184,20 +155,20 @@ def dot_apod(nick, nasa_api_key):
     return f"{nick}: {response}"
 
 
-def dot_joke(nick):
+def dot_joke(nick, http):
     """Fetch a random joke from the JokeAPI and format it for IRC.
 
     :param str nick: The IRC nick of the requesting user, prepended to the reply.
+    :param HttpClient http: The shared HTTP client.
     :returns: A joke.
     :rtype: str
     """
     jokes_api = "https://v2.jokeapi.dev/joke/Any?format=txt"
-    joke = requests.get(jokes_api).text.replace("\n\n", " ").replace("\n", " ")
+    joke = http.get(jokes_api).text.replace("\n\n", " ").replace("\n", " ")
     return f"{nick}: {joke}"
 
 
-def dot_arb(nick, message, llm_api_key, llm_model, current_convo,
-            project_root, client_nick):
+def dot_arb(nick, message, current_convo, llm):
     """Generate a contextual reply using the Google Gemini API.
  
     If the model does not finish cleanly (finish reason other than
@@ -205,34 +176,17 @@ def dot_arb(nick, message, llm_api_key, llm_model, current_convo,
  
     :param str nick: IRC nick of the user sending the message.
     :param str message: The user's message text.
-    :param str llm_api_key: Google Gemini API key.
-    :param str llm_model: Gemini model identifier (e.g. ``"gemini-2.0-flash"``).
-    :param str current_convo: Recent channel conversation, injected into the
-        system prompt for context.
-    :param pathlib.Path project_root: Root directory of the project, used to
-        locate the prompt file.
-    :param str client_nick: The bot's own IRC nick, injected into the system
-        prompt.
+    :param str current_convo: Recent channel conversation, sent ahead of the
+        message for context.
+    :param LLMService llm: The shared LLM client and pre-rendered prompt.
     :returns: A string in the form ``nick: <reply>``, or an error message if
         the model did not return a complete response.
     :rtype: str
     """
-    with open(project_root / 'prompt', 'r') as f:
-        sys_msg = f.read().format(current_convo=current_convo, client_nick=client_nick)
-    client = genai.Client(api_key=llm_api_key)
     n = 3
     for attempt in range(n):
         try:
-            response = client.models.generate_content(
-                model=llm_model,
-                config=types.GenerateContentConfig(
-                    system_instruction=sys_msg,
-                    response_mime_type='application/json',
-                    response_schema=list[BotResponse],
-                    max_output_tokens=2000,
-                ),
-                contents=f"<{nick}> {message}",
-            )
+            response = llm.generate(nick, message, current_convo)
             finish_reason = response.candidates[0].finish_reason.name
             if finish_reason != "STOP":
                 raise ValueError(f"Model did not finish properly (finish reason: {finish_reason}). Retrying...")
@@ -0,0 +1,102 @@
+"""Shared HTTP client for channel functions.
+
+Every channel function that calls an external API goes through one
+HttpClient, so connections to each host are kept alive and reused instead of
+paying a TCP and TLS handshake per command, and every request gets a default
+timeout.
+
+Usage:
+    http = HttpClient(pool_size=10)
+    response = http.get("https://api.example.com/thing", params={...})
+"""
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from src.client.tracing import current_span
+
+
+class HttpClient:
+    """A `requests.Session` with per-host keep-alive pools and per-host stats.
+
+    Each host gets its own urllib3 connection pool holding up to `pool_size`
+    idle connections, matching the Dispatcher's greenlet pool so that every
+    concurrently running handler can reuse a warm connection. Responses are
+    requested gzip-compressed and decompressed transparently by `requests`.
+
+    Attributes:
+        timeout (tuple[float, float]): Default (connect, read) timeout in
+            seconds, used when a call doesn't pass its own.
+        stats (dict[str, list]): Per-host `[requests, errors, total_seconds,
+            max_seconds]`.
+        _session (requests.Session): The shared session.
+        _adapter (HTTPAdapter): The adapter holding the per-host pools,
+            mounted for both http and https.
+        _MAX_HOSTS (int): How many per-host pools are kept before the least
+            recently used one is closed.
+    """
+
+    _MAX_HOSTS = 32
+
+    def __init__(self, pool_size=10, timeout=(3.05, 10)):
+        self.timeout = timeout
+        self.stats = {}
+        self._session = requests.Session()
+        self._session.headers["Accept-Encoding"] = "gzip, deflate"
+        self._adapter = HTTPAdapter(pool_connections=self._MAX_HOSTS, pool_maxsize=pool_size)
+        self._session.mount("https://", self._adapter)
+        self._session.mount("http://", self._adapter)
+
+    def get(self, url, **kwargs):
+        """Send a GET request on the shared session.
+
+        Accepts the same keyword arguments as `requests.get`.
+
+        :param str url: The URL to fetch.
+        :return: The response.
+        :rtype: requests.Response
+        :raises requests.RequestException: On connection errors or timeouts.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        entry = self.stats.setdefault(urlsplit(url).hostname, [0, 0, 0.0, 0.0])
+        started = time.perf_counter()
+        try:
+            return self._session.get(url, **kwargs)
+        except requests.RequestException:
+            entry[1] += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            entry[0] += 1
+            entry[2] += elapsed
+            entry[3] = max(entry[3], elapsed)
+            span = current_span()
+            if span is not None:
+                span.http += elapsed
+
+    def host_stats(self):
+        """Report request counts, latency and connection reuse per host.
+
+        :return: For each host: requests, errors, average and max latency in
+            milliseconds, connections opened and requests served on an
+            already-open connection.
+        :rtype: dict[str, dict]
+        """
+        opened = {}
+        pools = self._adapter.poolmanager.pools
+        for key in pools.keys():
+            opened[key.key_host] = opened.get(key.key_host, 0) + pools[key].num_connections
+        report = {}
+        for host, (n, errors, total, worst) in self.stats.items():
+            connections = opened.get(host, 0)
+            report[host] = {
+                "requests": n,
+                "errors": errors,
+                "avg_ms": total / n * 1000 if n else 0.0,
+                "max_ms": worst * 1000,
+                "connections": connections,
+                "reused": max(n - errors - connections, 0),
+            }
+        return report
@@ -0,0 +1,171 @@
+"""Long-lived LLM service used by the chatbot command.
+
+Built once at startup, so a mention of the bot doesn't pay for re-reading the
+prompt file, re-rendering the template, re-sending the whole system prompt and
+constructing a new Gemini client (and its connection pool) on every request.
+
+Usage:
+    llm = LLMService(api_key, model, project_root / "prompt", client_nick)
+    response = llm.generate(nick, message, current_convo)
+"""
+import os
+import time
+
+from google import genai
+from google.genai import errors, types
+from loguru import logger
+from pydantic import BaseModel, Field
+
+
+class BotResponse(BaseModel):
+    """Structured schema for the IRC bot's reply to a user message.
+
+    Captures the original message context alongside the bot's response
+    in multiple formats, including a reversed-text variant used for output.
+
+    Attributes:
+        user_nick: IRC nick of the user who sent the message.
+        user_message: The raw message sent by the user.
+        bot_reply_intent: The intended meaning or goal of the bot's reply,
+            used as an intermediate reasoning step.
+        bot_reply_normal: The bot's reply written in plain text.
+        bot_reply_reverse_text: The bot's reply with characters in reverse
+            order, which is reversed back to normal before sending.
+    """
+    user_nick: str = Field(description="The IRC nick of the user who sent the message.")
+    user_message: str = Field(description="The message sent by the user.")
+    bot_reply_intent: str = Field(description="The idea or intention behind the bot's reply.")
+    bot_reply_normal: str = Field(description="The bot's reply in normal text.")
+    bot_reply_reverse_text: str = Field(description="The bot's reply with the text reversed")
+
+
+class LLMService:
+    """A Gemini client and a pre-rendered system prompt, shared by all
+    requests.
+
+    The prompt template holds only what doesn't change between requests (the
+    bot's nick is rendered in once), and the conversation is sent in the
+    request body instead. The rendered prompt is put in Gemini cached
+    content, so a request carries just the conversation and the user's
+    message and refers to the cache by name. The cache is recreated shortly
+    before its TTL runs out and whenever the template changes. If it can't
+    be created (e.g. the prompt is below the model's minimum cacheable
+    size), the prompt is sent as the system instruction instead and creation
+    is retried later. The file is re-read only when its mtime changes, so
+    prompt edits still take effect without a restart.
+
+    Attributes:
+        model (str): Gemini model identifier.
+        _client (genai.Client): The shared client, holding its connection pool.
+        _prompt_path (pathlib.Path): The prompt template file.
+        _client_nick (str): The bot's own IRC nick, rendered into the prompt.
+        _prompt_mtime (int | None): mtime of the template last loaded.
+        _prompt (str): The rendered system prompt.
+        _config (types.GenerateContentConfig): Request settings for the
+            current prompt, referring to the cache when there is one.
+        _cache_name (str | None): The cached content holding the prompt.
+        _cache_renew_at (float): `time.monotonic()` after which the cache is
+            recreated, or creation is retried.
+        _CACHE_TTL (int): Seconds a cache lives on Gemini's side.
+        _CACHE_MARGIN (int): Seconds before expiry that the cache is renewed.
+        _CACHE_RETRY (int): Seconds to wait after a failed cache creation.
+    """
+
+    _CACHE_TTL = 3600
+    _CACHE_MARGIN = 300
+    _CACHE_RETRY = 600
+
+    def __init__(self, api_key, model, prompt_path, client_nick):
+        self.model = model
+        self._client = genai.Client(api_key=api_key)
+        self._prompt_path = prompt_path
+        self._client_nick = client_nick
+        self._prompt_mtime = None
+        self._prompt = ""
+        self._config = None
+        self._cache_name = None
+        self._cache_renew_at = 0.0
+
+    def system_prompt(self):
+        """Return the system prompt, reloading the template first if the
+        file has changed.
+
+        :return: The rendered system prompt.
+        :rtype: str
+        """
+        self._reload_prompt()
+        return self._prompt
+
+    def generate(self, nick, message, current_convo):
+        """Ask the model for a reply to a user's message.
+
+        :param str nick: IRC nick of the user sending the message.
+        :param str message: The user's message text.
+        :param str current_convo: Recent channel conversation.
+        :return: The model's response.
+        :rtype: types.GenerateContentResponse
+        """
+        self._reload_prompt()
+        if time.monotonic() >= self._cache_renew_at:
+            self._renew_cache()
+        contents = [current_convo, f"<{nick}> {message}"]
+        try:
+            return self._client.models.generate_content(model=self.model, config=self._config, contents=contents)
+        except errors.APIError as exc:
+            if self._cache_name is None or exc.code not in (403, 404):
+                raise
+            # the cache is gone early; send the prompt itself until it's rebuilt
+            logger.warning(f"LLM prompt cache {self._cache_name} unavailable: {exc}")
+            self._use_cache(None)
+            self._cache_renew_at = time.monotonic() + self._CACHE_RETRY
+            return self._client.models.generate_content(model=self.model, config=self._config, contents=contents)
+
+    def _reload_prompt(self):
+        """Re-read and render the template if its mtime has changed."""
+        mtime = os.stat(self._prompt_path).st_mtime_ns
+        if mtime == self._prompt_mtime:
+            return
+        with open(self._prompt_path, 'r') as f:
+            template = f.read()
+        if "{current_convo}" in template:
+            logger.warning(f"{self._prompt_path} still has {{current_convo}}; the conversation is now sent "
+                           "with each request, so it is left out of the prompt")
+        self._prompt = template.format(current_convo="", client_nick=self._client_nick)
+        if self._prompt_mtime is not None:
+            logger.info(f"Reloaded LLM prompt from {self._prompt_path}")
+        self._prompt_mtime = mtime
+        self._use_cache(None)
+        self._cache_renew_at = 0.0
+
+    def _renew_cache(self):
+        """Put the current prompt in a new cached content, falling back to
+        sending it with each request if that fails."""
+        try:
+            cache = self._client.caches.create(
+                model=self.model,
+                config=types.CreateCachedContentConfig(
+                    system_instruction=self._prompt,
+                    ttl=f"{self._CACHE_TTL}s",
+                    display_name="garybot-prompt",
+                ),
+            )
+        except errors.APIError as exc:
+            if self._cache_name is None:
+                logger.info(f"Not caching the LLM prompt, sending it with each request: {exc}")
+            self._use_cache(None)
+            self._cache_renew_at = time.monotonic() + self._CACHE_RETRY
+            return
+        self._use_cache(cache.name)
+        self._cache_renew_at = time.monotonic() + self._CACHE_TTL - self._CACHE_MARGIN
+
+    def _use_cache(self, name):
+        """Point the request settings at cached content `name`, or at the
+        prompt itself if None."""
+        self._cache_name = name
+        prompt = {"cached_content": name} if name else {"system_instruction": self._prompt}
+        self._config = types.GenerateContentConfig(
+            response_mime_type='application/json',
+            response_schema=list[BotResponse],
+            max_output_tokens=2000,
+            **prompt,
+        )
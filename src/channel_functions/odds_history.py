@@ -0,0 +1,233 @@
+"""Line-movement history for `.sbmove`.
+
+Every odds fetch is recorded as compact rows: one per outcome whose price or
+point changed since the last fetch, keyed by integer event, market and team
+IDs. A line that hasn't moved costs nothing, so a game day of refreshes
+every couple of minutes adds a few hundred rows instead of a JSON blob per
+fetch. Events are dropped `retention_days` after they start.
+
+sqlite> .schema lines
+CREATE TABLE lines (
+    event_id INTEGER NOT NULL,
+    market_id INTEGER NOT NULL,
+    team_id INTEGER NOT NULL,
+    ts INTEGER NOT NULL,
+    price INTEGER,
+    point REAL,
+    PRIMARY KEY (event_id, market_id, team_id, ts)) WITHOUT ROWID;
+"""
+from datetime import datetime
+
+from dateutil import tz
+from loguru import logger
+
+from src.client.database import migrate
+
+
+# each entry upgrades the schema by one version; see `PRAGMA user_version`
+_MIGRATIONS = (
+    (
+        """CREATE TABLE IF NOT EXISTS teams (
+               id INTEGER PRIMARY KEY,
+               name TEXT NOT NULL UNIQUE)""",
+        """CREATE TABLE IF NOT EXISTS markets (
+               id INTEGER PRIMARY KEY,
+               name TEXT NOT NULL UNIQUE)""",
+        """CREATE TABLE IF NOT EXISTS events (
+               id INTEGER PRIMARY KEY,
+               event_key TEXT NOT NULL UNIQUE,
+               sport TEXT NOT NULL,
+               home_id INTEGER NOT NULL,
+               away_id INTEGER NOT NULL,
+               commence INTEGER NOT NULL)""",
+        "CREATE INDEX IF NOT EXISTS events_commence ON events (commence)",
+        """CREATE TABLE IF NOT EXISTS lines (
+               event_id INTEGER NOT NULL,
+               market_id INTEGER NOT NULL,
+               team_id INTEGER NOT NULL,
+               ts INTEGER NOT NULL,
+               price INTEGER,
+               point REAL,
+               PRIMARY KEY (event_id, market_id, team_id, ts)) WITHOUT ROWID""",
+    ),
+)
+
+
+class OddsHistory:
+    """Records odds snapshots and answers line-movement queries.
+
+    All SQLite work, including the change detection, runs on the Database's
+    worker thread: `record` hands over the raw games and returns once they
+    are stored.
+
+    Attributes:
+        _db (Database): The odds history database.
+        _retention (float): Seconds after an event starts that its lines are
+            kept.
+        _ids (dict): `(table, name) -> id` for teams, markets and events
+            already looked up or created. Only touched on the worker thread.
+        _last (dict): `(event_id, market_id, team_id) -> (price, point)` as of
+            the latest stored row, so unchanged lines are skipped without a
+            query. Only touched on the worker thread.
+        _pruned_at (float): When old events were last deleted.
+        _PRAGMAS (tuple[str]): Connection settings applied before migrating.
+        _PRUNE_EVERY (float): Seconds between retention passes.
+    """
+
+    _PRAGMAS = (
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+    )
+    _PRUNE_EVERY = 3600
+
+    def __init__(self, db, retention_days=30):
+        self._db = db
+        self._retention = retention_days * 86400
+        self._ids = {}
+        self._last = None
+        self._pruned_at = 0.0
+
+    def migrate(self):
+        """Create or upgrade the schema. Call once before recording."""
+        for pragma in self._PRAGMAS:
+            self._db.execute(pragma, label="pragma")
+        self._db.run(migrate, _MIGRATIONS, "odds history", label="schema")
+
+    def record(self, sport_key, games, fetched_at):
+        """Store the lines that changed since the previous fetch.
+
+        :param str sport_key: The Odds API sport key the games belong to.
+        :param list games: Game dicts from the API.
+        :param float fetched_at: When the games were fetched.
+        :return: The number of rows written.
+        :rtype: int
+        """
+        written = self._db.run(self._record, sport_key, games, int(fetched_at), label="record")
+        if fetched_at - self._pruned_at >= self._PRUNE_EVERY:
+            self._pruned_at = fetched_at
+            self._db.run(self._prune, int(fetched_at) - self._retention, label="prune")
+        return written
+
+    def movement(self, event_key):
+        """Return every stored change for an event, oldest first.
+
+        Served straight from the `lines` primary key.
+
+        :param str event_key: The API's event ID.
+        :return: `(market, team, ts, price, point)` rows ordered by market,
+            team and time.
+        :rtype: list[tuple]
+        """
+        return self._db.execute(
+            """SELECT m.name, t.name, l.ts, l.price, l.point
+               FROM events e
+               JOIN lines l ON l.event_id = e.id
+               JOIN markets m ON m.id = l.market_id
+               JOIN teams t ON t.id = l.team_id
+               WHERE e.event_key = ?
+               ORDER BY l.market_id, l.team_id, l.ts""",
+            (event_key,),
+            label="movement",
+        )
+
+    def close(self):
+        """Close the underlying database."""
+        self._db.close()
+
+    def _record(self, conn, sport_key, games, ts):
+        """Diff games against the last stored lines and insert the changes.
+        Runs on the worker thread.
+
+        A game with a malformed market or outcome is skipped whole. `_last`
+        only takes the new lines once they are committed; if the write
+        fails, the transaction is rolled back and the cached IDs, which may
+        name rows that no longer exist, are dropped.
+        """
+        if self._last is None:
+            self._last = self._load_last(conn, ts - self._retention)
+        changes = {}
+        try:
+            for game in games:
+                try:
+                    commence = int(datetime.strptime(game['commence_time'], '%Y-%m-%dT%H:%M:%SZ')
+                                   .replace(tzinfo=tz.UTC).timestamp())
+                    lines = [(market['key'], outcome['name'], (outcome.get('price'), outcome.get('point')))
+                             for market in game['bookmakers'][0]['markets']
+                             for outcome in market['outcomes']]
+                    event_key, home, away = game['id'], game['home_team'], game['away_team']
+                except (IndexError, KeyError, TypeError, ValueError):
+                    continue
+                event_id = self._event_id(conn, event_key, sport_key, home, away, commence)
+                for market, team, line in lines:
+                    key = (event_id, self._name_id(conn, 'markets', market), self._name_id(conn, 'teams', team))
+                    if changes.get(key, self._last.get(key)) != line:
+                        changes[key] = line
+            conn.executemany("INSERT OR REPLACE INTO lines VALUES (?, ?, ?, ?, ?, ?)",
+                             [(*key, ts, *line) for key, line in changes.items()])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            self._ids.clear()
+            raise
+        self._last.update(changes)
+        return len(changes)
+
+    def _name_id(self, conn, table, name):
+        """Return the integer ID of a team or market name, creating it if
+        needed. Runs on the worker thread.
+        """
+        cached = self._ids.get((table, name))
+        if cached is not None:
+            return cached
+        conn.execute(f"INSERT OR IGNORE INTO {table} (name) VALUES (?)", (name,))
+        row_id = conn.execute(f"SELECT id FROM {table} WHERE name = ?", (name,)).fetchone()[0]
+        self._ids[(table, name)] = row_id
+        return row_id
+
+    def _event_id(self, conn, event_key, sport_key, home, away, commence):
+        """Return the integer ID of an event, creating it if needed. Runs on
+        the worker thread.
+        """
+        cached = self._ids.get(('events', event_key))
+        if cached is not None:
+            return cached
+        conn.execute(
+            """INSERT OR IGNORE INTO events (event_key, sport, home_id, away_id, commence)
+               VALUES (?, ?, ?, ?, ?)""",
+            (event_key, sport_key, self._name_id(conn, 'teams', home),
+             self._name_id(conn, 'teams', away), commence),
+        )
+        row_id = conn.execute("SELECT id FROM events WHERE event_key = ?", (event_key,)).fetchone()[0]
+        self._ids[('events', event_key)] = row_id
+        return row_id
+
+    @staticmethod
+    def _load_last(conn, since):
+        """Load the latest stored line of every outcome of every event still
+        within retention. Runs on the worker thread.
+        """
+        rows = conn.execute(
+            """SELECT l.event_id, l.market_id, l.team_id, l.price, l.point
+               FROM lines l
+               JOIN events e ON e.id = l.event_id
+               WHERE e.commence >= ?
+               ORDER BY l.event_id, l.market_id, l.team_id, l.ts""",
+            (since,),
+        )
+        return {(event_id, market_id, team_id): (price, point)
+                for event_id, market_id, team_id, price, point in rows}
+
+    def _prune(self, conn, before):
+        """Delete events that started before `before`, and their lines. Runs
+        on the worker thread.
+        """
+        with conn:
+            old = [row[0] for row in conn.execute("SELECT id FROM events WHERE commence < ?", (before,))]
+            conn.executemany("DELETE FROM lines WHERE event_id = ?", [(event_id,) for event_id in old])
+            conn.executemany("DELETE FROM events WHERE id = ?", [(event_id,) for event_id in old])
+        old = set(old)
+        self._last = {key: line for key, line in self._last.items() if key[0] not in old}
+        for key in [key for key, value in self._ids.items() if key[0] == 'events' and value in old]:
+            del self._ids[key]
+        if old:
+            logger.info(f"Pruned line history for {len(old)} events")
@@ -1,16 +1,22 @@
 """
 sportsbook.py  –  IRC .sb command handler
-Usage: .sb <league> <city or team name>
+Usage: .sb [league] <city, team name or abbreviation>
        .sb nfl chiefs
        .sb nba los angeles
+       .sb kc
 """
 
-import os
+import re
+from collections import deque
 from datetime import datetime
+from math import exp
 from time import time
 
+import gevent
 import requests
 from dateutil import tz
+from gevent.event import AsyncResult
+from loguru import logger
 
 
 SPORT_KEYS = {
@@ -22,15 +28,32 @@ SPORT_KEYS = {
 }
 
 VALID_LEAGUES = ', '.join(SPORT_KEYS)
-USAGE = f"Correct syntax is .sb <league> <team>  —  valid leagues: {VALID_LEAGUES}"
+USAGE = f"Correct syntax is .sb [league] <team>  —  valid leagues: {VALID_LEAGUES}"
 
 BOOKMAKER     = 'draftkings'
-CACHE_TTL     = 600  # seconds
-
-_cache: dict = {}  # { sport_key: {'data': [...], 'fetched_at': float} }
-
-
-def sportsbook(nick, word_list, api_key):
+CACHE_TTL     = 600    # seconds before cached odds are refreshed, game day
+TTL_NEAR      = 120    # ... once the next game is within NEAR_WINDOW
+TTL_FAR       = 3600   # ... when the next game is more than a day away
+TTL_IDLE      = 21600  # ... when the league has no games (off-season)
+TTL_MIN       = 60     # the TTL never drops below this
+NEAR_WINDOW   = 3 * 3600
+MAX_STALE     = 3600   # seconds past expiry stale odds may still be served while refreshing
+HOT_WINDOW    = 3600   # leagues requested this recently are kept warm
+REFRESH_AHEAD = 0.8    # warm leagues are refreshed at this fraction of their TTL
+REFRESH_TICK  = 5      # seconds between refresher passes
+DEMAND_BUSY   = 10     # a league requested this often per HOT_WINDOW gets half the TTL
+DEMAND_QUIET  = 2      # ... and one requested less often than this, double
+QUOTA_LOW     = 0.25   # below this fraction of quota left, TTLs stretch ...
+QUOTA_STRETCH = 8      # ... by up to this factor as the quota runs out
+RETRY_MIN     = 30     # seconds before retrying a league whose fetch failed ...
+RETRY_MAX     = 1800   # ... doubling per consecutive failure up to this
+TYPO_MIN_LEN  = 5     # names at least this long also match with one typo
+MAX_LISTED    = 5     # teams listed when a search is ambiguous
+
+_NON_ALNUM = re.compile(r'[^a-z0-9 ]+')
+
+
+def sportsbook(nick, word_list, odds):
     """
     Handle a .sb IRC command and return the reply string.
 
@@ -39,75 +62,607 @@ def sportsbook(nick, word_list, api_key):
 
     :param str nick: IRC nick of the user who issued the command.
     :param list word_list: List of command words (e.g. ['.sb', 'nfl', 'chiefs']).
-    :param str api_key: API key for The Odds API.
+        Without a league (e.g. ['.sb', 'chiefs']) every league is searched,
+        fetching the ones that aren't cached concurrently, so the answer
+        doesn't depend on what happens to be cached; leagues whose odds
+        couldn't be fetched are named in the reply. A query matching more
+        than one team gets the candidates listed instead of a game.
+    :param OddsBook odds: The shared in-memory odds cache.
     :return: Reply string to send back to IRC.
     :rtype: str
     """
-    if len(word_list) < 3 or word_list[1].lower() not in SPORT_KEYS:
+    if len(word_list) < 2:
         return f"{nick}: {USAGE}"
 
+    if word_list[1].lower() in SPORT_KEYS:
+        if len(word_list) < 3:
+            return f"{nick}: {USAGE}"
+        league  = word_list[1].lower()
+        query   = ' '.join(word_list[2:]).lower()
+        books   = odds.get_many([league], hot=True)
+        matches = _search(books, query)
+    else:
+        league  = None
+        query   = ' '.join(word_list[1:]).lower()
+        books   = odds.get_many(list(SPORT_KEYS))
+        matches = _search(books, query)
+
+    if not books:
+        return f"{nick}: Couldn't fetch odds right now. Try again later."
+    missing = [name.upper() for name in SPORT_KEYS if name not in books] if league is None else []
+    note = f" (couldn't search {', '.join(missing)})" if missing else ""
+    if not matches:
+        where = f"{league.upper()} " if league else ""
+        return f"{nick}: No upcoming {where}game found for '{query}'.{note}"
+    ambiguous = _ambiguous(matches, query)
+    if ambiguous:
+        return f"{nick}: {ambiguous}{note}"
+    game = min((game for _, game in matches), key=lambda g: g['commence_time'])
+
+    reply = _format_reply(game)
+    return f"{nick}: {reply}{note}"
+
+
+class OddsBook(gevent.Greenlet):
+    """Keeps odds in memory so `.sb` rarely waits on The Odds API.
+
+    - Leagues requested within `HOT_WINDOW` are refreshed in the background
+      shortly before they expire, so on game day the cache stays warm.
+    - Expired odds are served immediately while a refresh runs in the
+      background (stale-while-revalidate), up to `MAX_STALE` old.
+    - Concurrent misses for the same sport key share one in-flight request
+      (single-flight) instead of each paying for their own.
+    - Each league's TTL adapts (see `_ttl`) to how soon its next game starts,
+      how often it's asked for and how much of the API quota is left, which
+      the API reports in response headers on every call.
+    - A league whose fetch fails (API down, bad key, quota exhausted) isn't
+      fetched again until its backoff runs out: `RETRY_MIN` seconds, doubling
+      per consecutive failure up to `RETRY_MAX`. Cached odds are still served
+      meanwhile.
+
+    Attributes:
+        quota (dict): The latest `remaining`, `used` and `last` (cost of the
+            last call) quota figures from the API, and `updated_at`.
+        hits (int): Requests answered with fresh cached odds.
+        stale_hits (int): Requests answered with expired odds while a refresh
+            runs in the background.
+        misses (int): Requests that had to wait for the API.
+        api_calls (int): Requests made to The Odds API.
+        _stop_event (Event): Signals the refresher to stop.
+        _history (OddsHistory | None): Where every fetch is recorded for
+            `.sbmove`, if enabled.
+        _api_key (str): API key for The Odds API.
+        _http (HttpClient): The shared HTTP client.
+        _cache (dict): `{sport_key: {'data': [...], 'index': (exact, typos),
+            'fetched_at': float}}`, where the index is built by
+            `_build_index` whenever odds are fetched.
+        _inflight (dict[str, AsyncResult]): Refreshes currently running.
+        _requested_at (dict[str, float]): When each sport key was last asked
+            for, used to decide which leagues are hot.
+        _demand (dict[str, float]): Per sport key, requests per HOT_WINDOW
+            as an exponentially decaying count as of `_requested_at`.
+        _quota_samples (deque): Recent `(time, used)` pairs, for the burn
+            rate.
+        _retry_at (dict[str, float]): Per sport key whose last fetch failed,
+            the earliest time it may be fetched again.
+        _failures (dict[str, int]): Consecutive failed fetches per sport key.
+    """
+
+    def __init__(self, stop_event, app_config, http, history=None):
+        gevent.Greenlet.__init__(self)
+        self._stop_event = stop_event
+        self._history = history
+        self._api_key = app_config.odds_api_key.get_secret_value()
+        self._http = http
+        self._cache = {}
+        self._inflight = {}
+        self._requested_at = {}
+        self._demand = {}
+        self.quota = {}
+        self._quota_samples = deque(maxlen=256)
+        self._retry_at = {}
+        self._failures = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.api_calls = 0
+
+    def _run(self):
+        """Refresh hot leagues ahead of expiry until the stop event is set,
+        then close the line history."""
+        if self._history is not None:
+            self._history.migrate()
+        logger.info("OddsBook started.")
+        try:
+            while not self._stop_event.wait(REFRESH_TICK):
+                now = time()
+                for sport_key, requested_at in list(self._requested_at.items()):
+                    if now - requested_at >= HOT_WINDOW or now < self._retry_at.get(sport_key, 0.0):
+                        continue
+                    entry = self._cache.get(sport_key)
+                    if entry is None or now - entry['fetched_at'] >= self._ttl(sport_key, entry, now) * REFRESH_AHEAD:
+                        self._refresh_in_background(sport_key)
+        finally:
+            if self._history is not None:
+                self._history.close()
+        logger.info("OddsBook stopped.")
+
+    def get(self, league, hot=True):
+        """Return odds for a league, from memory whenever possible.
+
+        :param str league: League key (e.g. 'nfl', 'nba').
+        :param bool hot: Count this as a request for the league, so the
+            refresher keeps it warm.
+        :return: The games with odds data and their team-name index, or None
+            if there is nothing usable cached and the API request failed.
+        :rtype: tuple[list, tuple[dict, dict]] | None
+        """
+        sport_key = SPORT_KEYS[league]
+        now = time()
+        if hot:
+            self._record_request(sport_key, now)
+        entry = self._cache.get(sport_key)
+        if entry:
+            age = now - entry['fetched_at']
+            ttl = self._ttl(sport_key, entry, now)
+            if age < ttl:
+                self.hits += 1
+            elif age < ttl + MAX_STALE:
+                self.stale_hits += 1
+                self._refresh_in_background(sport_key)
+            else:
+                self.misses += 1
+                entry = self._refresh(sport_key) or entry
+        else:
+            self.misses += 1
+            entry = self._refresh(sport_key)
+        if entry is None:
+            return None
+        return entry['data'], entry['index']
+
+    def get_many(self, leagues, hot=False):
+        """Return odds for several leagues, fetching the missing ones
+        concurrently.
+
+        :param list[str] leagues: League keys.
+        :param bool hot: Count this as a request for each league. A
+            league-less `.sb` search doesn't, so it doesn't keep every league
+            warm.
+        :return: `league -> (games, index)` for every league that has odds.
+        :rtype: dict[str, tuple]
+        """
+        jobs = {league: gevent.spawn(self.get, league, hot) for league in leagues}
+        gevent.joinall(list(jobs.values()))
+        return {league: job.value for league, job in jobs.items() if job.value is not None}
+
+    def stats(self):
+        """Summarize cache effectiveness and API quota use.
+
+        :return: Hit ratio (fresh and stale hits over all requests), request
+            and API call counts, the latest quota figures, the quota burn rate
+            in requests per hour over the recent samples (None until they
+            span a minute), and each cached
+            league's current TTL in seconds.
+        :rtype: dict
+        """
+        now = time()
+        requests_ = self.hits + self.stale_hits + self.misses
+        burn = None
+        if len(self._quota_samples) >= 2:
+            (t0, used0), (t1, used1) = self._quota_samples[0], self._quota_samples[-1]
+            if t1 - t0 >= 60:
+                burn = (used1 - used0) / (t1 - t0) * 3600
+        return {
+            'requests': requests_,
+            'hit_ratio': (self.hits + self.stale_hits) / requests_ if requests_ else None,
+            'api_calls': self.api_calls,
+            'quota': dict(self.quota),
+            'burn_per_hour': burn,
+            'ttl': {sport_key: round(self._ttl(sport_key, entry, now))
+                    for sport_key, entry in self._cache.items()},
+        }
+
+    def _ttl(self, sport_key, entry, now):
+        """How long a league's cached odds stay fresh.
+
+        The base TTL follows the next game: short once it is within
+        `NEAR_WINDOW` (or under way), `CACHE_TTL` on game day, `TTL_FAR` when
+        it's further out and `TTL_IDLE` when there are no games at all. It is
+        halved for busy leagues and doubled for quiet ones, and stretched by
+        up to `QUOTA_STRETCH` as the remaining API quota falls below
+        `QUOTA_LOW`.
+
+        :param str sport_key: The Odds API sport key.
+        :param dict entry: The league's cache entry.
+        :param float now: The current time.
+        :return: The TTL in seconds.
+        :rtype: float
+        """
+        next_start = entry['next_start']
+        if next_start is None:
+            ttl = TTL_IDLE
+        elif next_start - now < NEAR_WINDOW:
+            ttl = TTL_NEAR
+        elif next_start - now < 86400:
+            ttl = CACHE_TTL
+        else:
+            ttl = TTL_FAR
+
+        demand = self._decayed_demand(sport_key, now)
+        if demand >= DEMAND_BUSY:
+            ttl /= 2
+        elif demand < DEMAND_QUIET:
+            ttl *= 2
+
+        remaining, used = self.quota.get('remaining'), self.quota.get('used')
+        if remaining is not None and used is not None and remaining + used > 0:
+            left = remaining / (remaining + used)
+            if left < QUOTA_LOW:
+                ttl *= min(QUOTA_LOW / max(left, 1e-9), QUOTA_STRETCH)
+        return max(ttl, TTL_MIN)
+
+    def _record_request(self, sport_key, now):
+        """Count a request for a league toward its demand."""
+        self._demand[sport_key] = self._decayed_demand(sport_key, now) + 1
+        self._requested_at[sport_key] = now
+
+    def _decayed_demand(self, sport_key, now):
+        """A league's request count, decayed to `now`."""
+        requested_at = self._requested_at.get(sport_key)
+        if requested_at is None:
+            return 0.0
+        return self._demand.get(sport_key, 0.0) * exp((requested_at - now) / HOT_WINDOW)
+
+    def _record_quota(self, headers):
+        """Record the quota figures The Odds API sends with every response."""
+        quota = {}
+        for field in ('remaining', 'used', 'last'):
+            value = headers.get(f'x-requests-{field}')
+            if value is not None:
+                try:
+                    quota[field] = int(float(value))
+                except ValueError:
+                    continue
+        if not quota:
+            return
+        now = time()
+        self.quota.update(quota, updated_at=now)
+        if 'used' in quota:
+            self._quota_samples.append((now, quota['used']))
+        if 'remaining' in quota and 'used' in quota and quota['remaining'] < (quota['remaining'] + quota['used']) * QUOTA_LOW:
+            logger.warning(f"Odds API quota low: {quota['remaining']} requests left")
+
+    def _refresh_in_background(self, sport_key):
+        """Start a refresh unless one is already running or the league is
+        backing off after a failure."""
+        if sport_key not in self._inflight and time() >= self._retry_at.get(sport_key, 0.0):
+            gevent.spawn(self._refresh, sport_key)
+
+    def _refresh(self, sport_key):
+        """Fetch fresh odds, joining the in-flight request if there is one.
+
+        :param str sport_key: The Odds API sport key.
+        :return: The new cache entry, or None if the request failed or the
+            league is backing off after a failure.
+        :rtype: dict | None
+        """
+        inflight = self._inflight.get(sport_key)
+        if inflight is not None:
+            return inflight.get()
+        if time() < self._retry_at.get(sport_key, 0.0):
+            return None
+        result = self._inflight[sport_key] = AsyncResult()
+        entry = None
+        try:
+            data = self._fetch(sport_key)
+            if data is not None:
+                entry = {
+                    'data': data,
+                    'index': _build_index(data),
+                    'next_start': _next_start(data),
+                    'fetched_at': time(),
+                }
+                self._cache[sport_key] = entry
+                if self._history is not None:
+                    gevent.spawn(self._record_history, sport_key, data, entry['fetched_at'])
+                self._failures.pop(sport_key, None)
+                self._retry_at.pop(sport_key, None)
+            else:
+                self._back_off(sport_key)
+        finally:
+            del self._inflight[sport_key]
+            result.set(entry)
+        return entry
+
+    def _back_off(self, sport_key):
+        """Hold off fetching a league after a failed fetch."""
+        failures = self._failures[sport_key] = self._failures.get(sport_key, 0) + 1
+        delay = min(RETRY_MIN * 2 ** (failures - 1), RETRY_MAX)
+        self._retry_at[sport_key] = time() + delay
+        logger.info(f"Not fetching {sport_key} again for {delay}s ({failures} failure(s) in a row).")
+
+    def movement(self, game):
+        """Return the recorded line changes for a game.
+
+        :param dict game: Game dict from the API.
+        :return: `(market, team, ts, price, point)` rows, oldest first per
+            outcome, or None if line history is disabled.
+        :rtype: list[tuple] | None
+        """
+        if self._history is None:
+            return None
+        return self._history.movement(game['id'])
+
+    def _record_history(self, sport_key, data, fetched_at):
+        """Store a fetch in the line history, off the requester's path."""
+        try:
+            self._history.record(sport_key, data, fetched_at)
+        except Exception as exc:
+            logger.warning(f"Failed to record line history for {sport_key}: {exc}")
+
+    def _fetch(self, sport_key):
+        """Fetch odds data for a sport key from The Odds API.
+
+        :param str sport_key: The Odds API sport key.
+        :return: List of games with odds data, or None on failure.
+        :rtype: list | None
+        """
+        self.api_calls += 1
+        try:
+            resp = self._http.get(
+                f"https://api.the-odds-api.com/v4/sports/{sport_key}/odds",
+                params={
+                    'api_key':    self._api_key,
+                    'markets':    'h2h,spreads',
+                    'oddsFormat': 'american',
+                    'dateFormat': 'iso',
+                    'bookmakers': BOOKMAKER,
+                },
+                timeout=10,
+            )
+            self._record_quota(resp.headers)
+            resp.raise_for_status()
+            data = resp.json()
+        except (requests.RequestException, ValueError) as exc:
+            logger.warning(f"Failed to fetch odds for {sport_key}: {exc}")
+            return None
+        if not isinstance(data, list):
+            logger.warning(f"Failed to fetch odds for {sport_key}: unexpected response {type(data).__name__}")
+            return None
+        return data
+
+
+def dot_sbstats(odds):
+    """Report odds cache effectiveness and API quota burn (admin only).
+
+    :param OddsBook odds: The shared in-memory odds cache.
+    :return: A one-line summary.
+    :rtype: str
+    """
+    stats = odds.stats()
+    ratio = f"{stats['hit_ratio']:.0%}" if stats['hit_ratio'] is not None else 'n/a'
+    quota = stats['quota']
+    left = quota.get('remaining', '?')
+    used = quota.get('used', '?')
+    burn = f"{stats['burn_per_hour']:.1f}/h" if stats['burn_per_hour'] is not None else 'n/a'
+    leagues = {key: league for league, key in SPORT_KEYS.items()}
+    ttls = ', '.join(f"{leagues.get(key, key)} {ttl}s" for key, ttl in stats['ttl'].items()) or 'none cached'
+    return (
+        f"[odds] hit ratio {ratio} of {stats['requests']} | "
+        f"API calls {stats['api_calls']} | quota {left} left, {used} used, burn {burn} | "
+        f"TTL: {ttls}"
+    )
+
+
+def dot_sbmove(nick, word_list, odds):
+    """Handle a .sbmove IRC command: show how a game's lines have moved.
+
+    :param str nick: IRC nick of the user who issued the command.
+    :param list word_list: List of command words (e.g. ['.sbmove', 'nfl', 'chiefs']).
+    :param OddsBook odds: The shared in-memory odds cache.
+    :return: Reply string to send back to IRC.
+    :rtype: str
+    """
+    if len(word_list) < 3 or word_list[1].lower() not in SPORT_KEYS:
+        return f"{nick}: Correct syntax is .sbmove <league> <team>  —  valid leagues: {VALID_LEAGUES}"
     league = word_list[1].lower()
     query  = ' '.join(word_list[2:]).lower()
 
-    games = _get_odds(league, api_key)
-    if games is None:
+    book = odds.get(league)
+    if book is None:
         return f"{nick}: Couldn't fetch odds right now. Try again later."
-
-    game = _find_game(games, query)
-    if game is None:
+    matches = _find_teams(book[0], query, book[1])
+    if not matches:
         return f"{nick}: No upcoming {league.upper()} game found for '{query}'."
+    ambiguous = _ambiguous(matches, query)
+    if ambiguous:
+        return f"{nick}: {ambiguous}"
+    game = matches[0][1]
 
-    reply = _format_reply(game)
-    return f"{nick}: {reply}"
+    rows = odds.movement(game)
+    if not rows:
+        return f"{nick}: No line history for {game['away_team']} @ {game['home_team']} yet."
+    return f"{nick}: {_format_movement(game, rows)}"
 
 
-def _get_odds(league, api_key):
-    """Fetch odds data for the given league, using cache if available.
+def _format_movement(game, rows):
+    """Summarize recorded line changes as opening -> current per outcome,
+    plus the biggest single move in each market.
 
-    :param str league: League key (e.g. 'nfl', 'nba').
-    :param str api_key: API key for The Odds API.
-    :return: List of games with odds data, or None on failure.
-    :rtype: list | None
+    Moneyline moves are measured in cents (the distance between prices with
+    the gap between -100 and +100 removed), spread moves in points.
+
+    :param dict game: Game dict from the API.
+    :param list[tuple] rows: `(market, team, ts, price, point)` rows from
+        `OddsHistory.movement`, oldest first per outcome.
+    :return: Formatted reply string.
+    :rtype: str
     """
-    sport_key = SPORT_KEYS[league]
-    entry = _cache.get(sport_key)
+    outcomes = {}
+    for market, team, ts, price, point in rows:
+        outcomes.setdefault(market, {}).setdefault(team, []).append((ts, price, point))
+
+    parts = [f"{game['away_team']} @ {game['home_team']}"]
+    for market, label in (('h2h', 'ML'), ('spreads', 'Spread')):
+        teams = outcomes.get(market)
+        if not teams:
+            continue
+        value = (lambda p, pt: _cents(p)) if market == 'h2h' else (lambda p, pt: pt)
+        show = (lambda p, pt: f"{p:+d}") if market == 'h2h' else (lambda p, pt: f"{pt:+g}")
+        lines = []
+        swing = None
+        for team, history in teams.items():
+            history = [h for h in history if value(h[1], h[2]) is not None]
+            if not history:
+                continue
+            lines.append(f"{_abbrev(team)} {show(*history[0][1:])} → {show(*history[-1][1:])}")
+            for (_, *before), (ts, *after) in zip(history, history[1:]):
+                move = abs(value(*after) - value(*before))
+                if swing is None or move > swing[0]:
+                    swing = (move, team, ts)
+        if not lines:
+            continue
+        part = f"{label}: {' '.join(lines)}"
+        if swing and swing[0]:
+            part += f" (biggest swing {swing[0]:g} {_abbrev(swing[1])}, {_fmt_epoch(swing[2])})"
+        parts.append(part)
+
+    since = min(ts for _, _, ts, _, _ in rows)
+    parts.append(f"tracked since {_fmt_epoch(since)}")
+    return ' | '.join(parts)
+
+
+def _cents(price):
+    """Put an American price on a continuous scale (-105 -> -5, +105 -> 5)."""
+    if price is None:
+        return None
+    return price + 100 if price < 0 else price - 100
 
-    if entry and (time() - entry['fetched_at']) < CACHE_TTL:
-        return entry['data']
 
-    try:
-        resp = requests.get(
-            f"https://api.the-odds-api.com/v4/sports/{sport_key}/odds",
-            params={
-                'api_key':    api_key,
-                'markets':    'h2h,spreads',
-                'oddsFormat': 'american',
-                'dateFormat': 'iso',
-                'bookmakers': BOOKMAKER,
-            },
-            timeout=10,
-        )
-        resp.raise_for_status()
-    except requests.RequestException:
-        return None
+def _fmt_epoch(ts):
+    """Format an epoch time like `_fmt_time`."""
+    return datetime.fromtimestamp(ts, tz.UTC).astimezone(tz.gettz('America/Chicago')).strftime('%a %b %-d, %-I:%M%p CST')
 
-    data = resp.json()
-    _cache[sport_key] = {'data': data, 'fetched_at': time()}
-    return data
 
+def _next_start(games):
+    """Epoch time of the soonest game, or None if there are none.
 
-def _find_game(games, query):
-    """Find the first game where the query matches either team name.
+    Games already under way count as starting now-ish (their start is in the
+    past), which keeps the TTL short while they're on.
+
+    :param list games: List of game dicts from the API.
+    :rtype: float | None
+    """
+    starts = [datetime.strptime(game['commence_time'], '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo=tz.UTC).timestamp()
+              for game in games]
+    return min(starts, default=None)
+
+
+def _search(books, query):
+    """Find the teams a query could mean across several leagues.
+
+    :param dict books: `league -> (games, index)` from `OddsBook.get_many`.
+    :param str query: Lowercased search query.
+    :return: `(team, game)` pairs, see `_find_teams`.
+    :rtype: list[tuple[str, dict]]
+    """
+    return [match for games, index in books.values() for match in _find_teams(games, query, index)]
+
+
+def _find_teams(games, query, index=None):
+    """Find every team the query could mean, with each of its games.
+
+    With an index (see `_build_index`) this is a dict lookup on the
+    normalized query: exact names first, then names within one typo. Without
+    one, or if the index has no match, the games are scanned for a substring
+    match as a fallback.
 
     :param list games: List of game dicts from the API.
     :param str query: Lowercased search query (e.g. 'chiefs').
-    :return: Game dict if found, else None.
-    :rtype: dict | None
+    :param tuple[dict, dict] | None index: The `(exact, typos)` index for
+        `games`.
+    :return: `(team, game)` pairs in game order; empty if nothing matches.
+    :rtype: list[tuple[str, dict]]
+    """
+    if index is not None:
+        exact, typos = index
+        key = _normalize(query)
+        found = exact.get(key) or typos.get(key)
+        if not found and len(key) >= TYPO_MIN_LEN:
+            for variant in _deletes(key):
+                found = exact.get(variant) or typos.get(variant)
+                if found:
+                    break
+        if found:
+            return found
+    return [(team, game) for game in games for team in (game['home_team'], game['away_team'])
+            if query in team.lower()]
+
+
+def _ambiguous(matches, query):
+    """Describe the candidates if a query matched more than one team.
+
+    :param list[tuple[str, dict]] matches: `(team, game)` pairs from
+        `_find_teams`.
+    :param str query: The query, for the reply.
+    :return: A reply listing the teams, or None if only one team matched.
+    :rtype: str | None
+    """
+    teams = list(dict.fromkeys(team for team, _ in matches))
+    if len(teams) < 2:
+        return None
+    shown = ', '.join(teams[:MAX_LISTED])
+    if len(teams) > MAX_LISTED:
+        shown += f" and {len(teams) - MAX_LISTED} more"
+    return f"'{query}' could be {shown}. Add the league or more of the name."
+
+
+def _build_index(games):
+    """Index games by every name a user might call a team.
+
+    Each team is keyed by its full name, city, nickname, the abbreviation
+    `_abbrev` produces and each word of its name that is at least four
+    letters long (so 'new' or 'san' don't match half the league). Keys of at least
+    `TYPO_MIN_LEN` characters are also stored with each single character
+    deleted, which lets `_find_teams` match a query with one missing, extra,
+    wrong or transposed letter using only dict lookups.
+
+    :param list games: List of game dicts from the API, soonest first.
+    :return: `(exact, typos)`, each mapping a normalized key to the
+        `(team, game)` pairs it matches in the games' original order.
+    :rtype: tuple[dict[str, list], dict[str, list]]
     """
+    exact, typos = {}, {}
     for game in games:
-        if query in game['home_team'].lower() or query in game['away_team'].lower():
-            return game
-    return None
+        for team in (game['home_team'], game['away_team']):
+            name = _normalize(team)
+            words = name.split()
+            keys = {name, words[-1], ' '.join(words[:-1]), _abbrev(team).lower()}
+            keys.update(word for word in words if len(word) >= 4)
+            keys.discard('')
+            for key in keys:
+                _index_add(exact, key, team, game)
+                if len(key) >= TYPO_MIN_LEN:
+                    for variant in _deletes(key):
+                        _index_add(typos, variant, team, game)
+    return exact, typos
+
+
+def _index_add(index, key, team, game):
+    """Append a team's game to an index key, once."""
+    bucket = index.setdefault(key, [])
+    if not bucket or bucket[-1][1] is not game or bucket[-1][0] != team:
+        bucket.append((team, game))
+
+
+def _deletes(word):
+    """Every variant of `word` with exactly one character removed."""
+    return {word[:i] + word[i + 1:] for i in range(len(word))}
+
+
+def _normalize(name):
+    """Lowercase a name and strip punctuation and extra whitespace."""
+    return ' '.join(_NON_ALNUM.sub('', name.lower()).split())
 
 
 def _format_reply(game):
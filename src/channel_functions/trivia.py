@@ -1,89 +1,467 @@
 """
+Every player's stats are stored in SQLite. Players who are playing are kept
+in memory and written back in batches, so answering never waits on a
+commit; idle players are dropped from memory once their stats are saved:
+
+sqlite> .schema trivia_scores
+CREATE TABLE trivia_scores (
+    key TEXT PRIMARY KEY,
+    nick TEXT NOT NULL,
+    asked INTEGER NOT NULL,
+    correct INTEGER NOT NULL,
+    updated_at REAL NOT NULL) WITHOUT ROWID;
+CREATE INDEX trivia_scores_rank ON trivia_scores (correct DESC, asked, key);
 """
+import bisect
 import requests
 import random
+import sqlite3
+import time
+from collections import deque
 
 import gevent
 from gevent.queue import Queue, Empty
 from loguru import logger
 
+from src.client.database import migrate
+
+
+# each entry upgrades the schema by one version; see `PRAGMA user_version`
+_MIGRATIONS = (
+    (
+        """CREATE TABLE IF NOT EXISTS trivia_scores (
+               key TEXT PRIMARY KEY,
+               nick TEXT NOT NULL,
+               asked INTEGER NOT NULL,
+               correct INTEGER NOT NULL,
+               updated_at REAL NOT NULL) WITHOUT ROWID""",
+    ),
+    (
+        "CREATE INDEX IF NOT EXISTS trivia_scores_rank ON trivia_scores (correct DESC, asked, key)",
+    ),
+)
+
+
+class Scoreboard:
+    """Trivia stats in SQLite, with the active players and the top of the
+    leaderboard held in memory.
+
+    A player's row is read the first time they play after a restart (or
+    after being evicted) and kept in memory while they keep playing.
+    Changes are written back in batches by `flush`, and `evict` drops
+    players who have been idle for a while once their changes are saved, so
+    memory follows the active players rather than everyone who ever played.
+    Stats are keyed by the lowercased nick; the nick as last seen is kept
+    for display.
+
+    The best `_TOP_KEEP` players are kept as a sorted list of
+    `(-correct, asked, key, nick)`, updated by `record`, so `top` is a slice
+    and only goes back to the database when players falling out of the list
+    leave it too short. `rank` counts the players ahead along the
+    `trivia_scores_rank` index and corrects the count for the players in
+    memory, whose unsaved changes the database doesn't have yet.
+
+    Attributes:
+        _db (Database): The trivia database.
+        _scores (dict[str, list]): `key -> [nick, asked, correct, last_used]`
+            for the players in memory, `last_used` being `time.monotonic()`.
+        _stored (dict[str, tuple | None]): For the players in memory,
+            `(asked, correct)` as the database has them, or None if it has
+            no row for them yet. Only written on the worker thread, so it
+            always matches what a query there sees.
+        _top (list[tuple[int, int, str, str]]): The leaderboard's head,
+            best first.
+        _top_complete (bool): Whether `_top` holds every ranked player, so
+            anyone may be added to it.
+        _dirty (set[str]): Keys changed since the last flush.
+        _flushing (set[str]): Keys being written by the flush in progress.
+        _migrated (bool): Whether `migrate` has run.
+        _TOP_KEEP (int): How many leaders are kept in memory.
+    """
+
+    _TOP_KEEP = 20
+
+    def __init__(self, db):
+        self._db = db
+        self._scores = {}
+        self._stored = {}
+        self._top = []
+        self._top_complete = False
+        self._dirty = set()
+        self._flushing = set()
+        self._migrated = False
+
+    def migrate(self):
+        """Create or upgrade the schema and read the leaderboard's head. Does
+        nothing if it has already run, so unsaved changes survive an actor
+        restart."""
+        if self._migrated:
+            return
+        self._db.execute("PRAGMA journal_mode=WAL", label="pragma")
+        self._db.run(migrate, _MIGRATIONS, "trivia", label="schema")
+        self._load_top(self._TOP_KEEP)
+        self._migrated = True
+
+    def get(self, nick):
+        """Return a player's `(asked, correct)`.
+
+        :param str nick: The player's nick.
+        :rtype: tuple[int, int]
+        """
+        score = self._player(nick)
+        return score[1], score[2]
+
+    def record(self, nick, asked=0, correct=0):
+        """Add to a player's stats and move them on the leaderboard. Only
+        reads the database if the player isn't in memory.
+
+        :param str nick: The player's nick.
+        :param int asked: Questions to add.
+        :param int correct: Correct answers to add.
+        :return: None
+        :rtype: None
+        """
+        key = nick.lower()
+        score = self._player(nick)
+        top = self._top
+        i = bisect.bisect_left(top, (-score[2], score[1], key))
+        if i < len(top) and top[i][2] == key:
+            del top[i]
+        score[0] = nick
+        score[1] += asked
+        score[2] += correct
+        self._dirty.add(key)
+        entry = (-score[2], score[1], key, nick)
+        # past the last leader, someone who isn't in memory may be ahead
+        if score[1] and (self._top_complete or (top and entry < top[-1])):
+            bisect.insort(top, entry)
+            if len(top) > self._TOP_KEEP:
+                del top[self._TOP_KEEP:]
+                self._top_complete = False
+
+    def top(self, n):
+        """Return the `n` best players as `(nick, asked, correct)`.
+
+        :param int n: How many players to return.
+        :rtype: list[tuple[str, int, int]]
+        """
+        if len(self._top) < n and not self._top_complete:
+            self._load_top(max(n, self._TOP_KEEP))
+        return [(nick, asked, -correct) for correct, asked, _, nick in self._top[:n]]
+
+    def rank(self, nick):
+        """Return a player's 1-based leaderboard position, or None if they
+        haven't played.
+
+        :param str nick: The player's nick.
+        :rtype: int | None
+        """
+        key = nick.lower()
+        score = self._player(nick)
+        if not score[1]:
+            return None
+        players = [(other, asked, correct) for other, (_, asked, correct, _) in self._scores.items()]
+        return self._db.run(self._count_ahead, (-score[2], score[1], key), players, label="rank") + 1
+
+    def flush(self):
+        """Write every changed player's stats in one transaction. Changes
+        made while the write is in progress are kept for the next flush.
+
+        :return: The number of players written.
+        :rtype: int
+        """
+        if not self._dirty:
+            return 0
+        keys, self._dirty = self._dirty, set()
+        self._flushing = keys
+        now = time.time()
+        rows = [(key, *self._scores[key][:3], now) for key in keys]
+        try:
+            self._db.run(self._write, rows, label="flush")
+        except sqlite3.Error as exc:
+            logger.error(f"Failed to save trivia scores ({len(rows)} players): {exc}")
+            self._dirty |= keys
+            return 0
+        finally:
+            self._flushing = set()
+        return len(rows)
+
+    def evict(self, idle_after):
+        """Drop players idle for `idle_after` seconds whose stats are saved.
+        The leaderboard's head keeps them, since the database now agrees.
+
+        :param float idle_after: Seconds since a player's stats were last
+            used.
+        :return: The number of players dropped.
+        :rtype: int
+        """
+        now = time.monotonic()
+        idle = [key for key, score in self._scores.items()
+                if now - score[3] >= idle_after and key not in self._dirty and key not in self._flushing]
+        for key in idle:
+            del self._scores[key]
+            self._stored.pop(key, None)
+        return len(idle)
+
+    def close(self):
+        """Close the underlying database."""
+        self._db.close()
+
+    def _player(self, nick):
+        """Return a player's `[nick, asked, correct, last_used]`, reading it
+        from the database if they aren't in memory yet."""
+        key = nick.lower()
+        score = self._scores.get(key)
+        if score is None:
+            row = self._db.run(self._load, key, label="player")
+            score = self._scores.get(key)  # another greenlet may have read it meanwhile
+            if score is None:
+                stored_nick, asked, correct = row or (nick, 0, 0)
+                score = self._scores[key] = [stored_nick, asked, correct, 0.0]
+        score[3] = time.monotonic()
+        return score
+
+    def _load_top(self, limit):
+        """Rebuild the leaderboard's head from the `limit` best players.
+
+        Every player in memory is a candidate, so the database only needs to
+        supply the best `limit` of the rest; reading `limit` plus the number
+        in memory covers that whatever their stored rows say.
+        """
+        wanted = limit + len(self._scores)
+        rows = self._db.execute(
+            """SELECT key, nick, asked, correct FROM trivia_scores
+               ORDER BY correct DESC, asked, key LIMIT ?""",
+            (wanted,),
+            label="top",
+        )
+        players = {key: (-correct, asked, key, nick) for key, nick, asked, correct in rows}
+        players.update((key, (-score[2], score[1], key, score[0])) for key, score in self._scores.items())
+        ranked = sorted(entry for entry in players.values() if entry[1])
+        self._top = ranked[:limit]
+        self._top_complete = len(rows) < wanted and len(ranked) <= limit
+
+    def _load(self, conn, key):
+        """Read a player's row and note it as stored. Runs on the worker
+        thread."""
+        row = conn.execute("SELECT nick, asked, correct FROM trivia_scores WHERE key = ?", (key,)).fetchone()
+        self._stored[key] = (row[1], row[2]) if row else None
+        return row
+
+    def _count_ahead(self, conn, mine, players):
+        """Count the players ranked ahead of `mine`, a `(-correct, asked,
+        key)`, given the in-memory `(key, asked, correct)` of `players`.
+        Runs on the worker thread, so `_stored` matches the rows counted."""
+        correct, asked, key = -mine[0], mine[1], mine[2]
+        # three ranges of trivia_scores_rank; an OR would scan instead
+        ahead = conn.execute(
+            """SELECT (SELECT COUNT(*) FROM trivia_scores WHERE correct > ?)
+                    + (SELECT COUNT(*) FROM trivia_scores WHERE correct = ? AND asked < ?)
+                    + (SELECT COUNT(*) FROM trivia_scores WHERE correct = ? AND asked = ? AND key < ?)""",
+            (correct, correct, asked, correct, asked, key),
+        ).fetchone()[0]
+        # swap the database's view of the players in memory for their own
+        for other, other_asked, other_correct in players:
+            stored = self._stored.get(other)
+            if stored is not None and (-stored[1], stored[0], other) < mine:
+                ahead -= 1
+            if (-other_correct, other_asked, other) < mine:
+                ahead += 1
+        return ahead
+
+    def _write(self, conn, rows):
+        """Upsert players' stats and note what the database now holds. Runs
+        on the worker thread."""
+        with conn:
+            conn.executemany(
+                """INSERT INTO trivia_scores VALUES (?, ?, ?, ?, ?)
+                   ON CONFLICT (key) DO UPDATE SET nick = excluded.nick, asked = excluded.asked,
+                   correct = excluded.correct, updated_at = excluded.updated_at""",
+                rows,
+            )
+        for key, _, asked, correct, _ in rows:
+            if key in self._scores:
+                self._stored[key] = (asked, correct)
+
 
 class Trivia(gevent.Greenlet):
     """"""
 
     _CORRECT_SYNTAX = ".tr [AaBbCcDd]"
+    _LOW_WATERMARK = 10     # refill in the background below this many questions
+    _RECENT_SIZE = 500      # questions remembered to avoid repeats
+    _RETRY_AFTER = 30       # seconds to wait after a failed refill
+    _FLUSH_EVERY = 30       # seconds between score write-backs
+    _IDLE_AFTER = 1800      # seconds before an idle player's session is dropped
+    _TOP_SIZE = 5           # players shown by .tr top
 
-    def __init__(self, writer, stop_event, app_config):
+    def __init__(self, outbox, stop_event, http, scoreboard, inbox=None):
         gevent.Greenlet.__init__(self)
-        self.inbox = Queue()
-        self._writer = writer
+        self.inbox = inbox if inbox is not None else Queue()
+        self.heartbeat = time.monotonic()
+        self._outbox = outbox
+        self._http = http
         self._stop_event = stop_event
-        self._main_channel = app_config.irc_main_channel
         self._trivia_url = "https://the-trivia-api.com/v2/questions"
-        self._deck = []
+        self._deck = deque()
+        self._recent = deque(maxlen=self._RECENT_SIZE)
+        self._seen = set()
+        self._refill = None
+        self._retry_at = 0.0
         self._players = {}
+        self._scoreboard = scoreboard
+        self._flusher = None
+        self._flush_at = 0.0
 
     def _run(self):
         """"""
+        self._scoreboard.migrate()
         logger.info("Trivia started.")
-        while not self._stop_event.is_set():
-            try:
-                turn = self.inbox.get(timeout=1)
-            except Empty:
-                continue
-            self._play(turn)
+        self._maybe_refill()
+        self._flush_at = time.monotonic() + self._FLUSH_EVERY
+        try:
+            while not self._stop_event.is_set():
+                self.heartbeat = time.monotonic()
+                try:
+                    turn = self.inbox.get(timeout=1)
+                except Empty:
+                    turn = None
+                if turn is not None:
+                    self._play(turn)
+                if time.monotonic() >= self._flush_at:
+                    self._housekeep()
+        finally:
+            # on a watchdog restart the scoreboard carries over as it is
+            if self._stop_event.is_set():
+                if self._flusher is not None:
+                    self._flusher.join()
+                self._scoreboard.flush()
+                self._scoreboard.close()
+        logger.info("Trivia stopped.")
+
+    def _housekeep(self):
+        """Write scores back in the background and drop idle sessions and
+        players."""
+        now = time.monotonic()
+        self._flush_at = now + self._FLUSH_EVERY
+        if self._flusher is None or self._flusher.dead:
+            self._flusher = gevent.spawn(self._scoreboard.flush)
+        idle = [key for key, session in self._players.items() if now - session['last_seen'] >= self._IDLE_AFTER]
+        for key in idle:
+            del self._players[key]
+        self._scoreboard.evict(self._IDLE_AFTER)
 
     def _play(self, turn):
         """"""
-        player, word_list = turn
+        player, word_list, target = turn
         if len(word_list) > 2:
-            self._send(f"{player}: Correct syntax is {self._CORRECT_SYNTAX}")
+            self._send(target, f"{player}: Correct syntax is {self._CORRECT_SYNTAX}")
+            return
+        session = self._session(target, player)
+        session['last_seen'] = time.monotonic()
+        if len(word_list) == 2 and word_list[1].lower() == 'top':
+            self._send(target, self._leaderboard())
             return
-        if not self._deck:
-            self._replenish_deck()
+        if len(word_list) == 1:
             if not self._deck:
-                self._send(f"{player}: Sorry, I'm having trouble fetching trivia questions right now. Please try again later.")
+                self._maybe_refill()
+                self._send(target, f"{player}: Sorry, no trivia questions are ready yet. Please try again in a moment.")
                 return
-        if player not in self._players:
-            self._create_player(player)
-        if len(word_list) == 1:
-            self._ask_question(player)
+            self._send(target, self._ask_question(player, session))
         elif (answer := word_list[1].lower()) in ('a', 'b', 'c', 'd'):
-            reply = self._compare_answers(player, answer)
-            self._send(reply)
-            self._players[player]['current_answer'] = None
+            reply = self._compare_answers(player, session, answer)
+            self._send(target, reply)
+            session['current_answer'] = None
         else:
-            self._send(f"{player}: Invalid answer. Use {self._CORRECT_SYNTAX}")
+            self._send(target, f"{player}: Invalid answer. Use {self._CORRECT_SYNTAX}")
 
-    def _send(self, message):
+    def _send(self, target, message):
         """"""
-        self._writer.inbox.put(f"PRIVMSG {self._main_channel} :{message}")
+        self._outbox.put(f"PRIVMSG {target} :{message}")
+
+    def _maybe_refill(self):
+        """Start a background refill if the deck is running low, unless one
+        is already running or the last one failed too recently. Never waits
+        on the network itself."""
+        if len(self._deck) >= self._LOW_WATERMARK:
+            return
+        if self._refill is not None or time.monotonic() < self._retry_at:
+            return
+        self._refill = gevent.spawn(self._replenish_deck)
 
     def _replenish_deck(self):
         """"""
         params = {"limit": 30, "difficulties": "medium,hard"}
-        response = requests.get(self._trivia_url, params=params)
-        if response.status_code != 200:
-            logger.error(f"Failed to replenish trivia deck: {response.status_code}")
-            return
-        self._deck = response.json()
+        try:
+            try:
+                response = self._http.get(self._trivia_url, params=params)
+            except requests.RequestException as exc:
+                logger.error(f"Failed to replenish trivia deck: {exc}")
+                self._retry_at = time.monotonic() + self._RETRY_AFTER
+                return
+            if response.status_code != 200:
+                logger.error(f"Failed to replenish trivia deck: {response.status_code}")
+                self._retry_at = time.monotonic() + self._RETRY_AFTER
+                return
+            queued = {self._question_key(q) for q in self._deck}
+            for question_data in response.json():
+                key = self._question_key(question_data)
+                if key in self._seen or key in queued:
+                    continue
+                queued.add(key)
+                self._deck.append(question_data)
+            if len(self._deck) < self._LOW_WATERMARK:
+                # mostly repeats; don't ask again straight away
+                self._retry_at = time.monotonic() + self._RETRY_AFTER
+        finally:
+            self._refill = None
+
+    @staticmethod
+    def _question_key(question_data):
+        """"""
+        return question_data.get('id') or question_data['question']['text']
+
+    def _remember(self, question_data):
+        """Record a question as asked, forgetting the oldest beyond
+        `_RECENT_SIZE`."""
+        if len(self._recent) == self._recent.maxlen:
+            self._seen.discard(self._recent[0])
+        key = self._question_key(question_data)
+        self._recent.append(key)
+        self._seen.add(key)
+
+    def _session(self, target, player):
+        """A player's session in one channel, where their pending answer
+        lives; created on first use."""
+        key = (target.lower(), player.lower())
+        session = self._players.get(key)
+        if session is None:
+            session = self._players[key] = {"current_answer": None, "last_seen": time.monotonic()}
+        return session
 
-    def _create_player(self, player):
+    def _leaderboard(self):
         """"""
-        self._players[player] = {"asked": 0, "correct": 0, "current_answer": None}
+        top = self._scoreboard.top(self._TOP_SIZE)
+        if not top:
+            return "No trivia scores yet. Use .tr to play."
+        ranked = ' | '.join(
+            f"{i}. {nick} {correct}/{asked}" for i, (nick, asked, correct) in enumerate(top, start=1)
+        )
+        return f"Trivia leaderboard: {ranked}"
 
-    def _ask_question(self, player):
+    def _ask_question(self, player, session):
         """"""
         category, question, options_str, correct_option = self._create_trivia_question()
         category = category.replace("_", " ")
-        self._players[player]['current_answer'] = correct_option
-        self._players[player]['asked'] += 1
-        reponse = f"{player}: TRIVIA [{category}]: {question} {options_str}"
-        self._send(reponse)
+        session['current_answer'] = correct_option
+        self._scoreboard.record(player, asked=1)
+        return f"{player}: TRIVIA [{category}]: {question} {options_str}"
 
     def _create_trivia_question(self):
         """"""
-        question_data = self._deck.pop(0)
+        question_data = self._deck.popleft()
+        self._remember(question_data)
+        self._maybe_refill()
         category = question_data['category']
         question = question_data['question']['text']
         correct_answer = question_data['correctAnswer']
@@ -93,21 +471,20 @@ class Trivia(gevent.Greenlet):
         correct_option = 'abcd'[options.index(correct_answer)]
         return category, question, options_str, correct_option
 
-    def _compare_answers(self, player, player_answer):
+    def _compare_answers(self, player, session, player_answer):
         """"""
-        if not self._players[player]['current_answer']:
+        if not session['current_answer']:
             reply = f"{player}: You don't have an active question. Use .tr to get one."
-        elif player_answer == self._players[player]['current_answer']:
-            self._players[player]['correct'] += 1
+        elif player_answer == session['current_answer']:
+            self._scoreboard.record(player, correct=1)
             reply = f"{player}: Correct! Your score is now {self._report_accuracy(player)}."
         else:
-            reply = f"{player}: Incorrect. The correct answer was ({self._players[player]['current_answer']}). Your score is {self._report_accuracy(player)}."
+            reply = f"{player}: Incorrect. The correct answer was ({session['current_answer']}). Your score is {self._report_accuracy(player)}."
         return reply
 
     def _report_accuracy(self, player):
         """"""
-        asked = self._players[player]['asked']
-        correct = self._players[player]['correct']
+        asked, correct = self._scoreboard.get(player)
         accuracy = (correct / asked) * 100
-        return f"{int(accuracy)}% ({correct}/{asked})"
+        return f"{int(accuracy)}% ({correct}/{asked}), rank #{self._scoreboard.rank(player)}"
 
@@ -0,0 +1,171 @@
+"""YouTube link metadata, cached and batched.
+
+Links get reposted and quoted, and several often arrive in the same message
+or within moments of each other. Video summaries are kept in a TTL + LRU
+cache keyed by video ID, and cache misses that arrive within a short window
+are resolved together with one `videos?id=a,b,c` request, which costs one
+unit of API quota no matter how many IDs it carries (up to 50).
+"""
+import time
+from collections import OrderedDict
+
+import gevent
+from gevent.event import AsyncResult
+
+
+def dot_youtube(captures, youtube):
+    """Summarize every YouTube video linked in a message.
+
+    :param list[str] captures: The video IDs captured by the YouTube link
+        trigger, in message order.
+    :param YouTubeMetadata youtube: The shared metadata cache.
+    :returns: One summary per distinct video, joined on a single line.
+    :rtype: str
+    """
+    summaries = youtube.lookup(captures)
+    return " || ".join(summaries[video_id] or "[YouTube] Video not found." for video_id in summaries)
+
+
+class YouTubeMetadata:
+    """A TTL + LRU cache of video summaries in front of a request batcher.
+
+    Attributes:
+        hits (int): Lookups answered from the cache.
+        misses (int): Lookups that had to wait for the API.
+        api_calls (int): Requests made to the YouTube Data API.
+        _api_key (str): A valid YouTube Data API key.
+        _http (HttpClient): The shared HTTP client.
+        _ttl (float): Seconds a summary stays fresh.
+        _maxsize (int): Most summaries kept; the least recently used go first.
+        _window (float): Seconds to wait for more IDs before sending a batch.
+        _cache (OrderedDict): `video_id -> (expires_at, summary or None)`, in
+            least-recently-used order. None records a video that wasn't found.
+        _pending (dict[str, AsyncResult]): IDs waiting for the next batch.
+        _inflight (dict[str, AsyncResult]): IDs in a batch whose request is
+            under way, so a repeat waits for it instead of being fetched
+            again.
+        _flusher (Greenlet | None): The scheduled batch, if any.
+        _API_URL (str): The videos endpoint.
+        _MAX_IDS (int): Most IDs the API accepts per request.
+    """
+
+    _API_URL = "https://youtube.googleapis.com/youtube/v3/videos"
+    _MAX_IDS = 50
+
+    def __init__(self, api_key, http, ttl=600, maxsize=1024, window=0.05):
+        self.hits = 0
+        self.misses = 0
+        self.api_calls = 0
+        self._api_key = api_key
+        self._http = http
+        self._ttl = ttl
+        self._maxsize = maxsize
+        self._window = window
+        self._cache = OrderedDict()
+        self._pending = {}
+        self._inflight = {}
+        self._flusher = None
+
+    def lookup(self, video_ids):
+        """Return a summary for each distinct video ID, from the cache where
+        possible and otherwise from the next batched API request.
+
+        :param list[str] video_ids: The IDs to resolve.
+        :return: `video_id -> summary`, in first-seen order, with None for
+            videos that don't exist.
+        :rtype: dict[str, str | None]
+        :raises requests.RequestException: If the batch request failed.
+        """
+        results = {}
+        for video_id in video_ids:
+            if video_id in results:
+                continue
+            entry = self._cache.get(video_id)
+            if entry and entry[0] > time.monotonic():
+                self._cache.move_to_end(video_id)
+                self.hits += 1
+                results[video_id] = entry[1]
+            else:
+                self.misses += 1
+                results[video_id] = (self._pending.get(video_id) or self._inflight.get(video_id)
+                                     or self._enqueue(video_id))
+        for video_id, value in results.items():
+            if isinstance(value, AsyncResult):
+                results[video_id] = value.get()
+        return results
+
+    def _enqueue(self, video_id):
+        """Add an ID to the next batch, scheduling the batch if needed."""
+        result = self._pending[video_id] = AsyncResult()
+        if self._flusher is None:
+            self._flusher = gevent.spawn_later(self._window, self._flush)
+        return result
+
+    def _flush(self):
+        """Resolve every pending ID, `_MAX_IDS` per request."""
+        self._flusher = None
+        pending, self._pending = self._pending, {}
+        self._inflight.update(pending)
+        video_ids = list(pending)
+        for start in range(0, len(video_ids), self._MAX_IDS):
+            chunk = video_ids[start:start + self._MAX_IDS]
+            try:
+                summaries = self._fetch(chunk)
+            except Exception as exc:
+                for video_id in chunk:
+                    del self._inflight[video_id]
+                    pending[video_id].set_exception(exc)
+                continue
+            for video_id in chunk:
+                summary = summaries.get(video_id)
+                self._store(video_id, summary)
+                del self._inflight[video_id]
+                pending[video_id].set(summary)
+
+    def _fetch(self, video_ids):
+        """Request metadata for up to `_MAX_IDS` videos in one call.
+
+        :param list[str] video_ids: The IDs to request.
+        :return: `video_id -> summary` for the videos that exist.
+        :rtype: dict[str, str]
+        """
+        self.api_calls += 1
+        response = self._http.get(
+            self._API_URL,
+            params={
+                "part": "snippet,contentDetails,statistics",
+                "id": ",".join(video_ids),
+                "key": self._api_key,
+            }
+        )
+        response.raise_for_status()  # Check if the request was successful
+        return {item["id"]: _format(item) for item in response.json().get("items", [])}
+
+    def _store(self, video_id, summary):
+        """Cache a summary, evicting the least recently used beyond `_maxsize`."""
+        self._cache[video_id] = (time.monotonic() + self._ttl, summary)
+        self._cache.move_to_end(video_id)
+        while len(self._cache) > self._maxsize:
+            self._cache.popitem(last=False)
+
+
+def _format(video_info):
+    """Format one `videos` API item for IRC.
+
+    :param dict video_info: An item from the API response.
+    :return: A one-line summary of the video.
+    :rtype: str
+    """
+    published = video_info["snippet"]["publishedAt"]
+    published = published.split("T")[0]  # Extract date part
+    title = video_info["snippet"]["title"]
+    channel = video_info["snippet"]["channelTitle"]
+    duration = video_info["contentDetails"]["duration"]
+    duration = duration[2:].lower()
+    views = video_info["statistics"].get("viewCount", "N/A")
+    views = format(int(views), ",") if views != "N/A" else views
+    likes = video_info["statistics"].get("likeCount", "N/A")
+    likes = format(int(likes), ",") if likes != "N/A" else likes
+    comments = video_info["statistics"].get("commentCount", "N/A")
+    comments = format(int(comments), ",") if comments != "N/A" else comments
+    return f"[YouTube] {title} | {channel} | {duration} | {published} | Views: {views} | Likes: {likes} | Comments: {comments}"
@@ -8,14 +8,25 @@ Usage:
 Uses gevent to handle four actors: a listener that reads from the socket, a dispatcher that processes messages and generates responses, a logger that logs messages to disk, and a writer that sends messages to the server.
 
 The writer just sits on its inbox queue and drains it to the socket.
+
+Only the listener and writer are tied to a connection. When the connection
+drops, the client reconnects with exponential backoff and jitter and builds
+a new listener and writer; everything else (the dispatcher, logger, trivia,
+caches and any replies still queued in the outbox) carries on untouched.
 """
+import random
+import signal
 import socket
 import ssl
+import time
 
 import gevent
+from gevent.event import Event
 from loguru import logger
 
-from src.actors.build import build_actors
+from src.actors.build import build_actors, build_connection_actors
+from src.client.hub_monitor import HubMonitor
+from src.client.metrics import MetricsServer
 
 
 class IRCClient:
@@ -30,40 +41,131 @@ class IRCClient:
         port (int): The IRC server port.
         nick (str): The bot's nickname.
         main_channel (str): The main channel to join.
+        channels (list[str]): Every channel to join, main channel first.
         _sock (ssl.SSLSocket | None): The SSL socket for communication.
         _stop_event (gevent.event.Event): Event to signal actors to stop.
         _app_config: The application configuration object.
+        _backoff_base (float): Delay in seconds before the first reconnect.
+        _backoff_max (float): Longest delay between reconnects.
+        _ca_file (pathlib.Path | None): CA bundle for verifying the server,
+            if not the system store (e.g. a test server's self-signed cert).
+        _STABLE_AFTER (float): A connection that lasted this many seconds
+            resets the backoff.
+        _SHUTDOWN_GRACE (float): Seconds connection actors get to stop before
+            they are killed.
     """
 
     _RECV_TIMEOUT = 5.0
+    _STABLE_AFTER = 60.0
+    _SHUTDOWN_GRACE = 5.0
 
     def __init__(self, app_config):
         self.server = app_config.irc_server
         self.port = int(app_config.irc_port)
         self.nick = app_config.irc_nick # bot's own nick
         self.main_channel = app_config.irc_main_channel
+        self.channels = app_config.channels
 
         self._sock: "ssl.SSLSocket | None" = None
         self._stop_event = gevent.event.Event()
         self._app_config = app_config
+        self._backoff_base = app_config.reconnect_backoff_base
+        self._backoff_max = app_config.reconnect_backoff_max
+        self._ca_file = app_config.irc_ca_file
 
     def start(self):
-        """Connect and start the main listen loop, reconnecting as needed."""
-        self._connect()
-        gevent.sleep(1) # small delay to ensure connection is fully established
+        """Start the long-lived actors, then connect and keep reconnecting
+        until SIGINT or SIGTERM sets the stop event."""
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            gevent.signal_handler(signum, self._stop_event.set)
         logger.info("Starting actors...")
-        actors = build_actors(self._sock, self._stop_event, self._app_config)
-        for actor in actors:
+        outbox, dispatcher, watchdog, odds, metrics, tracer, databases = build_actors(
+            self._stop_event, self._app_config)
+        hub_monitor = None
+        if self._app_config.hub_block_seconds:
+            hub_monitor = HubMonitor(self._app_config.hub_block_seconds)
+            hub_monitor.start()
+            metrics.add_source(hub_monitor.samples)
+        others = [odds, metrics] + ([tracer] if tracer is not None else [])
+        for actor in [*watchdog.actors(), *others]:
+            actor.start()
+        watchdog.start()
+        metrics_server = None
+        if self._app_config.metrics_port:
+            metrics_server = MetricsServer(metrics, self._app_config.metrics_host, self._app_config.metrics_port)
+            metrics_server.start()
+
+        attempt = 0
+        while not self._stop_event.is_set():
+            connected_at = time.monotonic()
+            try:
+                self._connect()
+            except OSError as exc:
+                logger.error(f"Connection failed: {exc}")
+            else:
+                self._serve(outbox, dispatcher, watchdog, metrics, tracer)
+                self._disconnect()
+            if self._stop_event.is_set():
+                break
+            if time.monotonic() - connected_at >= self._STABLE_AFTER:
+                attempt = 0
+            delay = self._backoff(attempt)
+            attempt += 1
+            logger.warning(f"Reconnecting in {delay:.1f}s (attempt {attempt})...")
+            self._stop_event.wait(delay)
+
+        logger.info("Stopping actors...")
+        if metrics_server is not None:
+            metrics_server.stop()
+        if hub_monitor is not None:
+            hub_monitor.stop()
+        gevent.joinall([watchdog, *watchdog.actors(), *others])
+        for db in databases:
+            db.close()
+
+    def _serve(self, outbox, dispatcher, watchdog, metrics, tracer):
+        """Run a Writer and a Listener on the current socket until either
+        fails or the stop event is set.
+
+        :param Outbox outbox: The long-lived outbound queue.
+        :param Dispatcher dispatcher: Receives the lines read from the socket.
+        :param Watchdog watchdog: Supervises the Writer for this connection.
+        :param Metrics metrics: Counts the Writer's output toward its totals.
+        :param Tracer | None tracer: Samples the Listener's lines for tracing.
+        :return: None
+        :rtype: None
+        """
+        conn_stop = Event()
+        writer, listener = build_connection_actors(self._sock, conn_stop, outbox, dispatcher, tracer)
+        metrics.track_writer(writer)
+        for actor in (writer, listener):
+            actor.link(lambda _: conn_stop.set())
             actor.start()
-        gevent.joinall(actors, raise_error=True)
-        self._disconnect()
+        # a wedged writer can't be fixed in place; drop the connection instead
+        watchdog.watch("writer", writer, lambda _: conn_stop.set())
+        gevent.wait([conn_stop, self._stop_event], count=1)
+        conn_stop.set()
+        # the writer exits with the connection; that isn't a failure to restart
+        watchdog.unwatch("writer", writer)
+        gevent.joinall([writer, listener], timeout=self._SHUTDOWN_GRACE)
+        gevent.killall([writer, listener], block=False)
+
+    def _backoff(self, attempt):
+        """Exponential backoff with jitter, so a server restart isn't met by
+        every client reconnecting in lockstep.
+
+        :param int attempt: Reconnects tried since the last stable connection.
+        :return: Seconds to wait, up to `_backoff_max`.
+        :rtype: float
+        """
+        # the exponent is capped so a days-long outage can't overflow the float
+        return random.uniform(0.5, 1.0) * min(self._backoff_max, self._backoff_base * 2 ** min(attempt, 64))
 
     def _connect(self):
         """Open a TLS socket and register with the server."""
         logger.info(f"Connecting to {self.server}:{self.port}...")
-        self._stop_event.clear()
         raw_sock = socket.create_connection((self.server, self.port), timeout=30)
-        ctx = ssl.create_default_context()
+        ctx = ssl.create_default_context(cafile=self._ca_file)
         self._sock = ctx.wrap_socket(raw_sock, server_hostname=self.server)
         self._sock.settimeout(self._RECV_TIMEOUT)
 
@@ -72,7 +174,8 @@ class IRCClient:
         self._sock.sendall((f"NICK {self.nick}" + "\r\n").encode('utf-8'))
         self._sock.sendall((f"USER {self.nick} 0 * :{self.nick}" + "\r\n").encode('utf-8'))
         logger.info(f"Registered as {self.nick}")
-        self._sock.sendall((f"JOIN {self.main_channel}" + "\r\n").encode('utf-8'))
+        for channel in self.channels:
+            self._sock.sendall((f"JOIN {channel}" + "\r\n").encode('utf-8'))
 
     def _disconnect(self):
         """Close the socket and clean up resources."""
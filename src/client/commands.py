@@ -0,0 +1,85 @@
+"""Declarative command table for the Dispatcher.
+
+Every trigger the bot answers to is described here instead of in a chain of
+`if` checks. The Dispatcher binds each spec once at startup (injecting config
+secrets and shared resources) and per message only resolves the few
+arguments that come from the message itself.
+
+Commands are keyed by the first word of a message and cost one dict lookup.
+Passive triggers are regex fragments that the Dispatcher joins into a single
+compiled scanner, so every line is scanned exactly once no matter how many
+passive triggers exist.
+
+To add a command, add an entry to `COMMANDS` (or `PASSIVE_TRIGGERS`); the
+names in `args` and `inject` must match the handler's parameter names.
+"""
+from collections import namedtuple
+
+import src.channel_functions.general as channel_functions
+from src.channel_functions.sportsbook import dot_sbmove, dot_sbstats, sportsbook as dot_sportsbook
+from src.channel_functions.youtube import dot_youtube
+from src.client.metrics import dot_stats
+
+
+CommandSpec = namedtuple("CommandSpec", ["handler", "args", "inject", "route", "admin"], defaults=(False,))
+CommandSpec.__doc__ = """How to run one trigger.
+
+    handler (callable | None): The function to run. None for routes that hand
+        the arguments to another actor instead.
+    args (tuple[str]): Per-message arguments. Each name is a `ParsedMessage`
+        field, `capture` (the text captured by a passive trigger), `captures`
+        (every text it captured in the message) or `current_convo` (the
+        rendered recent conversation).
+    inject (tuple[str]): Arguments bound once at startup. Each name is a
+        Dispatcher resource (e.g. `user_logs_db`) or an app config field;
+        secrets are unwrapped.
+    route (str): `pool` to run on the Dispatcher's greenlet pool, `inline` to
+        run on the Dispatcher itself (only for trivial handlers), or the name
+        of an actor (e.g. `trivia`) whose inbox receives the args as a tuple.
+    admin (bool): Only answer the bot admin (`irc_admin_nick`); anyone else
+        is silently ignored. Defaults to False.
+"""
+
+# `{nick}` is replaced with the bot's escaped nick when the scanner is built
+PASSIVE_TRIGGERS = {
+    "imagine": (
+        r"^imagine unironically\b",
+        CommandSpec(channel_functions.imagine_without_iron, ("message",), (), "pool"),
+    ),
+    "reason": (
+        r"\breason\b",
+        CommandSpec(channel_functions.reason_will_prevail, (), (), "pool"),
+    ),
+    "youtube": (
+        r"(?:youtube\.com\/(?:watch\?v=|embed\/|v\/|shorts\/)|youtu\.be\/)([a-zA-Z0-9_-]{11})",
+        CommandSpec(dot_youtube, ("captures",), ("youtube",), "pool"),
+    ),
+    "mention": (
+        r"^{nick}",
+        CommandSpec(
+            channel_functions.dot_arb,
+            ("nick", "message", "current_convo"),
+            ("llm",),
+            "pool",
+        ),
+    ),
+}
+
+COMMANDS = {
+    ".help": CommandSpec(channel_functions.dot_help, ("nick",), (), "inline"),
+    ".spaghetti": CommandSpec(channel_functions.dot_spaghetti, (), (), "pool"),
+    ".ask": CommandSpec(
+        channel_functions.dot_ask,
+        ("nick", "word_list", "target"),
+        ("user_logs_db",),
+        "pool",
+    ),
+    ".wa": CommandSpec(channel_functions.dot_wolfram, ("nick", "message"), ("wolfram_api_key", "http"), "pool"),
+    ".apod": CommandSpec(channel_functions.dot_apod, ("nick",), ("nasa_api_key", "http"), "pool"),
+    ".haha": CommandSpec(channel_functions.dot_joke, ("nick",), ("http",), "pool"),
+    ".tr": CommandSpec(None, ("nick", "word_list", "target"), (), "trivia"),
+    ".sb": CommandSpec(dot_sportsbook, ("nick", "word_list"), ("odds",), "pool"),
+    ".sbmove": CommandSpec(dot_sbmove, ("nick", "word_list"), ("odds",), "pool"),
+    ".sbstats": CommandSpec(dot_sbstats, (), ("odds",), "inline", admin=True),
+    ".stats": CommandSpec(dot_stats, (), ("metrics",), "inline", admin=True),
+}
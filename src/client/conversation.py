@@ -0,0 +1,79 @@
+"""Recent channel conversation, kept for the chatbot's context.
+
+Every channel line and every bot reply is appended, so appending has to be
+cheap: each line is formatted once and goes into a ring buffer (a `deque`),
+with no list copying. The text handed to the LLM is rendered only when it is
+asked for and cached until the next append, so a burst of mentions in a
+quiet channel renders it once.
+
+Usage:
+    convo = ConversationBuffer(max_lines=50, max_bytes=4096)
+    convo.append("alice", "hello")
+    convo.render()  # "<alice>: hello"
+"""
+from collections import deque
+
+
+class ConversationBuffer:
+    """A ring buffer of recent lines with a cached rendering.
+
+    The window is bounded by line count and, optionally, by the UTF-8 size
+    of the rendered text; when either limit is exceeded the oldest lines are
+    dropped.
+
+    Attributes:
+        max_lines (int): Most lines kept.
+        max_bytes (int): Most bytes of rendered text kept, or 0 for no limit.
+        _lines (deque[str]): The `<nick>: message` lines, oldest first.
+        _sizes (deque[int]): The UTF-8 size of each line plus its newline,
+            only tracked when `max_bytes` is set.
+        _bytes (int): Total of `_sizes`.
+        _rendered (str | None): The cached rendering, or None if an append
+            has happened since it was built.
+    """
+
+    def __init__(self, max_lines=50, max_bytes=0):
+        self.max_lines = max_lines
+        self.max_bytes = max_bytes
+        self._lines = deque()
+        self._sizes = deque()
+        self._bytes = 0
+        self._rendered = ""
+
+    def append(self, nick, message):
+        """Add a line, dropping the oldest ones beyond the limits.
+
+        :param str nick: Who said it.
+        :param str message: What they said.
+        :return: None
+        :rtype: None
+        """
+        line = f"<{nick}>: {message}"
+        self._lines.append(line)
+        self._rendered = None
+        if not self.max_bytes:
+            if len(self._lines) > self.max_lines:
+                self._lines.popleft()
+            return
+        size = len(line.encode()) + 1  # the newline joining it to the next line
+        self._sizes.append(size)
+        self._bytes += size
+        while len(self._lines) > self.max_lines or (self._bytes - 1 > self.max_bytes and len(self._lines) > 1):
+            self._lines.popleft()
+            self._bytes -= self._sizes.popleft()
+
+    def render(self):
+        """Return the conversation as `<nick>: message` lines.
+
+        :return: The rendered conversation, oldest line first.
+        :rtype: str
+        """
+        if self._rendered is None:
+            self._rendered = "\n".join(self._lines)
+        return self._rendered
+
+    def __len__(self):
+        return len(self._lines)
+
+    def __iter__(self):
+        return iter(self._lines)
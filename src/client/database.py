@@ -0,0 +1,174 @@
+"""SQLite access that never blocks the gevent hub.
+
+gevent does not patch `sqlite3`, so a slow commit or a big query run directly
+from a greenlet freezes every other actor, including the Listener and the
+Writer's PONG replies. A Database owns one connection on one dedicated worker
+thread; greenlets hand it work and sleep until the result comes back.
+
+Usage:
+    db = Database(path, name="user_logs")
+    rows = db.execute("SELECT ...", (nick,), label="ask")
+    db.executemany("INSERT ...", rows, commit=True, label="log")
+    db.run(migrate, migrations, "user_logs", label="schema")
+    db.close()
+"""
+import sqlite3
+import time
+
+from gevent.threadpool import ThreadPool
+from loguru import logger
+
+
+def migrate(conn, migrations, name):
+    """Apply any pending schema migrations to a database.
+
+    `migrations` holds one tuple of statements per schema version; the
+    database's `PRAGMA user_version` says how many have been applied. Each
+    migration runs in its own explicit transaction together with the bump of
+    `user_version` (in the default isolation mode `sqlite3` would commit DDL
+    as it goes), so a failed or interrupted upgrade leaves nothing behind
+    and is simply retried on the next start.
+
+    :param sqlite3.Connection conn: An open connection to the database.
+    :param tuple[tuple[str]] migrations: The statements of each version.
+    :param str name: What the schema is called in log messages.
+    :return: The schema version after migrating.
+    :rtype: int
+    """
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    isolation_level = conn.isolation_level
+    conn.isolation_level = None
+    try:
+        for target_version, statements in enumerate(migrations[version:], start=version + 1):
+            logger.info(f"Migrating {name} schema to version {target_version}...")
+            conn.execute("BEGIN")
+            try:
+                for statement in statements:
+                    conn.execute(statement)
+                conn.execute(f"PRAGMA user_version = {target_version}")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+    finally:
+        conn.isolation_level = isolation_level
+    return len(migrations)
+
+
+class Database:
+    """A SQLite connection owned by a single worker thread.
+
+    Every call is shipped to the worker with `ThreadPool.apply`, which parks
+    the calling greenlet until the work is done while the hub keeps serving
+    sockets. Because there is exactly one worker, the connection is only ever
+    touched by the thread that created it and calls are serialized in the
+    order they were made.
+
+    Attributes:
+        name (str): A short name for the database, used in log messages.
+        stats (dict[str, list]): Per-label query latency, as
+            `[count, total_seconds, max_seconds]`, measured on the worker.
+        _path (pathlib.Path): The file path to the SQLite database.
+        _pool (ThreadPool): The single-thread pool that owns the connection.
+        _conn (sqlite3.Connection): The connection, only used on the worker.
+        _SLOW_QUERY (float): Queries slower than this many seconds are logged.
+    """
+
+    _SLOW_QUERY = 0.25
+
+    def __init__(self, path, name="db", pragmas=()):
+        self.name = name
+        self.stats = {}
+        self._path = path
+        self._pool = ThreadPool(1)
+        self._conn = None
+        self._pool.apply(self._connect, (pragmas,))
+
+    def _connect(self, pragmas):
+        """Open the connection. Runs on the worker thread."""
+        self._conn = sqlite3.connect(self._path)
+        for pragma in pragmas:
+            self._conn.execute(pragma)
+
+    def _timed(self, label, func, *args):
+        """Run `func(*args)` and record its latency under `label`. Runs on the
+        worker thread, so the measurement excludes time spent waiting for it.
+        """
+        started = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            elapsed = time.perf_counter() - started
+            entry = self.stats.setdefault(label, [0, 0.0, 0.0])
+            entry[0] += 1
+            entry[1] += elapsed
+            entry[2] = max(entry[2], elapsed)
+            if elapsed >= self._SLOW_QUERY:
+                logger.warning(f"Slow {self.name} query '{label}': {elapsed * 1000:.1f} ms")
+
+    def _execute(self, sql, params, commit):
+        rows = self._conn.execute(sql, params).fetchall()
+        if commit:
+            self._conn.commit()
+        return rows
+
+    def _executemany(self, sql, seq, commit):
+        self._conn.executemany(sql, seq)
+        if commit:
+            self._conn.commit()
+
+    def execute(self, sql, params=(), *, commit=False, label="execute"):
+        """Run a single statement on the worker thread and return its rows.
+
+        :param str sql: The SQL statement to run.
+        :param tuple params: Parameters bound to the statement.
+        :param bool commit: Commit the transaction after the statement.
+        :param str label: Name under which the latency is recorded.
+        :return: All rows produced by the statement.
+        :rtype: list[tuple]
+        """
+        return self._pool.apply(self._timed, (label, self._execute, sql, params, commit))
+
+    def executemany(self, sql, seq, *, commit=False, label="executemany"):
+        """Run a statement against every parameter tuple in `seq` on the
+        worker thread.
+
+        :param str sql: The SQL statement to run.
+        :param list[tuple] seq: Parameter tuples, one per execution.
+        :param bool commit: Commit the transaction afterwards.
+        :param str label: Name under which the latency is recorded.
+        :return: None
+        :rtype: None
+        """
+        self._pool.apply(self._timed, (label, self._executemany, sql, seq, commit))
+
+    def run(self, func, *args, label="run"):
+        """Run `func(conn, *args)` on the worker thread and return its result.
+
+        Use this for work that needs several statements, or Python logic
+        between them, without bouncing back to the hub in between.
+
+        :param callable func: Called with the connection followed by `args`.
+        :param str label: Name under which the latency is recorded.
+        :return: Whatever `func` returns.
+        """
+        return self._pool.apply(self._timed, (label, func, self._conn, *args))
+
+    def latency_summary(self):
+        """Format the recorded latencies as a single human-readable line.
+
+        :return: e.g. `log: n=120 avg=1.2ms max=8.0ms | ask: ...`
+        :rtype: str
+        """
+        return " | ".join(
+            f"{label}: n={n} avg={total / n * 1000:.1f}ms max={worst * 1000:.1f}ms"
+            for label, (n, total, worst) in self.stats.items()
+        )
+
+    def close(self):
+        """Close the connection on its worker thread and stop the worker."""
+        if self._conn is not None:
+            self._pool.apply(self._conn.close)
+            self._conn = None
+            logger.info(f"Closed {self.name} database. Query latency: {self.latency_summary() or 'no queries'}")
+        self._pool.kill()
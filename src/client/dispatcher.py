@@ -4,17 +4,21 @@ The dispatcher receives raw IRC lines from the reader, parses them (:nick!user@h
 
 The writer just sits on its inbox queue and drains it to the socket.
 """
+import functools
 import time
 import re
 from collections import namedtuple
 
 import gevent
 from gevent.queue import Queue, Empty
-from gevent.pool import Pool
 from loguru import logger
+from pydantic import SecretStr
 
-import src.channel_functions.general as channel_functions
-from src.channel_functions.sportsbook import sportsbook as dot_sportsbook
+import src.client.commands as commands
+from src.client.conversation import ConversationBuffer
+from src.client.fair_pool import FairPool
+from src.client.outbox import ADMIN, REPLY
+from src.client.tracing import TracedLine, set_current_span
 
 
 
@@ -23,70 +27,105 @@ class Dispatcher(gevent.Greenlet):
     (:nick!user@host PRIVMSG #channel :hello), and then decides what to do. For
     most messages it does nothing, but for commands it might spawn a new
     short-lived greenlet to handle that command and put a response onto the
-    writer's inbox.
+    outbox.
 
     Attributes:
         inbox (Queue): A gevent Queue where raw IRC lines are received from the
             reader.
+        heartbeat (float): `time.monotonic()` as of the last pass through the
+            main loop, checked by the Watchdog.
         nick (str): The bot's own nickname, used for command parsing.
-        main_channel (str): The channel the bot is active in, used for filtering
-            messages and sending responses.
-        admin_nick (str): The nickname of the admin user, whose messages can
-            trigger a shutdown when they contain the exit code.
+        main_channel (str): The bot's main channel.
+        channels (set[str]): Every channel the bot answers in, lowercased.
+        admin_nick (str): The lowercased nickname of the admin user, whose
+            replies are sent ahead of everyone else's.
         ignore_list (set[str]): A set of lowercase nicknames to ignore.
-        _pool (Pool): A gevent Pool for running handler functions concurrently.
+        convos (dict[str, ConversationBuffer]): Per channel (lowercased),
+            recent lines and bot replies, handed to the chatbot as context.
+        _pool (FairPool): Runs handler functions concurrently, taking turns
+            between channels so a busy one can't starve the rest.
+        _enabled (dict[str, set[str]] | None): Per channel (lowercased), the
+            command words and passive trigger names allowed there; channels
+            not listed allow everything.
         _stop_event (Event): A gevent Event that signals the dispatcher to stop.
         _app_config (AppConfig): The application configuration object.
-        _writer (Writer): A reference to the Writer actor, used to send responses
-            back to the server.
-        _logger (Logger): A logger for logging messages and errors.
+        _outbox (Outbox): The outbound queue the Writer drains, used to send
+            responses back to the server. It outlives any one connection.
+        _log_inbox (Queue): The Logger's inbox, where user messages are
+            queued to be logged.
         _EXIT_CODE (str): A special message that, when received from the admin user,
             will trigger a shutdown of the dispatcher.
         _USER_MSG_RE (Pattern): A regular expression pattern for parsing user-originated
             messages in the format `:nick!ident@host COMMAND target :message`.
         _PING_RE (Pattern): A regular expression pattern for matching PING messages
             from the server.
-        _IMAGINE_REGEX (Pattern): A regular expression pattern for detecting messages
-            that begin with the phrase "imagine unironically".
-        _REASON_REGEX (Pattern): A regular expression pattern for detecting messages
-            that contain the word "reason".
-        _YOUTUBE_REGEX (Pattern): A regular expression pattern for extracting YouTube
-            video IDs from messages that contain YouTube links.
+        _resources (dict): Shared objects handlers can have injected by name
+            (see `src.client.commands`), such as the read-only user logs
+            database, the HTTP client and the LLM service.
+        _inboxes (dict): Inboxes of the actors that commands can be routed to,
+            by actor name.
+        _metrics (Metrics | None): Records handler latency and errors, if
+            given as the `metrics` resource.
+        _commands (dict): Bound `(handler, args, route, admin, label)` tuples
+            keyed by trigger word.
+        _passive (dict): Bound tuples for passive triggers, keyed by name.
+        _scanner (Pattern): All passive trigger patterns joined into a single
+            alternation of named groups, so each line is scanned once.
+        _payload_groups (dict[str, int]): For each passive trigger, the
+            scanner group whose text is passed to the handler as `capture`.
         ParsedMessage (namedtuple): A named tuple class for representing parsed user messages,
             with fields for nick, ident, host, command, target, message, word_list,
-            word_count, and timestamp.
+            word_count, timestamp, and trace (the line's `Trace` if it was
+            sampled for latency tracing, else None).
     """
 
     _USER_MSG_RE = re.compile(r":(\S+!\S+@\S+) ([A-Z]+) (\S+) :(.*)") # `:nick!ident@host COMMAND target :message`
     _PING_RE = re.compile(r"^PING :(.+)$")
-    _IMAGINE_REGEX = re.compile(r"^imagine unironically\b")
-    _REASON_REGEX = re.compile(r"\breason\b")
-    _YOUTUBE_REGEX = re.compile(r"(?:youtube\.com\/(?:watch\?v=|embed\/|v\/|shorts\/)|youtu\.be\/)([a-zA-Z0-9_-]{11})")
 
     ParsedMessage = namedtuple("ParsedMessage", [
         "nick", "ident", "host", "command", "target", "message",
-        "word_list", "word_count", "timestamp",
-    ])
+        "word_list", "word_count", "timestamp", "trace",
+    ], defaults=(None,))
 
     def __init__(self,
-                 writer,
+                 outbox,
                  logger,
                  trivia,
                  stop_event,
-                 app_config):
+                 app_config,
+                 inbox=None,
+                 convos=None,
+                 pool=None,
+                 **resources):
         gevent.Greenlet.__init__(self)
-        self.inbox = Queue()
+        self.inbox = inbox if inbox is not None else Queue()
+        self.heartbeat = time.monotonic()
         self.nick = app_config.irc_nick
         self.main_channel = app_config.irc_main_channel
+        self.channels = {channel.lower() for channel in app_config.channels}
+        self.admin_nick = app_config.irc_admin_nick.lower()
         self.ignore_list = {n.lower().strip() for n in app_config.irc_ignore_list.split(",") if n.strip()}
-        self.current_convo = []
-
-        self._pool = Pool(10)
+        # a replacement started by the Watchdog takes over its predecessor's
+        # conversations and pool, whose handlers may still be running
+        self.convos = convos if convos is not None else {}
+        if pool is None:
+            pool_size = app_config.dispatcher_pool_size
+            pool = FairPool(pool_size, per_key=max(1, pool_size // 2) if len(self.channels) > 1 else pool_size)
+        self._pool = pool
+        self._enabled = {
+            channel.lower(): {name.lower() for name in names}
+            for channel, names in app_config.irc_channel_commands.items()
+        }
         self._stop_event = stop_event
         self._app_config = app_config
-        self._writer = writer
-        self._logger = logger
-        self._trivia = trivia
+        self._outbox = outbox
+        self._log_inbox = logger.inbox
+        self._resources = resources
+        self._inboxes = {"trivia": trivia.inbox}
+        self._metrics = resources.get("metrics")
+        self._commands = {trigger: self._bind(spec, trigger) for trigger, spec in commands.COMMANDS.items()}
+        self._passive = {name: self._bind(spec, name) for name, (_, spec) in commands.PASSIVE_TRIGGERS.items()}
+        self._scanner, self._payload_groups = self._build_scanner()
 
     def _run(self):
         """The main loop of the dispatcher greenlet. Continuously reads lines
@@ -97,10 +136,14 @@ class Dispatcher(gevent.Greenlet):
         """
         logger.info("Dispatcher started.")
         while not self._stop_event.is_set():
+            self.heartbeat = time.monotonic()
             try:
                 line = self.inbox.get(timeout=1)
             except Empty:
                 continue
+            trace = getattr(line, "trace", None)
+            if trace is not None:
+                trace.dequeued = time.perf_counter()
             try:
                 self._dispatch(line)
             except Exception as e:
@@ -118,17 +161,16 @@ class Dispatcher(gevent.Greenlet):
         ping_match = self._PING_RE.match(line)
         if ping_match:
             server = ping_match.group(1)
-            self._writer.inbox.put(f"PONG :{server}")
+            self._outbox.put(f"PONG :{server}")
             return
 
         # rejoin if kicked
         parts = line.split()
-        if len(parts) >= 4 and parts[1] == "KICK" and parts[2] == self.main_channel:
-            kicked_nick = parts[3]
+        if len(parts) >= 4 and parts[1] == "KICK" and parts[2].lower() in self.channels:
+            channel, kicked_nick = parts[2], parts[3]
             if kicked_nick.lower() == self.nick.lower():
-                logger.warning(f"Kicked from {self.main_channel} — rejoining...")
-                gevent.sleep(2)
-                self._writer.inbox.put(f"JOIN {self.main_channel}")
+                logger.warning(f"Kicked from {channel} — rejoining...")
+                gevent.spawn_later(2, self._outbox.put, f"JOIN {channel}")
             return
 
         # parse user message
@@ -140,99 +182,137 @@ class Dispatcher(gevent.Greenlet):
         # filter out messages we don't care about
         if not self._should_dispatch(parsed):
             return
+        if parsed.trace is not None:
+            parsed.trace.parsed = time.perf_counter()
 
         # update current conversation
-        self._update_current_convo(parsed.nick, parsed.message)
+        self._update_current_convo(parsed.target, parsed.nick, parsed.message)
 
         # log message
         if not parsed.message.startswith((".", ",", "!")):
-            self._logger.inbox.put(parsed)
-
-        # dispatch to handler
-        trigger = parsed.word_list[0].lower().strip()
+            self._log_inbox.put(parsed)
+
+        # dispatch to handlers
+        enabled = self._enabled.get(parsed.target.lower())
+        for name, captures in self._scan_passive(parsed.message).items():
+            if enabled is None or name in enabled:
+                self._route(self._passive[name], parsed, captures)
+        word = parsed.word_list[0].lower()
+        command = self._commands.get(word)
+        if command is not None and (enabled is None or word in enabled):
+            self._route(command, parsed)
+
+    def _scan_passive(self, message):
+        """Run the combined passive-trigger scanner over a message once.
+
+        :param str message: The message text.
+        :return: Each passive trigger that fired, mapped to the texts it
+            captured, in message order.
+        :rtype: dict[str, list[str]]
+        """
+        hits = {}
+        for m in self._scanner.finditer(message):
+            name = m.lastgroup
+            payload = m.group(self._payload_groups[name])
+            if name in hits:
+                hits[name].append(payload)
+            else:
+                hits[name] = [payload]
+        return hits
+
+    def _route(self, command, parsed, captures=None):
+        """Build a bound command's per-message arguments and run it on its
+        route.
+
+        Admin-only commands from anyone but the admin are dropped.
+
+        :param tuple command: A `(handler, args, route, admin, label)` tuple
+            from `_bind`.
+        :param ParsedMessage parsed: The message that triggered the command.
+        :param list[str] | None captures: Texts captured by a passive trigger,
+            if any.
+        :return: None
+        :rtype: None
+        """
+        handler, args, route, admin, label = command
+        if admin and not self._is_admin(parsed.nick):
+            return
+        kwargs = {}
+        for name in args:
+            if name == "capture":
+                kwargs[name] = captures[0]
+            elif name == "captures":
+                kwargs[name] = captures
+            elif name == "current_convo":
+                kwargs[name] = self._convo(parsed.target).render()
+            else:
+                kwargs[name] = getattr(parsed, name)
         try:
-            if self._IMAGINE_REGEX.search(parsed.message):
-                self._pool.spawn(
-                    self._run_function,
-                    channel_functions.imagine_without_iron,
-                    parsed.message,
-                )
-            if self._REASON_REGEX.search(parsed.message):
-                self._pool.spawn(
-                    self._run_function,
-                    channel_functions.reason_will_prevail,
-                )
-            if match := self._YOUTUBE_REGEX.search(parsed.message):
-                self._pool.spawn(
-                    self._run_function,
-                    channel_functions.dot_youtube,
-                    match,
-                    self._app_config.youtube_api_key.get_secret_value(),
-                )
-            if trigger == ".help":
-                self._writer.inbox.put(
-                    f"PRIVMSG {self.main_channel} :{parsed.nick}: https://markdownpastebin.com/?id=ec96599a4ecc4673a182e6f55e36bb6b"
-                )
-            if trigger == ".spaghetti":
-                self._pool.spawn(
-                    self._run_function,
-                    channel_functions.dot_spaghetti,
-                )
-            if trigger == ".ask":
-                self._pool.spawn(
-                    self._run_function,
-                    channel_functions.dot_ask,
-                    parsed.nick,
-                    parsed.word_list,
-                    parsed.target,
-                    self._app_config.user_logs_path,
-                )
-            if trigger == ".wa":
-                self._pool.spawn(
-                    self._run_function,
-                    channel_functions.dot_wolfram,
-                    parsed.nick,
-                    parsed.message,
-                    self._app_config.wolfram_api_key.get_secret_value(),
-                )
-            if trigger == ".apod":
-                self._pool.spawn(
-                    self._run_function,
-                    channel_functions.dot_apod,
-                    parsed.nick,
-                    self._app_config.nasa_api_key.get_secret_value(),
-                )
-            if trigger == ".haha":
-                self._pool.spawn(
-                    self._run_function,
-                    channel_functions.dot_joke,
-                    parsed.nick,
-                )
-            if parsed.message.startswith(self.nick):
-                self._pool.spawn(
-                    self._run_function,
-                    channel_functions.dot_arb,
-                    parsed.nick,
-                    parsed.message,
-                    self._app_config.llm_api_key.get_secret_value(),
-                    self._app_config.irc_llm_model,
-                    "\n".join(self.current_convo),
-                    self._app_config.project_root,
-                    self.nick,
-                )
-            if trigger == ".tr":
-                self._trivia.inbox.put((parsed.nick, parsed.word_list))
-            if trigger == ".sb":
-                self._pool.spawn(
-                    self._run_function,
-                    dot_sportsbook,
-                    parsed.nick,
-                    parsed.word_list,
-                    self._app_config.odds_api_key.get_secret_value(),
-                )
+            if route == "pool":
+                self._pool.spawn(parsed.target.lower(), self._run_function, handler, label, parsed, **kwargs)
+            elif route == "inline":
+                self._run_function(handler, label, parsed, **kwargs)
+            else:
+                self._inboxes[route].put(tuple(kwargs.values()))
         except Exception as exc: # never let a bad handler kill the loop
             logger.exception(f"Handler raised an exception: {exc}")
 
+    def _bind(self, spec, label):
+        """Resolve a CommandSpec's injected arguments once, at startup.
+
+        :param CommandSpec spec: The spec to bind.
+        :param str label: The trigger word or passive trigger name, which
+            handler metrics are recorded under.
+        :return: A `(handler, args, route, admin, label)` tuple, where the
+            handler already carries its injected arguments.
+        :rtype: tuple
+        """
+        handler = spec.handler
+        if spec.inject:
+            handler = functools.partial(handler, **{name: self._resolve(name) for name in spec.inject})
+        return handler, spec.args, spec.route, spec.admin, label
+
+    def _is_admin(self, nick):
+        """Return True if a nick is the configured bot admin.
+
+        :param str nick: The nick to check.
+        :rtype: bool
+        """
+        return bool(self.admin_nick) and nick.lower() == self.admin_nick
+
+    def _resolve(self, name):
+        """Look up an injectable value: a Dispatcher resource first, then an
+        app config field, unwrapping secrets.
+
+        :param str name: The resource or config field name.
+        :return: The value to inject.
+        """
+        if name in self._resources:
+            return self._resources[name]
+        value = getattr(self._app_config, name)
+        return value.get_secret_value() if isinstance(value, SecretStr) else value
+
+    def _build_scanner(self):
+        """Join every passive trigger into one compiled alternation.
+
+        Each trigger becomes a named group; if its pattern has a capturing
+        group of its own, that group's text is what the handler receives.
+
+        :return: The scanner and, per trigger, the group index holding its
+            payload.
+        :rtype: tuple[re.Pattern, dict[str, int]]
+        """
+        parts = []
+        payload_groups = {}
+        next_group = 1
+        for name, (pattern, _) in commands.PASSIVE_TRIGGERS.items():
+            pattern = pattern.replace("{nick}", re.escape(self.nick))
+            inner_groups = re.compile(pattern).groups
+            payload_groups[name] = next_group + 1 if inner_groups else next_group
+            next_group += 1 + inner_groups
+            parts.append(f"(?P<{name}>{pattern})")
+        return re.compile("|".join(parts)), payload_groups
+
     def _parse_raw_msg(self, raw, timestamp):
         """Parse a raw IRC line into a ParsedMessage.
 
@@ -263,12 +343,26 @@ class Dispatcher(gevent.Greenlet):
             word_list=words,
             word_count=len(words),
             timestamp=timestamp,
+            trace=getattr(raw, "trace", None),
         )
 
-    def _update_current_convo(self, nick, message):
+    def _convo(self, channel):
+        """Return a channel's conversation buffer, creating it on first use.
+
+        :param str channel: The channel name.
+        :rtype: ConversationBuffer
+        """
+        key = channel.lower()
+        convo = self.convos.get(key)
+        if convo is None:
+            convo = self.convos[key] = ConversationBuffer(
+                self._app_config.convo_max_lines, self._app_config.convo_max_bytes,
+            )
+        return convo
+
+    def _update_current_convo(self, channel, nick, message):
         """"""
-        self.current_convo.append(f"<{nick}>: {message}")
-        self.current_convo = self.current_convo[-50:]
+        self._convo(channel).append(nick, message)
 
     def _should_dispatch(self, msg):
         """Return True only when a message is worth passing to the handler.
@@ -290,30 +384,69 @@ class Dispatcher(gevent.Greenlet):
             return False
         if msg.nick.lower() in self.ignore_list:
             return False
-        if msg.target != self.main_channel:
+        if msg.target.lower() not in self.channels:
             return False
         if len(msg.word_list) == 0:
             return False
         return True
 
-    def _run_function(self, func, *args, **kwargs):
-        """Run a handler function and put its response onto the writer's inbox.
+    def _run_function(self, func, label, parsed, **kwargs):
+        """Run a handler function and put its response onto the outbox.
 
         This method is a wrapper around handler functions to catch exceptions and
         ensure that any errors are logged and a user-friendly message is sent back
-        to the channel instead of crashing the dispatcher.
+        to the channel instead of crashing the dispatcher. Replies to the admin
+        are queued ahead of other replies, and each requester's replies take
+        turns with everyone else's. If the message is being traced, the
+        handler gets a span and its reply carries it to the Writer.
 
         :param callable func: The handler function to run.
-        :param args: Positional arguments to pass to the handler function.
+        :param str label: The trigger word or passive trigger name, for metrics.
+        :param ParsedMessage parsed: The message that triggered the handler.
         :param kwargs: Keyword arguments to pass to the handler function.
         :return: None
         :rtype: None
         """
+        priority = ADMIN if self._is_admin(parsed.nick) else REPLY
+        key = (parsed.target, parsed.nick)
+        span = None
+        if parsed.trace is not None:
+            span = parsed.trace.span(label, parsed.target)
+            set_current_span(span)
+        # lets the HubMonitor blame a stall on this command
+        greenlet = gevent.getcurrent()
+        greenlet.running_command = label
+        started = time.perf_counter()
+        failed = False
+        reply = None
         try:
-            response = func(*args, **kwargs)
+            response = func(**kwargs)
             if response:
-                self._update_current_convo(self.nick, response)
-                self._writer.inbox.put(f"PRIVMSG {self.main_channel} :{response}")
+                self._update_current_convo(parsed.target, self.nick, response)
+                reply = f"PRIVMSG {parsed.target} :{response}"
         except Exception as e:
+            failed = True
             logger.exception(f"Error in handler function: {e}")
-            self._writer.inbox.put(f"PRIVMSG {self.main_channel} :Sorry, an error occurred while processing your request.")
+            reply = f"PRIVMSG {parsed.target} :Sorry, an error occurred while processing your request."
+        handled = time.perf_counter()
+        greenlet.running_command = None
+        if self._metrics is not None:
+            self._metrics.observe_command(label, handled - started, failed)
+        if span is not None:
+            set_current_span(None)
+            span.handled = handled
+            span.failed = failed
+            if reply is None:
+                span.finish()
+            else:
+                reply = TracedLine(reply, span)
+        if reply is not None:
+            self._outbox.put(reply, priority, key)
+
+    def pool_stats(self):
+        """Report handler pool occupancy.
+
+        :return: The pool size and the handlers running and waiting.
+        :rtype: dict[str, int]
+        """
+        return {"size": self._pool.size, "running": self._pool.running(), "waiting": self._pool.waiting()}
@@ -0,0 +1,104 @@
+"""A greenlet pool that shares its capacity fairly between keys.
+
+With one `gevent.pool.Pool` for every channel, a busy channel can fill every
+slot with slow handlers (LLM calls, API lookups) and everyone else waits
+behind it; worse, `Pool.spawn` blocks when the pool is full, which stalls
+the Dispatcher itself. A FairPool never blocks the caller: jobs that can't
+start yet wait in a per-key queue, and whenever a slot frees up the next job
+is taken round-robin across the keys that are waiting. A single key may also
+be capped below the pool size, so some capacity is always left for others.
+
+Usage:
+    pool = FairPool(size=10, per_key=5)
+    pool.spawn("#channel", handler, *args, **kwargs)
+"""
+from collections import deque
+
+import gevent
+from loguru import logger
+
+
+class FairPool:
+    """Round-robin scheduling of greenlets across keys.
+
+    Attributes:
+        size (int): Most greenlets running at once.
+        per_key (int): Most greenlets running at once for one key.
+        max_queued (int): Most jobs waiting per key; beyond that new jobs are
+            dropped with a warning.
+        _running (int): Greenlets currently running.
+        _running_by_key (dict[object, int]): Running greenlets per key.
+        _queues (dict[object, deque]): Jobs waiting to start, per key.
+        _turns (deque): Keys with waiting jobs, in round-robin order.
+    """
+
+    def __init__(self, size=10, per_key=None, max_queued=50):
+        self.size = size
+        self.per_key = per_key or size
+        self.max_queued = max_queued
+        self._running = 0
+        self._running_by_key = {}
+        self._queues = {}
+        self._turns = deque()
+
+    def spawn(self, key, func, *args, **kwargs):
+        """Run `func(*args, **kwargs)` as soon as the key's turn comes up.
+        Never blocks.
+
+        :param key: Who the job is for (e.g. a channel); jobs for different
+            keys take turns.
+        :param callable func: The job.
+        :return: The greenlet if it started right away, else None.
+        :rtype: gevent.Greenlet | None
+        """
+        job = (func, args, kwargs)
+        if self._can_start(key) and not self._queues.get(key):
+            return self._start(key, job)
+        queue = self._queues.setdefault(key, deque())
+        if len(queue) >= self.max_queued:
+            logger.warning(f"Dropping job for {key}: {len(queue)} already waiting")
+            return None
+        if not queue:
+            self._turns.append(key)
+        queue.append(job)
+        return None
+
+    def running(self):
+        """Return the number of greenlets currently running."""
+        return self._running
+
+    def waiting(self):
+        """Return the number of jobs waiting to start."""
+        return sum(len(queue) for queue in self._queues.values())
+
+    def _can_start(self, key):
+        return self._running < self.size and self._running_by_key.get(key, 0) < self.per_key
+
+    def _start(self, key, job):
+        func, args, kwargs = job
+        self._running += 1
+        self._running_by_key[key] = self._running_by_key.get(key, 0) + 1
+        greenlet = gevent.spawn(func, *args, **kwargs)
+        greenlet.link(lambda _: self._finished(key))
+        return greenlet
+
+    def _finished(self, key):
+        """Release a slot and start waiting jobs, taking turns across keys."""
+        self._running -= 1
+        self._running_by_key[key] -= 1
+        if not self._running_by_key[key]:
+            del self._running_by_key[key]
+        # one pass over the waiting keys; keys at their own cap keep their turn
+        for _ in range(len(self._turns)):
+            if self._running >= self.size:
+                break
+            waiting_key = self._turns.popleft()
+            if not self._can_start(waiting_key):
+                self._turns.append(waiting_key)
+                continue
+            queue = self._queues[waiting_key]
+            self._start(waiting_key, queue.popleft())
+            if queue:
+                self._turns.append(waiting_key)
+            else:
+                del self._queues[waiting_key]
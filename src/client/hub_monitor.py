@@ -0,0 +1,142 @@
+"""Detects the gevent hub being blocked and names the code responsible.
+
+Everything in the bot shares one OS thread. When a greenlet runs CPU-bound
+or blocking C code without yielding (a SQLite call made directly instead of
+through a Database, parsing a large LLM response, a C extension waiting on
+the network), the hub cannot run and every actor freezes, PONGs included.
+
+The HubMonitor turns on gevent's monitoring thread, which notices when the
+hub hasn't run for `threshold` seconds, and captures the main thread's
+stack at that moment. The stall is attributed to the command whose handler
+was running (`_run_function` marks its greenlet with `running_command`), or
+else to the actor or function the blocking greenlet was running. Reports
+are logged at most once per `report_every` seconds per culprit, and every
+stall is counted for the metrics endpoint.
+
+A stall that lasts several thresholds is reported once, when it is first
+seen; its duration is estimated in steps of the threshold.
+
+Usage:
+    monitor = HubMonitor(threshold=0.1)
+    monitor.start()
+    metrics.add_source(monitor.samples)
+"""
+import sys
+import time
+import traceback
+import warnings
+
+import gevent
+from gevent import events
+from loguru import logger
+
+
+class HubMonitor:
+    """Reports hub stalls longer than a threshold.
+
+    The event handler runs on gevent's monitoring thread, so it only reads
+    greenlet state and logs; it never switches greenlets.
+
+    Attributes:
+        stalls (dict[str, int]): Stalls seen per culprit.
+        blocked_seconds (dict[str, float]): Estimated time the hub spent
+            blocked, per culprit.
+        _threshold (float): Seconds without the hub running that count as a
+            stall; also how often the monitoring thread checks.
+        _report_every (float): Seconds between reports for one culprit.
+        _last_report (dict[str, float]): When each culprit was last
+            reported.
+        _unreported (dict[str, int]): Stalls per culprit since its last
+            report.
+        _last_event (tuple | None): The greenlet and time of the previous
+            blocking event, to tell a new stall from a continuing one.
+        _STACK_LIMIT (int): The most stack frames included in a report.
+    """
+
+    _STACK_LIMIT = 15
+
+    def __init__(self, threshold=0.1, report_every=60.0):
+        self.stalls = {}
+        self.blocked_seconds = {}
+        self._threshold = threshold
+        self._report_every = report_every
+        self._last_report = {}
+        self._unreported = {}
+        self._last_event = None
+
+    def start(self):
+        """Start gevent's monitoring thread and listen for stalls. Call it
+        from the main thread, before the client connects.
+
+        :return: None
+        :rtype: None
+        """
+        gevent.config.monitor_thread = True
+        gevent.config.max_blocking_time = self._threshold
+        gevent.config.print_blocking_reports = False  # we report them instead
+        events.subscribers.append(self._on_event)
+        with warnings.catch_warnings():
+            # memory monitoring needs psutil; only blocking is wanted here
+            warnings.simplefilter("ignore")
+            gevent.get_hub().start_periodic_monitoring_thread()
+        logger.info(f"Monitoring the hub for stalls over {self._threshold * 1000:.0f} ms.")
+
+    def stop(self):
+        """Stop listening for stalls."""
+        if self._on_event in events.subscribers:
+            events.subscribers.remove(self._on_event)
+
+    def samples(self):
+        """Stall counts and blocked time per culprit, for `Metrics.add_source`.
+
+        :rtype: Iterator[tuple]
+        """
+        for culprit, count in list(self.stalls.items()):
+            yield "hub_stalls_total", {"culprit": culprit}, count, "counter"
+            yield "hub_blocked_seconds_total", {"culprit": culprit}, \
+                f"{self.blocked_seconds[culprit]:.3f}", "counter"
+
+    def _on_event(self, event):
+        """Handle a gevent event. Runs on the monitoring thread."""
+        if not isinstance(event, events.EventLoopBlocked):
+            return
+        now = time.monotonic()
+        culprit = self._culprit(event.greenlet)
+        self.blocked_seconds[culprit] = self.blocked_seconds.get(culprit, 0.0) + self._threshold
+        previous, self._last_event = self._last_event, (event.greenlet, now)
+        if previous and previous[0] is event.greenlet and now - previous[1] < 2 * self._threshold:
+            return  # the same stall, still going
+        self.stalls[culprit] = self.stalls.get(culprit, 0) + 1
+        self._unreported[culprit] = self._unreported.get(culprit, 0) + 1
+        if now - self._last_report.get(culprit, float("-inf")) < self._report_every:
+            return
+        count = self._unreported.pop(culprit)
+        self._last_report[culprit] = now
+        logger.warning(
+            f"Hub blocked for over {self._threshold * 1000:.0f} ms by {culprit}"
+            f" ({count} stall(s) since the last report):\n{self._stack(event.hub)}"
+        )
+
+    def _stack(self, hub):
+        """Format the hub thread's current stack, innermost frame last."""
+        frame = sys._current_frames().get(hub.thread_ident) if hub is not None else None
+        if frame is None:
+            return "  (stack unavailable)"
+        return "".join(traceback.format_stack(frame, limit=self._STACK_LIMIT)).rstrip()
+
+    @staticmethod
+    def _culprit(greenlet):
+        """Name what a blocking greenlet was doing.
+
+        :param greenlet: The greenlet that was running when the hub stalled.
+        :return: `command .sb`, an actor class name such as `Logger`, or the
+            function the greenlet was spawned with.
+        :rtype: str
+        """
+        command = getattr(greenlet, "running_command", None)
+        if command:
+            return f"command {command}"
+        if type(greenlet) is not gevent.Greenlet:
+            return type(greenlet).__name__
+        run = getattr(greenlet, "_run", None)
+        return getattr(run, "__qualname__", None) or repr(greenlet)
@@ -9,24 +9,46 @@ class Listener(gevent.Greenlet):
     """Listens for incoming lines on a socket and puts them in the dispatcher's
     inbox.
 
+    Bytes are read with `recv_into` into a preallocated chunk and appended to
+    a `bytearray` buffer, so a burst (NAMES on join, a netsplit, backlog
+    replay) costs linear copying instead of re-concatenating and re-splitting
+    a growing string on every read. Only the complete lines (everything up to
+    the last `\\r\\n`) are decoded, so a multibyte character split across two
+    reads is decoded correctly once its line is complete. If that block isn't
+    valid UTF-8 it is decoded line by line, and only the offending lines fall
+    back to latin-1.
+
     Attributes:
-        _BUFFER_SIZE (int): The number of bytes to read from the socket at a time.
+        _MIN_READ_SIZE (int): The smallest number of bytes requested per read.
+        _MAX_READ_SIZE (int): The largest number of bytes requested per read.
         _dispatcher (Dispatcher): The dispatcher to which received lines are sent.
         _socket (socket.socket): The socket from which to read incoming data.
         _encoding (str): The encoding used to decode incoming bytes into strings.
-        _recv_buffer (str): A buffer to hold incomplete lines until they are complete.
+        _recv_buffer (bytearray): Bytes received but not yet split into lines.
+        _scan_from (int): Offset in `_recv_buffer` before which no `\\r\\n`
+            can start, so partial lines aren't rescanned on every read.
+        _read_size (int): The number of bytes requested on the next read. It
+            doubles while reads fill it and halves while they stay small.
+        _chunk (memoryview): A preallocated buffer that reads land in.
         _stop_event (gevent.event.Event): An event that signals the listener to stop.
+        _tracer (Tracer | None): Tags sampled lines for latency tracing, if
+            tracing is enabled.
     """
 
-    _BUFFER_SIZE = 4096
+    _MIN_READ_SIZE = 4096
+    _MAX_READ_SIZE = 65536
 
-    def __init__(self, dispatcher, socket, stop_event, encoding='utf-8'):
+    def __init__(self, dispatcher, socket, stop_event, encoding='utf-8', tracer=None):
         gevent.Greenlet.__init__(self)
         self._dispatcher = dispatcher
         self._socket = socket
         self._encoding = encoding
-        self._recv_buffer = ""
+        self._recv_buffer = bytearray()
+        self._scan_from = 0
+        self._read_size = self._MIN_READ_SIZE
+        self._chunk = memoryview(bytearray(self._MAX_READ_SIZE))
         self._stop_event = stop_event
+        self._tracer = tracer
 
     def _recv_lines(self):
         """Read from the socket into a line buffer and return complete lines.
@@ -34,18 +56,53 @@ class Listener(gevent.Greenlet):
         Raises OSError on disconnect so the caller can trigger reconnection.
         """
         try:
-            chunk = self._socket.recv(self._BUFFER_SIZE)
+            n = self._socket.recv_into(self._chunk, self._read_size)
         except socket.timeout:
             return []    # nothing arrived — keep looping
-        if not chunk:
+        if not n:
             raise OSError("Server closed the connection")
+        self._adapt_read_size(n)
+
+        buf = self._recv_buffer
+        buf += self._chunk[:n]
+        end = buf.rfind(b"\r\n", self._scan_from)
+        if end == -1:
+            self._scan_from = max(len(buf) - 1, 0)  # a trailing \r may be half a \r\n
+            return []
+        complete = buf[:end]
+        del buf[:end + 2]
+        self._scan_from = max(len(buf) - 1, 0)
+        try:
+            # fast path: every line in the block is valid, decode it at once
+            return complete.decode(self._encoding).split("\r\n")
+        except UnicodeDecodeError:
+            return [self._decode(line) for line in complete.split(b"\r\n")]
+
+    def _adapt_read_size(self, received):
+        """Grow the read size while reads come back full and shrink it while
+        they come back mostly empty.
+
+        :param int received: The number of bytes the last read returned.
+        :return: None
+        :rtype: None
+        """
+        if received == self._read_size:
+            self._read_size = min(self._read_size * 2, self._MAX_READ_SIZE)
+        elif received < self._read_size // 4:
+            self._read_size = max(self._read_size // 2, self._MIN_READ_SIZE)
+
+    def _decode(self, line_bytes):
+        """Decode one complete line, falling back to latin-1 if it isn't valid
+        in the configured encoding.
+
+        :param bytearray line_bytes: The line without its `\\r\\n`.
+        :return: The decoded line.
+        :rtype: str
+        """
         try:
-            text = chunk.decode(self._encoding)
+            return line_bytes.decode(self._encoding)
         except UnicodeDecodeError:
-            text = chunk.decode("latin-1")
-        self._recv_buffer += text
-        *complete, self._recv_buffer = self._recv_buffer.split("\r\n")
-        return complete
+            return line_bytes.decode("latin-1")
 
     def _run(self):
         """Process incoming lines until an error or clean shutdown."""
@@ -55,12 +112,12 @@ class Listener(gevent.Greenlet):
                 for line in self._recv_lines():
                     line = line.strip()
                     if line:
+                        if self._tracer is not None:
+                            line = self._tracer.tag(line)
                         self._dispatcher.inbox.put(line)
             except OSError as e:
                 if not self._stop_event.is_set():
                     logger.error(f"Listener error: {e}")
-                    self._stop_event.set()  # trigger shutdown
-                    raise # re-raise so greenlet is marked as failed
+                    self._stop_event.set()  # end the connection; the client reconnects
+                break
         logger.info("Listener stopped.")
-
-
@@ -5,71 +5,208 @@ CREATE TABLE user_logs (
             target text,
             message text,
             timestamp real);
+
+Quotable lines (those starting with a letter or digit) are also indexed in
+`quotes`, densely numbered per (target, nick) by `seq`, with the per-nick
+total kept in `quote_counts`. A trigger maintains both on every insert, so
+`.ask` can pick `seq = randrange(n)` and fetch a random line with two primary
+key lookups instead of sorting every row the nick ever wrote.
 """
 import sqlite3
+import time
+
 import gevent
 from gevent.queue import Queue, Empty
 from loguru import logger
 
+from src.client.database import Database, migrate
+
+
+# each entry upgrades the schema by one version; see `PRAGMA user_version`
+_MIGRATIONS = (
+    (
+        "CREATE INDEX IF NOT EXISTS user_logs_target_nick ON user_logs (target, nick)",
+        """CREATE TABLE IF NOT EXISTS quote_counts (
+               target TEXT NOT NULL,
+               nick TEXT NOT NULL,
+               n INTEGER NOT NULL,
+               PRIMARY KEY (target, nick)) WITHOUT ROWID""",
+        """CREATE TABLE IF NOT EXISTS quotes (
+               target TEXT NOT NULL,
+               nick TEXT NOT NULL,
+               seq INTEGER NOT NULL,
+               log_rowid INTEGER NOT NULL,
+               PRIMARY KEY (target, nick, seq)) WITHOUT ROWID""",
+        """INSERT INTO quotes
+           SELECT target, nick,
+                  ROW_NUMBER() OVER (PARTITION BY target, nick ORDER BY rowid) - 1,
+                  rowid
+           FROM user_logs
+           WHERE target IS NOT NULL AND nick IS NOT NULL
+           AND message GLOB '[A-Za-z0-9]*'""",
+        """INSERT INTO quote_counts
+           SELECT target, nick, COUNT(*) FROM quotes GROUP BY target, nick""",
+        """CREATE TRIGGER IF NOT EXISTS user_logs_quotable AFTER INSERT ON user_logs
+           WHEN NEW.target IS NOT NULL AND NEW.nick IS NOT NULL
+           AND NEW.message GLOB '[A-Za-z0-9]*'
+           BEGIN
+               INSERT OR IGNORE INTO quote_counts VALUES (NEW.target, NEW.nick, 0);
+               INSERT INTO quotes
+                   SELECT NEW.target, NEW.nick, n, NEW.rowid FROM quote_counts
+                   WHERE target = NEW.target AND nick = NEW.nick;
+               UPDATE quote_counts SET n = n + 1
+                   WHERE target = NEW.target AND nick = NEW.nick;
+           END""",
+    ),
+)
+
+
+def migrate_user_logs(conn):
+    """Create the user_logs table and apply any pending schema migrations.
+
+    :param sqlite3.Connection conn: An open connection to the user logs
+        database.
+    :return: The schema version after migrating.
+    :rtype: int
+    """
+    conn.execute('''CREATE TABLE IF NOT EXISTS user_logs
+                    (nick text, target text, message text, timestamp real)''')
+    conn.commit()
+    return migrate(conn, _MIGRATIONS, "user_logs")
+
+
+def open_user_logs(path):
+    """Open the user logs database for writing and bring its schema up to
+    date. Call it before starting any actor, so handlers reading the quote
+    index never see a half-migrated database; on a large log the first
+    migration's backfill takes a while.
+
+    :param pathlib.Path path: The user logs database file.
+    :return: The migrated database, in WAL mode.
+    :rtype: Database
+    """
+    db = Database(path, name="user_logs", pragmas=Logger.PRAGMAS)
+    db.run(migrate_user_logs, label="schema")
+    return db
+
 
 class Logger(gevent.Greenlet):
     """A simple logger that writes user messages to a SQLite database.
 
     The Logger runs in a separate greenlet and listens for log entries on its
-    inbox queue.
+    inbox queue. Entries are group-committed: the inbox is drained into a
+    batch that is written with a single `executemany` and one commit, either
+    when the batch is full or when the flush interval has elapsed since the
+    first entry in it arrived. The database runs in WAL mode with
+    `synchronous=NORMAL`, so a commit only appends to the WAL instead of
+    forcing an fsync of the main database file. All SQLite work runs on the
+    Database's worker thread, so a slow disk never stalls the hub.
 
     Attributes:
         inbox (Queue): A queue for receiving log entries.
+        heartbeat (float): `time.monotonic()` as of the last pass through the
+            main loop, checked by the Watchdog.
+        PRAGMAS (tuple[str]): The connection settings for the database.
         _stop_event (Event): An event to signal the logger to stop.
-        _user_logs_path (str): The file path to the SQLite database for user
-            logs.
-        _conn (sqlite3.Connection): The SQLite connection object.
+        _db (Database): The user logs database, opened and migrated by
+            `open_user_logs` and closed by whoever opened it.
+        _batch_size (int): Maximum number of entries written per commit.
+        _flush_interval (float): Maximum number of seconds an entry may wait
+            in a batch before it is committed.
     """
 
-    def __init__(self, stop_event, app_config):
+    PRAGMAS = (
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        "PRAGMA wal_autocheckpoint=1000",
+    )
+
+    def __init__(self, stop_event, app_config, user_logs_db, inbox=None):
         gevent.Greenlet.__init__(self)
-        self.inbox = Queue()
+        self.inbox = inbox if inbox is not None else Queue()
+        self.heartbeat = time.monotonic()
         self._stop_event = stop_event
-        self._user_logs_path = app_config.user_logs_path
-        self._conn = None
+        self._db = user_logs_db
+        self._batch_size = app_config.logger_batch_size
+        self._flush_interval = app_config.logger_flush_interval
 
-    def _write(self, entry):
-        """Writes a log entry to the SQLite database.
+    def _write(self, batch):
+        """Writes a batch of log entries to the SQLite database in a single
+        transaction.
 
-        :param ParsedMessage entry: The log entry to write, containing the
-            nick, target, message, and timestamp.
+        :param list[ParsedMessage] batch: The log entries to write, each
+            containing the nick, target, message, and timestamp.
         :return: None
         :rtype: None
         """
         try:
-            self._conn.execute(
+            self._db.executemany(
                 "INSERT INTO user_logs VALUES (?, ?, ?, ?)",
-                (entry.nick, entry.target, entry.message, entry.timestamp)
+                [(e.nick, e.target, e.message, e.timestamp) for e in batch],
+                commit=True,
+                label="log",
             )
-            self._conn.commit()
         except sqlite3.Error as e:
-            logger.error(f"Logger write failed: {e}")
+            logger.error(f"Logger write failed ({len(batch)} entries): {e}")
+
+    def _collect_batch(self):
+        """Block for the first entry, then keep draining the inbox until the
+        batch is full or the flush interval has elapsed.
+
+        :return: The collected entries, possibly empty if nothing arrived.
+        :rtype: list[ParsedMessage]
+        """
+        try:
+            batch = [self.inbox.get(timeout=self._flush_interval)]
+        except Empty:
+            return []
+        deadline = time.monotonic() + self._flush_interval
+        while len(batch) < self._batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._stop_event.is_set():
+                break
+            try:
+                batch.append(self.inbox.get(timeout=remaining))
+            except Empty:
+                break
+        return batch
+
+    def _flush_remaining(self):
+        """Write out everything still queued in the inbox. Called on shutdown
+        so entries queued before the stop event fired are not lost.
+
+        :return: None
+        :rtype: None
+        """
+        batch = []
+        while True:
+            try:
+                batch.append(self.inbox.get_nowait())
+            except Empty:
+                break
+            if len(batch) >= self._batch_size:
+                self._write(batch)
+                batch = []
+        if batch:
+            self._write(batch)
 
     def _run(self):
-        """The main loop of the Logger greenlet. It initializes the SQLite
-        connection and listens for log entries until the stop event is set.
+        """The main loop of the Logger greenlet. It writes batches of log
+        entries until the stop event is set, then flushes whatever is left in
+        the inbox.
 
         :return: None
         :rtype: None
         """
-        self._conn = sqlite3.connect(self._user_logs_path)
-        self._conn.execute('''CREATE TABLE IF NOT EXISTS user_logs
-                             (nick text, target text, message text, timestamp real)''')
-        self._conn.commit()
         logger.info("Logger started.")
         try:
             while not self._stop_event.is_set():
-                try:
-                    entry = self.inbox.get(timeout=1)
-                except Empty:
-                    continue
-                self._write(entry)
+                self.heartbeat = time.monotonic()
+                batch = self._collect_batch()
+                if batch:
+                    self._write(batch)
         finally:
-            if self._conn:
-                self._conn.close()
+            # on a watchdog restart the inbox carries over to the replacement
+            if self._stop_event.is_set():
+                self._flush_remaining()
         logger.info("Logger stopped.")
@@ -0,0 +1,374 @@
+"""Runtime metrics: queues, the handler pool, command latency, the Writer and
+the databases.
+
+Nothing here runs per channel line. Queue depths, pool occupancy and Writer
+throughput are sampled by the Metrics greenlet a few times a second; the
+only hot-path cost is one histogram update when a command handler finishes.
+High-water marks are of the sampled depths, so a spike shorter than the
+sampling interval can be missed.
+
+Metrics are served in the Prometheus text format by `MetricsServer` (bound
+to localhost by default) and summarized on one line for the admin-only
+`.stats` command.
+
+Usage:
+    metrics = Metrics(stop_event)
+    metrics.watch_queue("dispatcher", dispatcher.inbox)
+    metrics.observe_command(".sb", 0.42, failed=False)
+    metrics.start()
+    MetricsServer(metrics, "127.0.0.1", 9108).start()
+"""
+import time
+from bisect import bisect_left
+
+import gevent
+from gevent.pywsgi import WSGIServer
+from loguru import logger
+
+
+# seconds; command latencies span sub-millisecond inline replies to LLM calls
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """A fixed-bucket latency histogram.
+
+    Attributes:
+        buckets (tuple[float]): Upper bounds of the buckets, ascending; an
+            implicit +Inf bucket follows.
+        counts (list[int]): Observations per bucket (not cumulative).
+        total (float): Sum of all observations.
+        count (int): Number of observations.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        """Record one observation."""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Estimate a quantile as the upper bound of the bucket it falls in.
+
+        :param float q: The quantile, between 0 and 1.
+        :return: The bucket bound, inf if it falls in the overflow bucket, or
+            None if nothing was observed.
+        :rtype: float | None
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip((*self.buckets, float("inf")), self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+class Metrics(gevent.Greenlet):
+    """Collects and renders the bot's runtime metrics.
+
+    Attributes:
+        queues (dict[str, list]): Per watched queue, `[depth, high_water]`
+            as of the last sample.
+        commands (dict[str, Histogram]): Handler latency per command.
+        errors (dict[str, int]): Handler exceptions per command.
+        writer_rate (tuple[float, float]): Writer lines and bytes per second
+            over the last sampling interval.
+        _stop_event (Event): Signals the sampler to stop.
+        _interval (float): Seconds between samples.
+        _watched (dict[str, object]): Queues to sample, by name; anything
+            with `qsize()`.
+        _sources (list[callable]): Functions returning extra
+            `(name, labels, value, kind)` samples at render time.
+        _writer (Writer | None): The current connection's Writer.
+        _writer_base (list[int]): Lines, bytes and flushes sent, and lines
+            requeued and dropped after failed sends, by previous
+            connections' Writers.
+        _writer_max (int): The most lines previous connections' Writers
+            coalesced into one flush.
+        _writer_last (tuple | None): Totals and time at the previous sample.
+        _PREFIX (str): Prepended to every metric name.
+    """
+
+    _PREFIX = "garybot_"
+
+    def __init__(self, stop_event, interval=0.25):
+        gevent.Greenlet.__init__(self)
+        self.queues = {}
+        self.commands = {}
+        self.errors = {}
+        self.writer_rate = (0.0, 0.0)
+        self._stop_event = stop_event
+        self._interval = interval
+        self._watched = {}
+        self._sources = []
+        self._writer = None
+        self._writer_base = [0, 0, 0, 0, 0]
+        self._writer_max = 0
+        self._writer_last = None
+
+    def watch_queue(self, name, queue):
+        """Sample a queue's depth and high-water mark.
+
+        :param str name: The label to report it under.
+        :param queue: Anything with `qsize()`.
+        """
+        self._watched[name] = queue
+        self.queues[name] = [0, 0]
+
+    def add_source(self, source):
+        """Add a function that returns extra samples at render time.
+
+        :param callable source: Returns an iterable of `(name, labels, value,
+            kind)`, where `labels` is a dict and `kind` is `gauge` or
+            `counter`.
+        """
+        self._sources.append(source)
+
+    def track_writer(self, writer):
+        """Count a new connection's Writer toward the Writer totals.
+
+        :param Writer writer: The Writer that just started.
+        """
+        if self._writer is not None:
+            self._writer_base = [total + n for total, n in zip(self._writer_base, self._writer_counts())]
+            self._writer_max = max(self._writer_max, self._writer.max_lines_per_flush)
+        self._writer = writer
+
+    def writer_totals(self):
+        """Return the lines, bytes and flushes sent since startup, and the
+        lines requeued and dropped after failed sends.
+
+        :rtype: tuple[int, int, int, int, int]
+        """
+        return tuple(total + n for total, n in zip(self._writer_base, self._writer_counts()))
+
+    def writer_coalescing(self):
+        """Return how well sends have been coalesced since startup: average
+        lines and bytes per flush, and the most lines in one flush.
+
+        :rtype: tuple[float, float, int]
+        """
+        lines, bytes_, flushes, _, _ = self.writer_totals()
+        most = self._writer_max
+        if self._writer is not None:
+            most = max(most, self._writer.max_lines_per_flush)
+        flushes = flushes or 1
+        return lines / flushes, bytes_ / flushes, most
+
+    def observe_command(self, command, seconds, failed=False):
+        """Record one handler run.
+
+        :param str command: The trigger word or passive trigger name.
+        :param float seconds: How long the handler took.
+        :param bool failed: Whether it raised.
+        """
+        histogram = self.commands.get(command)
+        if histogram is None:
+            histogram = self.commands[command] = Histogram()
+        histogram.observe(seconds)
+        if failed:
+            self.errors[command] = self.errors.get(command, 0) + 1
+
+    def _run(self):
+        """Sample until the stop event is set."""
+        while not self._stop_event.wait(self._interval):
+            self._sample()
+
+    def _sample(self):
+        """Take one sample of queue depths and Writer throughput."""
+        for name, queue in self._watched.items():
+            depth = queue.qsize()
+            entry = self.queues[name]
+            entry[0] = depth
+            if depth > entry[1]:
+                entry[1] = depth
+        now = time.monotonic()
+        lines, bytes_, _, _, _ = self.writer_totals()
+        if self._writer_last is not None:
+            last_lines, last_bytes, last_at = self._writer_last
+            elapsed = now - last_at
+            if elapsed > 0:
+                self.writer_rate = ((lines - last_lines) / elapsed, (bytes_ - last_bytes) / elapsed)
+        self._writer_last = (lines, bytes_, now)
+
+    def _writer_counts(self):
+        writer = self._writer
+        if writer is None:
+            return (0, 0, 0, 0, 0)
+        return (writer.lines_sent, writer.bytes_sent, writer.flushes, writer.lines_requeued, writer.lines_dropped)
+
+    def render(self):
+        """Render every metric in the Prometheus text exposition format.
+
+        :rtype: str
+        """
+        families = {}  # Prometheus wants each family's samples together
+
+        def emit(name, labels, value, kind, family=None):
+            family = self._PREFIX + (family or name)
+            lines = families.get(family)
+            if lines is None:
+                lines = families[family] = [f"# TYPE {family} {kind}"]
+            label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+            name = self._PREFIX + name
+            lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+
+        for name, (depth, high_water) in self.queues.items():
+            emit("queue_depth", {"queue": name}, depth, "gauge")
+            emit("queue_high_water", {"queue": name}, high_water, "gauge")
+
+        lines, bytes_, flushes, requeued, dropped = self.writer_totals()
+        emit("writer_lines_total", {}, lines, "counter")
+        emit("writer_bytes_total", {}, bytes_, "counter")
+        emit("writer_flushes_total", {}, flushes, "counter")
+        emit("writer_lines_requeued_total", {}, requeued, "counter")
+        emit("writer_lines_dropped_total", {}, dropped, "counter")
+        emit("writer_lines_per_second", {}, f"{self.writer_rate[0]:.3f}", "gauge")
+        emit("writer_bytes_per_second", {}, f"{self.writer_rate[1]:.3f}", "gauge")
+        lines_per_flush, bytes_per_flush, most = self.writer_coalescing()
+        emit("writer_lines_per_flush", {}, f"{lines_per_flush:.3f}", "gauge")
+        emit("writer_bytes_per_flush", {}, f"{bytes_per_flush:.3f}", "gauge")
+        emit("writer_max_lines_per_flush", {}, most, "gauge")
+
+        for command, histogram in self.commands.items():
+            cumulative = 0
+            for bound, n in zip((*histogram.buckets, "+Inf"), histogram.counts):
+                cumulative += n
+                emit("command_seconds_bucket", {"command": command, "le": bound}, cumulative,
+                     "histogram", family="command_seconds")
+            emit("command_seconds_sum", {"command": command}, f"{histogram.total:.6f}",
+                 "histogram", family="command_seconds")
+            emit("command_seconds_count", {"command": command}, histogram.count,
+                 "histogram", family="command_seconds")
+        for command, n in self.errors.items():
+            emit("command_errors_total", {"command": command}, n, "counter")
+
+        for source in self._sources:
+            try:
+                for name, labels, value, kind in source():
+                    emit(name, labels, value, kind)
+            except Exception as exc:
+                logger.warning(f"Metrics source failed: {exc}")
+        out = [line for lines in families.values() for line in lines]
+        return "\n".join(out) + "\n"
+
+    def summary(self):
+        """Summarize the most useful numbers on one IRC line.
+
+        :rtype: str
+        """
+        queues = " ".join(f"{name} {depth}/{high}" for name, (depth, high) in self.queues.items())
+        slowest = sorted(
+            ((h.quantile(0.95), command) for command, h in self.commands.items()),
+            reverse=True,
+        )[:3]
+        p95 = " ".join(f"{command} {_fmt_seconds(q)}" for q, command in slowest) or "none yet"
+        errors = sum(self.errors.values())
+        lines, bytes_, _, _, dropped = self.writer_totals()
+        lines_per_flush, _, most = self.writer_coalescing()
+        return (
+            f"[stats] queues (depth/peak): {queues} | slowest p95: {p95} | handler errors: {errors} | "
+            f"writer: {lines} lines, {bytes_} bytes, {self.writer_rate[0]:.1f} lines/s, "
+            f"{lines_per_flush:.1f} lines/flush (max {most}), {dropped} dropped"
+        )
+
+
+class MetricsServer:
+    """Serves `Metrics.render()` at `/metrics` over HTTP.
+
+    Attributes:
+        _metrics (Metrics): What to serve.
+        _server (WSGIServer): The gevent WSGI server.
+    """
+
+    def __init__(self, metrics, host, port):
+        self._metrics = metrics
+        self._server = WSGIServer((host, port), self._app, log=None)
+
+    def start(self):
+        """Start serving in the background."""
+        self._server.start()
+        logger.info(f"Serving metrics on http://{self._server.server_host}:{self._server.server_port}/metrics")
+
+    def stop(self):
+        """Stop serving."""
+        self._server.stop(timeout=1)
+
+    def _app(self, environ, start_response):
+        if environ.get("PATH_INFO") not in ("/", "/metrics"):
+            start_response("404 Not Found", [("Content-Type", "text/plain")])
+            return [b"not found\n"]
+        body = self._metrics.render().encode()
+        start_response("200 OK", [
+            ("Content-Type", "text/plain; version=0.0.4; charset=utf-8"),
+            ("Content-Length", str(len(body))),
+        ])
+        return [body]
+
+
+def dot_stats(metrics):
+    """Report runtime metrics on one line (admin only).
+
+    :param Metrics metrics: The shared metrics registry.
+    :return: The summary.
+    :rtype: str
+    """
+    return metrics.summary()
+
+
+def database_source(*databases):
+    """A metrics source reporting per-query latency of each Database.
+
+    :param Database databases: The databases to report.
+    :return: A source for `Metrics.add_source`.
+    :rtype: callable
+    """
+    def source():
+        for db in databases:
+            for label, (n, total, worst) in list(db.stats.items()):
+                labels = {"db": db.name, "query": label}
+                yield "db_queries_total", labels, n, "counter"
+                yield "db_query_seconds_total", labels, f"{total:.6f}", "counter"
+                yield "db_query_max_seconds", labels, f"{worst:.6f}", "gauge"
+    return source
+
+
+def http_source(http):
+    """A metrics source reporting requests, latency and connection reuse
+    per host of an HttpClient.
+
+    :param HttpClient http: The client to report.
+    :return: A source for `Metrics.add_source`.
+    :rtype: callable
+    """
+    def source():
+        for host, stats in http.host_stats().items():
+            labels = {"host": host}
+            yield "http_requests_total", labels, stats["requests"], "counter"
+            yield "http_errors_total", labels, stats["errors"], "counter"
+            yield "http_request_avg_seconds", labels, f"{stats['avg_ms'] / 1000:.6f}", "gauge"
+            yield "http_request_max_seconds", labels, f"{stats['max_ms'] / 1000:.6f}", "gauge"
+            yield "http_connections", labels, stats["connections"], "gauge"
+            yield "http_reused_total", labels, stats["reused"], "counter"
+    return source
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt_seconds(seconds):
+    if seconds is None:
+        return "n/a"
+    if seconds == float("inf"):
+        return f">{LATENCY_BUCKETS[-1]:g}s"
+    return f"≤{seconds * 1000:g}ms" if seconds < 1 else f"≤{seconds:g}s"
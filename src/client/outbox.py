@@ -0,0 +1,243 @@
+"""Priority and flood-pacing scheduler for outbound IRC lines.
+
+Drop-in replacement for the Writer's `Queue`: producers `put` lines, the
+Writer `get`s them. Lines come out in priority order:
+
+1. PROTOCOL — keepalives and registration (`PONG`, `JOIN`, ...). Never wait
+   behind anything and are never held back by pacing.
+2. ADMIN — replies to the bot admin.
+3. REPLY — everything else.
+
+Within a class, lines are grouped by a fairness key (by default the line's
+target, or whatever the producer passes, e.g. target and requester) and the
+groups are served round-robin, so one user's multi-slice LLM reply can't
+hold up everyone else's.
+
+Pacing is a token bucket: `burst` lines may go out back to back, after which
+lines are released at `rate` per second. This mirrors the classic ircd flood
+control (a per-line penalty with a short allowance), so bursts of replies are
+smoothed out instead of getting the bot kicked for excess flood. A line too
+long for one IRC message is split on the way in, the way the Writer would
+split it, so every slice is paced like any other line.
+"""
+import time
+from collections import deque
+
+from gevent.event import Event
+from gevent.lock import BoundedSemaphore
+from gevent.queue import Empty
+
+from src.client.tracing import TracedLine
+from src.client.writer import Writer
+
+
+PROTOCOL, ADMIN, REPLY = 0, 1, 2
+
+_PROTOCOL_COMMANDS = frozenset({"PING", "PONG", "PASS", "CAP", "NICK", "USER", "JOIN", "QUIT"})
+
+
+class Outbox:
+    """A paced, prioritized, round-robin queue of outbound lines.
+
+    Attributes:
+        maxsize (int): The most ADMIN and REPLY lines that may be queued;
+            `put` blocks beyond that. PROTOCOL lines are never refused.
+        burst (int): The token bucket capacity, in lines.
+        rate (float): Tokens (lines) added to the bucket per second.
+        _queues (list[dict]): Per class, the pending lines for each fairness
+            key.
+        _turns (list[deque]): Per class, the keys with pending lines in
+            round-robin order.
+        _tokens (float): Lines that may be sent right now.
+        _refilled_at (float): When `_tokens` was last topped up.
+        _ready (Event): Set whenever a line is put.
+        _slots (BoundedSemaphore): Free ADMIN/REPLY capacity.
+        _MAX_LINE (int): Bytes per IRC line, excluding \r\n; longer lines
+            are split into slices of at most this size.
+    """
+
+    _MAX_LINE = 510
+
+    def __init__(self, maxsize=100, burst=10, rate=1.0):
+        self.maxsize = maxsize
+        self.burst = burst
+        self.rate = rate
+        self._queues = [{}, {}, {}]
+        self._turns = [deque(), deque(), deque()]
+        self._size = 0
+        self._tokens = float(burst)
+        self._refilled_at = time.monotonic()
+        self._ready = Event()
+        self._slots = BoundedSemaphore(maxsize)
+
+    def qsize(self):
+        """Return the number of queued lines across all classes."""
+        return self._size
+
+    def empty(self):
+        """Return True if no lines are queued."""
+        return self._size == 0
+
+    def put(self, line, priority=None, key=None):
+        """Queue a line for sending.
+
+        A line longer than one IRC message is queued as its slices, one
+        after another under the same key; a traced line's span goes with
+        the last slice.
+
+        :param str line: The IRC line, without \\r\\n.
+        :param int | None priority: PROTOCOL, ADMIN or REPLY. Defaults to
+            PROTOCOL for keepalive/registration commands and REPLY otherwise.
+        :param key: Fairness key; lines sharing a key are sent in order, and
+            keys take turns. Defaults to the line's target.
+        :return: None
+        :rtype: None
+        """
+        command, _, rest = line.partition(" ")
+        if priority is None:
+            priority = PROTOCOL if command.upper() in _PROTOCOL_COMMANDS else REPLY
+        if key is None:
+            key = rest.split(" ", 1)[0]
+        for piece in self._split(line):
+            if priority != PROTOCOL:
+                self._slots.acquire()
+            queue = self._queues[priority].get(key)
+            if queue is None:
+                queue = self._queues[priority][key] = deque()
+                self._turns[priority].append(key)
+            queue.append(piece)
+            self._size += 1
+            self._ready.set()
+
+    def requeue(self, lines):
+        """Put back lines a failed send had taken, at the front of their
+        keys' queues and in their original order, so they go out first on
+        the next connection.
+
+        Lines come back as REPLY lines keyed by target, since their original
+        class and key aren't kept. PROTOCOL lines belonged to the dead
+        connection's session and are dropped, as are lines that no longer
+        fit in `maxsize`.
+
+        :param list[str] lines: The lines, in the order they were taken.
+        :return: How many lines were put back.
+        :rtype: int
+        """
+        requeued = 0
+        for line in reversed(lines):
+            command, _, rest = line.partition(" ")
+            if command.upper() in _PROTOCOL_COMMANDS:
+                continue
+            if not self._slots.acquire(blocking=False):
+                continue
+            key = rest.split(" ", 1)[0]
+            queue = self._queues[REPLY].get(key)
+            if queue is None:
+                queue = self._queues[REPLY][key] = deque()
+            else:
+                self._turns[REPLY].remove(key)
+            # the key of the earliest line ends up taking the first turn
+            self._turns[REPLY].appendleft(key)
+            queue.appendleft(line)
+            self._size += 1
+            requeued += 1
+        if requeued:
+            self._ready.set()
+        return requeued
+
+    def get(self, block=True, timeout=None):
+        """Take the next line that may be sent now, waiting for one to be
+        queued or for pacing to allow it.
+
+        :param bool block: Wait if nothing may be sent right now.
+        :param float | None timeout: The longest to wait, in seconds.
+        :return: The line to send.
+        :rtype: str
+        :raises Empty: If nothing became sendable in time.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            line, wait = self._pop_sendable()
+            if line is not None:
+                return line
+            if not block:
+                raise Empty
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise Empty
+                wait = remaining if wait is None else min(wait, remaining)
+            # woken early by a put, in case it's a PROTOCOL line
+            self._ready.clear()
+            self._ready.wait(wait)
+
+    def get_nowait(self):
+        """Take the next line that may be sent now, without waiting.
+
+        :raises Empty: If nothing may be sent right now.
+        """
+        return self.get(block=False)
+
+    def _pop_sendable(self):
+        """Pop the highest-priority line that pacing allows.
+
+        :return: The line, or None and how long until the next queued line
+            could be sent (None if nothing is queued).
+        :rtype: tuple[str | None, float | None]
+        """
+        self._refill()
+        for priority, turns in enumerate(self._turns):
+            if not turns:
+                continue
+            if priority != PROTOCOL and self._tokens < 1:
+                return None, (1 - self._tokens) / self.rate
+            self._tokens -= 1
+            return self._pop(priority), None
+        return None, None
+
+    def _pop(self, priority):
+        """Pop the head line of the key whose turn it is and rotate turns."""
+        turns = self._turns[priority]
+        key = turns.popleft()
+        queue = self._queues[priority][key]
+        line = queue.popleft()
+        if queue:
+            turns.append(key)
+        else:
+            del self._queues[priority][key]
+        self._size -= 1
+        if priority != PROTOCOL:
+            self._slots.release()
+        return line
+
+    def _refill(self):
+        """Top up the token bucket for the time elapsed since the last call."""
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+
+    def _split(self, line):
+        """Split a line into the slices the Writer would frame it as, so
+        each can be paced as one line.
+
+        :param str line: The IRC line, without \\r\\n.
+        :return: The line itself if it fits in one IRC message, otherwise its
+            slices, each repeating the text up to the first `:`.
+        :rtype: list[str]
+        """
+        if len(line) <= self._MAX_LINE // 4:  # can't exceed one line even if all 4-byte chars
+            return [line]
+        try:
+            line_bytes = line.encode("utf-8")
+        except UnicodeEncodeError:
+            return [line]  # the Writer rejects it
+        if len(line_bytes) <= self._MAX_LINE:
+            return [line]
+        split_index = line_bytes.find(b":")
+        prefix = line_bytes[:split_index + 1]
+        slices = Writer._slice_by_bytes(line_bytes[split_index + 1:], slice_size=self._MAX_LINE - len(prefix))
+        pieces = [(prefix + piece).decode("utf-8") for piece in slices]
+        trace = getattr(line, "trace", None)
+        if trace is not None:
+            pieces[-1] = TracedLine(pieces[-1], trace)
+        return pieces
@@ -0,0 +1,242 @@
+"""Sampled end-to-end latency traces for channel lines.
+
+A sampled line is tagged by the Listener the moment it is read, and the tag
+travels with it: the line itself is a `TracedLine` (a `str` that carries its
+`Trace`), the Dispatcher copies the trace into `ParsedMessage.trace`, and
+`_run_function` wraps each reply in a `TracedLine` again so the Outbox and
+the Writer pass it along without knowing. Every handler run for a traced
+line is written out as one JSON line once its reply has been sent (or once
+the handler returns, if it had nothing to say):
+
+    {"trace": "5f3a9c0e-12", "command": ".sb", "target": "#chan",
+     "queue_ms": 0.1, "parse_ms": 0.02, "pool_ms": 0.05, "handler_ms": 412.7,
+     "http_ms": 398.2, "outbox_ms": 0.3, "send_ms": 0.1, "total_ms": 413.3}
+
+`queue_ms` is the wait in the Dispatcher's inbox, `parse_ms` parsing and
+filtering, `pool_ms` the wait for the handler to start (routing plus any
+wait for a pool slot), `handler_ms` the handler itself, `http_ms` the part
+of it spent in `HttpClient`, `outbox_ms` the wait for the Writer (pacing
+included) and `send_ms` the `sendall`. Lines routed to another actor
+(`.tr`) are not traced.
+
+Unsampled lines are plain strings; with tracing disabled there is no
+Tracer at all and the hot path is unchanged.
+
+Usage:
+    tracer = Tracer(stop_event, path, sample_rate=0.01)
+    tracer.start()
+    line = tracer.tag(line)  # in the Listener
+"""
+import itertools
+import json
+import os
+import random
+import time
+
+import gevent
+from gevent.local import local
+from gevent.queue import Queue, Empty
+from loguru import logger
+
+
+_current = local()
+
+
+def current_span():
+    """Return the span of the handler running in this greenlet, if traced.
+
+    :rtype: Span | None
+    """
+    return getattr(_current, "span", None)
+
+
+def set_current_span(span):
+    """Make a span the current greenlet's, so HTTP time is charged to it.
+
+    :param Span | None span: The span, or None once the handler is done.
+    """
+    _current.span = span
+
+
+class TracedLine(str):
+    """A line of IRC text that carries its trace along.
+
+    Attributes:
+        trace (Trace | Span): What the line belongs to: the raw line's
+            Trace on the way in, a handler's Span on the way out.
+    """
+
+    __slots__ = ("trace",)
+
+    def __new__(cls, text, trace):
+        line = super().__new__(cls, text)
+        line.trace = trace
+        return line
+
+
+class Trace:
+    """Timestamps for one sampled inbound line.
+
+    Attributes:
+        id (str): The correlation ID, unique within the process and across
+            restarts.
+        received (float): `time.perf_counter()` when the Listener read it.
+        dequeued (float | None): When the Dispatcher took it off its inbox.
+        parsed (float | None): When the Dispatcher had parsed and filtered
+            it, just before routing it to handlers.
+        tracer (Tracer): Where finished spans are sent.
+    """
+
+    __slots__ = ("id", "received", "dequeued", "parsed", "tracer")
+
+    def __init__(self, trace_id, tracer):
+        self.id = trace_id
+        self.received = time.perf_counter()
+        self.dequeued = None
+        self.parsed = None
+        self.tracer = tracer
+
+    def span(self, command, target):
+        """Start the span of one handler run for this line, as the handler
+        starts.
+
+        :param str command: The trigger word or passive trigger name.
+        :param str target: The channel the reply goes to.
+        :rtype: Span
+        """
+        return Span(self, command, target)
+
+
+class Span:
+    """One handler run for a traced line, from the line being read to the
+    reply being sent.
+
+    Attributes:
+        trace (Trace): The line this run was triggered by.
+        command (str): The trigger word or passive trigger name.
+        target (str): The channel.
+        started (float): When the handler was started.
+        handled (float | None): When it returned.
+        http (float): Seconds spent in HTTP requests during the handler.
+        sent (tuple[float, float] | None): When the Writer started and
+            finished sending the reply.
+        failed (bool): Whether the handler raised.
+    """
+
+    __slots__ = ("trace", "command", "target", "started", "handled", "http", "sent", "failed")
+
+    def __init__(self, trace, command, target):
+        self.trace = trace
+        self.command = command
+        self.target = target
+        self.started = time.perf_counter()
+        self.handled = None
+        self.http = 0.0
+        self.sent = None
+        self.failed = False
+
+    def finish(self):
+        """Hand the finished span to the tracer to be written out."""
+        self.trace.tracer.record(self)
+
+    def to_dict(self):
+        """Break the span down into stage durations, in milliseconds.
+
+        :rtype: dict
+        """
+        trace = self.trace
+        end = self.sent[1] if self.sent else self.handled
+        record = {
+            "trace": trace.id,
+            "command": self.command,
+            "target": self.target,
+            "queue_ms": _ms(trace.dequeued - trace.received),
+            "parse_ms": _ms(trace.parsed - trace.dequeued),
+            "pool_ms": _ms(self.started - trace.parsed),
+            "handler_ms": _ms(self.handled - self.started),
+            "http_ms": _ms(self.http),
+            "outbox_ms": _ms(self.sent[0] - self.handled) if self.sent else None,
+            "send_ms": _ms(self.sent[1] - self.sent[0]) if self.sent else None,
+            "total_ms": _ms(end - trace.received),
+        }
+        if self.failed:
+            record["failed"] = True
+        return record
+
+
+class Tracer(gevent.Greenlet):
+    """Samples inbound lines and appends finished spans to a JSONL file.
+
+    Spans are written in batches on the hub's thread pool, so a slow disk
+    never stalls the hub.
+
+    Attributes:
+        inbox (Queue): Finished spans waiting to be written.
+        sample_rate (float): The fraction of lines traced.
+        _path (pathlib.Path): The JSONL file spans are appended to.
+        _stop_event (Event): Signals the tracer to stop.
+        _ids (Iterator[int]): Sequence numbers for correlation IDs.
+        _prefix (str): Makes IDs unique across restarts.
+        _FLUSH_INTERVAL (float): Seconds between writes.
+        _MAX_QUEUED (int): Spans beyond this many waiting to be written are
+            dropped.
+    """
+
+    _FLUSH_INTERVAL = 1.0
+    _MAX_QUEUED = 10_000
+
+    def __init__(self, stop_event, path, sample_rate=0.01):
+        gevent.Greenlet.__init__(self)
+        self.inbox = Queue()
+        self.sample_rate = sample_rate
+        self._path = path
+        self._stop_event = stop_event
+        self._ids = itertools.count(1)
+        self._prefix = f"{os.getpid():x}{int(time.time()) & 0xffff:04x}"
+
+    def tag(self, line):
+        """Start tracing a freshly read line if it is sampled.
+
+        :param str line: The raw line.
+        :return: The line itself, or a TracedLine carrying its new Trace.
+        :rtype: str
+        """
+        if random.random() >= self.sample_rate:
+            return line
+        return TracedLine(line, Trace(f"{self._prefix}-{next(self._ids)}", self))
+
+    def record(self, span):
+        """Queue a finished span to be written."""
+        if self.inbox.qsize() < self._MAX_QUEUED:
+            self.inbox.put(span)
+
+    def _run(self):
+        """Write queued spans every flush interval until the stop event is
+        set, then write whatever is left."""
+        logger.info(f"Tracing {self.sample_rate:.1%} of lines to {self._path}")
+        while not self._stop_event.wait(self._FLUSH_INTERVAL):
+            self._flush()
+        self._flush()
+
+    def _flush(self):
+        records = []
+        while True:
+            try:
+                records.append(json.dumps(self.inbox.get_nowait().to_dict()))
+            except Empty:
+                break
+        if not records:
+            return
+        try:
+            gevent.get_hub().threadpool.apply(self._append, (records,))
+        except OSError as exc:
+            logger.error(f"Could not write {len(records)} trace span(s): {exc}")
+
+    def _append(self, records):
+        """Append records to the trace file. Runs on a worker thread."""
+        with open(self._path, "a", encoding="utf-8") as f:
+            f.write("\n".join(records) + "\n")
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 3)
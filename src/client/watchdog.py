@@ -0,0 +1,125 @@
+"""Restarts actors that die or stop draining their queue.
+
+Every supervised actor stamps `heartbeat` (a `time.monotonic()` value) each
+time round its main loop, which is at least once a second even when idle.
+An actor is restarted when its greenlet has died, or when it has work
+queued but hasn't come round its loop for `stall_after` seconds (stuck in a
+handler, a wedged socket write, and so on).
+
+A restart hands the old actor to a factory, which builds its replacement
+around the same inbox, so nothing queued is lost and everyone holding the
+inbox keeps working. A factory may also just trigger some other recovery
+and return None, as the client does for the socket-bound actors by forcing
+a reconnect.
+
+Usage:
+    watchdog = Watchdog(stop_event, stall_after=60)
+    watchdog.watch("logger", logger_, lambda old: Logger(..., inbox=old.inbox))
+    watchdog.start()
+"""
+import time
+
+import gevent
+from loguru import logger
+
+
+class Watchdog(gevent.Greenlet):
+    """Checks supervised actors every `interval` seconds.
+
+    Attributes:
+        restarts (dict[str, int]): Restarts per actor name.
+        _stop_event (Event): Signals the watchdog to stop; nothing is
+            restarted once it is set.
+        _interval (float): Seconds between checks.
+        _stall_after (float): Seconds an actor with queued work may go
+            without a heartbeat before it is restarted.
+        _watched (dict[str, list]): `name -> [actor, factory]`.
+    """
+
+    def __init__(self, stop_event, interval=5.0, stall_after=60.0):
+        gevent.Greenlet.__init__(self)
+        self.restarts = {}
+        self._stop_event = stop_event
+        self._interval = interval
+        self._stall_after = stall_after
+        self._watched = {}
+
+    def watch(self, name, actor, factory):
+        """Supervise an actor, replacing any actor already watched under the
+        same name.
+
+        :param str name: A short name for log messages.
+        :param gevent.Greenlet actor: The actor; it must have `inbox` and
+            `heartbeat` attributes.
+        :param callable factory: Called with the failed actor; returns its
+            unstarted replacement, or None if it has handled recovery itself.
+        :return: None
+        :rtype: None
+        """
+        self._watched[name] = [actor, factory]
+
+    def unwatch(self, name, actor=None):
+        """Stop supervising an actor that is being shut down on purpose, so
+        its exit isn't taken for a failure.
+
+        :param str name: The name it was watched under.
+        :param gevent.Greenlet | None actor: Only unwatch if this is still the
+            actor watched under `name`.
+        :return: None
+        :rtype: None
+        """
+        entry = self._watched.get(name)
+        if entry is not None and (actor is None or entry[0] is actor):
+            del self._watched[name]
+
+    def actors(self):
+        """Return the actors currently supervised.
+
+        :rtype: list[gevent.Greenlet]
+        """
+        return [actor for actor, _ in self._watched.values()]
+
+    def actor(self, name):
+        """Return the actor currently supervised under a name.
+
+        :param str name: The name it was watched under.
+        :return: The actor, or None if nothing is watched under that name.
+        :rtype: gevent.Greenlet | None
+        """
+        entry = self._watched.get(name)
+        return entry[0] if entry else None
+
+    def _run(self):
+        """Check every actor each interval until the stop event is set."""
+        logger.info("Watchdog started.")
+        while not self._stop_event.wait(self._interval):
+            for name in list(self._watched):
+                self._check(name)
+        logger.info("Watchdog stopped.")
+
+    def _check(self, name):
+        """Restart one actor if it has died or stalled."""
+        if name not in self._watched:
+            return  # unwatched since the pass began
+        actor, factory = self._watched[name]
+        if actor.ready():
+            reason = f"exited ({actor.exception!r})" if actor.exception else "exited"
+        elif not actor.started:
+            return
+        else:
+            stalled_for = time.monotonic() - actor.heartbeat
+            if stalled_for < self._stall_after or not actor.inbox.qsize():
+                return
+            reason = f"stalled for {stalled_for:.1f}s with {actor.inbox.qsize()} queued"
+        if self._stop_event.is_set():
+            return
+        logger.error(f"Actor {name} {reason}; restarting.")
+        self.restarts[name] = self.restarts.get(name, 0) + 1
+        if not actor.ready():
+            actor.kill(block=False)
+        replacement = factory(actor)
+        if replacement is None:
+            del self._watched[name]
+            return
+        self._watched[name][0] = replacement
+        replacement.start()
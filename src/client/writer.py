@@ -1,83 +1,166 @@
 """"""
 import ssl
+import time
 
 import gevent
-from gevent.queue import Queue, Empty
+from gevent.queue import Empty
 from loguru import logger
 
 
 class Writer(gevent.Greenlet):
     """A greenlet that sends lines to the IRC server. Lines are put into the
-    inbox queue, and the greenlet takes care of encoding and sending them.
+    inbox, and the greenlet takes care of encoding and sending them. The inbox
+    is an Outbox, which decides which line goes next (keepalives first) and
+    paces them to stay under the server's flood limits.
+
+    Whatever is already queued when the Writer wakes up is coalesced into a
+    single buffer (up to `_FLUSH_BUDGET` bytes) and sent with one `sendall`,
+    so a multi-slice reply or a burst of replies costs one syscall and, on
+    TLS, as few records as possible instead of one per line.
 
     Attributes:
-        inbox (Queue): A queue of lines to send to the server. Lines should be
+        inbox (Outbox): The lines to send to the server. Lines should be
             strings without newlines; the greenlet will append \r\n and encode
             them before sending.
+        heartbeat (float): `time.monotonic()` as of the last pass through the
+            main loop, checked by the Watchdog.
+        flushes (int): The number of `sendall` calls made.
+        lines_sent (int): The number of framed IRC lines sent, counting each
+            slice of a long line separately.
+        bytes_sent (int): The number of bytes sent.
+        max_lines_per_flush (int): The most lines coalesced into one flush.
+        lines_requeued (int): Lines put back on the inbox after a failed
+            send, for the next connection to send.
+        lines_dropped (int): Lines lost to a failed send because the inbox
+            wouldn't take them back.
         _socket (socket): The socket object used to send data to the server.
             Should be a connected socket.
         _encoding (str): The character encoding to use when encoding lines
             before sending. Defaults to 'utf-8'.
         _stop_event (Event): A gevent event that signals the greenlet to stop.
+        _FLUSH_BUDGET (int): Stop draining the inbox into a flush once it
+            holds at least this many bytes.
     """
 
-    def __init__(self, socket, stop_event, encoding='utf-8'):
+    _FLUSH_BUDGET = 8192
+
+    def __init__(self, socket, stop_event, inbox, encoding='utf-8'):
         gevent.Greenlet.__init__(self)
-        self.inbox = Queue(maxsize=100)
+        self.inbox = inbox
+        self.heartbeat = time.monotonic()
+        self.flushes = 0
+        self.lines_sent = 0
+        self.bytes_sent = 0
+        self.max_lines_per_flush = 0
+        self.lines_requeued = 0
+        self.lines_dropped = 0
         self._socket = socket
         self._encoding = encoding
         self._stop_event = stop_event
 
     def _run(self):
-        """The main loop of the greenlet. Continuously checks the inbox for
-        lines to send, and sends them until the stop event is set.
+        """The main loop of the greenlet. Waits for a line, coalesces it with
+        anything else already queued, and sends the lot until the stop event
+        is set.
 
         :return: None
         :rtype: None
         """
         logger.info("Writer started.")
         while not self._stop_event.is_set():
+            self.heartbeat = time.monotonic()
             try:
                 line = self.inbox.get(timeout=1)
             except Empty:
                 continue
+            payload, lines, line_count, spans = self._coalesce(line)
+            if not payload:
+                continue
+            sending = time.perf_counter()
             try:
-                self._send(line)
+                self._send(payload, line_count)
             except (OSError, ssl.SSLError) as exc:
-                logger.error(f"Error sending line: {exc}")
-                self._stop_event.set()
-                raise
+                requeued = self.inbox.requeue(lines)
+                self.lines_requeued += requeued
+                self.lines_dropped += len(lines) - requeued
+                logger.error(f"Error sending {line_count} line(s), {requeued} requeued: {exc}")
+                self._stop_event.set()  # end the connection; the client reconnects
+                break
+            if spans:
+                sent = (sending, time.perf_counter())
+                for span in spans:
+                    span.sent = sent
+                    span.finish()
+        logger.info("Writer stopped.")
+
+    def _coalesce(self, line):
+        """Frame `line` and keep framing queued lines into the same buffer
+        until the inbox is empty or the flush budget is reached.
+
+        :param str line: The first line, already taken from the inbox.
+        :return: The bytes to send, the lines they were framed from, the
+            number of framed lines in them and the trace spans of any traced
+            replies among them.
+        :rtype: tuple[bytearray, list[str], int, list[Span]]
+        """
+        payload = bytearray()
+        lines = []
+        line_count = 0
+        spans = []
+        while True:
+            span = getattr(line, "trace", None)
+            if span is not None:
+                spans.append(span)
+            try:
+                for framed in self._frame(line):
+                    payload += framed
+                    line_count += 1
+                lines.append(line)
             except ValueError as exc:
                 logger.error(f"Invalid line: {exc}")
-                continue
-        logger.info("Writer stopped.")
+            if len(payload) >= self._FLUSH_BUDGET:
+                break
+            try:
+                line = self.inbox.get_nowait()
+            except Empty:
+                break
+        return payload, lines, line_count, spans
 
-    def _send(self, line):
-        """Encode and send a single IRC line (newline appended automatically).
+    def _send(self, payload, line_count):
+        """Send a coalesced buffer of framed lines in one call.
 
-        :param str line: The line to send to the server. Should not include
-            newlines; the method will append \r\n before encoding and sending.
+        :param bytes payload: One or more framed lines, each ending in \r\n.
+        :param int line_count: How many framed lines `payload` holds.
         :return: None
         :rtype: None
         """
         if not self._socket:
             raise OSError("Not connected")
+        self._socket.sendall(payload)
+        self.flushes += 1
+        self.lines_sent += line_count
+        self.bytes_sent += len(payload)
+        self.max_lines_per_flush = max(self.max_lines_per_flush, line_count)
 
+    def _frame(self, line):
+        """Encode a single IRC line, splitting it into slices that each fit in
+        512 bytes, and append \r\n to each.
+
+        :param str line: The line to frame. Should not include newlines.
+        :return: The framed lines, ready to send.
+        :rtype: list[bytes]
+        """
         line_bytes = line.encode(self._encoding)
         max_line_length = 510 # 512 bytes total minus \r\n
 
         if len(line_bytes) <= max_line_length:
-            lines_to_send = [line_bytes]
-        else:
-            split_index = line_bytes.find(b':')
-            prefix_bytes = line_bytes[:split_index + 1] # include ':'
-            msg_bytes = line_bytes[split_index + 1:]
-            slice_size = max_line_length - len(prefix_bytes)
-            slices = self._slice_by_bytes(msg_bytes, slice_size=slice_size)
-            lines_to_send = [prefix_bytes + slice for slice in slices]
-
-        for l in lines_to_send:
-            self._socket.sendall(l + b'\r\n')
+            return [line_bytes + b'\r\n']
+        split_index = line_bytes.find(b':')
+        prefix_bytes = line_bytes[:split_index + 1] # include ':'
+        msg_bytes = line_bytes[split_index + 1:]
+        slice_size = max_line_length - len(prefix_bytes)
+        slices = self._slice_by_bytes(msg_bytes, slice_size=slice_size)
+        return [prefix_bytes + slice + b'\r\n' for slice in slices]
 
     @staticmethod
     def _slice_by_bytes(line_bytes, slice_size=512):
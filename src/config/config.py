@@ -29,9 +29,16 @@ class AppSettings(BaseSettings):
     irc_nick: str = Field(description="IRC bot nickname")
     irc_server: str = Field(description="IRC server address")
     irc_port: int = Field(ge=1, le=65535, description="IRC server port")
+    irc_ca_file: Path | None = Field(default=None, description="CA bundle to verify the server's certificate against instead of the system store")
     irc_main_channel: str = Field(description="IRC channel to join on startup")
+    irc_channels: str = Field(default='', description="Comma-separated list of additional channels to join")
+    irc_channel_commands: dict[str, list[str]] = Field(
+        default_factory=dict,
+        description="Per-channel allowlist of command words and passive trigger names; unlisted channels get everything",
+    )
     irc_llm_model: str = Field(description="LLM model to use for IRC interactions")
     irc_ignore_list: str = Field(default='', description="List of IRC nicknames to ignore")
+    irc_admin_nick: str = Field(default='', description="Nick of the bot admin, whose replies are sent ahead of others")
 
     wolfram_api_key: SecretStr = Field(description="API key for Wolfram Alpha")
     odds_api_key: SecretStr = Field(description="API key for The Odds API")
@@ -41,6 +48,34 @@ class AppSettings(BaseSettings):
 
     project_root: Path = Field(default=PROJ_ROOT.resolve())
     user_logs_path: Path = Field(default=PROJ_ROOT.resolve() / "data" / "user_logs" / "user_logs.db")
+    odds_history_path: Path = Field(default=PROJ_ROOT.resolve() / "data" / "odds" / "odds_history.db")
+    trivia_db_path: Path = Field(default=PROJ_ROOT.resolve() / "data" / "trivia" / "trivia.db")
+    trace_path: Path = Field(default=PROJ_ROOT.resolve() / "data" / "traces" / "traces.jsonl")
+    odds_history_days: int = Field(default=30, ge=1, description="Days after a game starts that its line history is kept")
+    logger_batch_size: int = Field(default=200, ge=1, description="Max log entries committed per transaction")
+    logger_flush_interval: float = Field(default=1.0, gt=0, description="Max seconds a log entry waits before being committed")
+    dispatcher_pool_size: int = Field(default=10, ge=1, description="Max handler greenlets running at once (also sizes each HTTP keep-alive pool)")
+    convo_max_lines: int = Field(default=50, ge=1, description="Most recent channel lines kept as chatbot context")
+    convo_max_bytes: int = Field(default=0, ge=0, description="Most bytes of chatbot context kept (0 for no limit)")
+    reconnect_backoff_base: float = Field(default=1.0, gt=0, description="Seconds before the first reconnect attempt; doubles per failed attempt")
+    reconnect_backoff_max: float = Field(default=300.0, gt=0, description="Longest wait between reconnect attempts")
+    watchdog_stall_seconds: float = Field(default=60.0, gt=0, description="Seconds an actor with queued work may go unresponsive before it is restarted")
+    writer_flood_burst: int = Field(default=10, ge=1, description="Lines the bot may send back to back before pacing kicks in")
+    writer_flood_rate: float = Field(default=1.0, gt=0, description="Sustained outbound lines per second once the burst is spent")
+    metrics_host: str = Field(default="127.0.0.1", description="Address the metrics endpoint listens on")
+    metrics_port: int = Field(default=0, ge=0, le=65535, description="Port for Prometheus metrics at /metrics (0 to disable)")
+    hub_block_seconds: float = Field(default=0.0, ge=0, description="Report hub stalls longer than this many seconds, naming the culprit (0 to disable)")
+    trace_sample_rate: float = Field(default=0.0, ge=0, le=1, description="Fraction of channel lines traced end to end to trace_path (0 to disable)")
+
+    @property
+    def channels(self) -> list[str]:
+        """The main channel followed by the additional channels, deduplicated."""
+        channels = [self.irc_main_channel]
+        for channel in self.irc_channels.split(","):
+            channel = channel.strip()
+            if channel and channel.lower() not in {c.lower() for c in channels}:
+                channels.append(channel)
+        return channels
 
     @field_validator("irc_ignore_list", mode="after")
     @classmethod
@@ -21,6 +21,10 @@ def main():
     # move somewhere idk
     app_config.user_logs_path.parent.mkdir(parents=True, exist_ok=True)
     app_config.user_logs_path.touch(exist_ok=True)
+    app_config.odds_history_path.parent.mkdir(parents=True, exist_ok=True)
+    app_config.trivia_db_path.parent.mkdir(parents=True, exist_ok=True)
+    if app_config.trace_sample_rate:
+        app_config.trace_path.parent.mkdir(parents=True, exist_ok=True)
 
     # make it dirty
     logger.info("Starting IRC client...")
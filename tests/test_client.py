@@ -0,0 +1,99 @@
+"""IRCClient reconnect backoff, and reconnecting against a real server."""
+import os
+import shutil
+import signal
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import gevent
+import pytest
+from gevent import subprocess
+
+import src.client.client as client_module
+from src.client.client import IRCClient
+
+
+def make_client(base=1.0, maximum=300.0):
+    return IRCClient(SimpleNamespace(
+        irc_server="localhost", irc_port="6697", irc_nick="garybot", irc_main_channel="#main",
+        channels=["#main"], reconnect_backoff_base=base, reconnect_backoff_max=maximum, irc_ca_file=None,
+    ))
+
+
+@pytest.mark.parametrize("jitter", [0.5, 1.0])
+def test_backoff_doubles_up_to_the_max(monkeypatch, jitter):
+    monkeypatch.setattr(client_module.random, "uniform", lambda low, high: jitter)
+    client = make_client(base=1.0, maximum=30.0)
+    assert [client._backoff(attempt) for attempt in range(7)] == [
+        jitter * delay for delay in (1, 2, 4, 8, 16, 30, 30)
+    ]
+
+
+def test_backoff_jitter_stays_in_range():
+    client = make_client(base=2.0, maximum=300.0)
+    for attempt in range(12):
+        ceiling = min(300.0, 2.0 * 2 ** attempt)
+        for _ in range(20):
+            assert ceiling / 2 <= client._backoff(attempt) <= ceiling
+
+
+def test_backoff_survives_a_long_outage():
+    assert make_client(maximum=300.0)._backoff(5000) <= 300.0
+
+
+_NICK = "testbot"
+_CHANNEL = "#test"
+
+
+@pytest.mark.skipif(shutil.which("openssl") is None, reason="needs openssl for a test certificate")
+def test_reconnects_after_the_server_drops_it(tmp_path):
+    from benchmarks.fake_ircd import FakeIRCd, make_self_signed_cert
+
+    cert, key = make_self_signed_cert(tmp_path)
+    server = FakeIRCd(cert, key)
+    joins, replies = [], []
+    server.on_join = lambda session, channel: joins.append(session) if session.nick == _NICK else None
+    server.on_privmsg = lambda session, target, text, _: replies.append(text) if session.nick == _NICK else None
+    server.start()
+    env = dict(
+        os.environ,
+        IRC_NICK=_NICK, IRC_SERVER="localhost", IRC_PORT=str(server.port), IRC_CA_FILE=str(cert),
+        IRC_MAIN_CHANNEL=_CHANNEL, IRC_LLM_MODEL="test-model", IRC_ADMIN_NICK="",
+        WOLFRAM_API_KEY="test", ODDS_API_KEY="test", LLM_API_KEY="test",
+        NASA_API_KEY="test", YOUTUBE_API_KEY="test",
+        USER_LOGS_PATH=str(tmp_path / "user_logs.db"),
+        ODDS_HISTORY_PATH=str(tmp_path / "odds_history.db"),
+        TRIVIA_DB_PATH=str(tmp_path / "trivia.db"),
+        RECONNECT_BACKOFF_BASE="0.2",
+    )
+    log = open(tmp_path / "bot.log", "w")
+    bot = subprocess.Popen([sys.executable, "-m", "src.main"], cwd=Path(__file__).resolve().parent.parent,
+                           env=env, stdout=log, stderr=subprocess.STDOUT)
+
+    def wait_for(condition, timeout=30):
+        deadline = time.monotonic() + timeout
+        while not condition():
+            assert bot.poll() is None, (tmp_path / "bot.log").read_text()
+            assert time.monotonic() < deadline, (tmp_path / "bot.log").read_text()
+            gevent.sleep(0.05)
+
+    try:
+        wait_for(lambda: joins)
+        server.disconnect(_NICK)
+        wait_for(lambda: len(joins) >= 2)
+        assert joins[1] is not joins[0]
+        # the new connection's Listener and Writer serve commands
+        server.say("alice", _CHANNEL, ".help")
+        wait_for(lambda: any(reply.startswith("alice: ") for reply in replies))
+    finally:
+        bot.send_signal(signal.SIGTERM)
+        try:
+            code = bot.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            bot.kill()
+            code = None
+        server.stop()
+        log.close()
+    assert code == 0, (tmp_path / "bot.log").read_text()
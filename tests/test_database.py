@@ -0,0 +1,28 @@
+"""Schema migrations apply all of a version or none of it."""
+import sqlite3
+
+import pytest
+
+from src.client.database import migrate
+
+
+def tables(conn):
+    return {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+
+def test_failed_migration_leaves_nothing_behind(tmp_path):
+    conn = sqlite3.connect(tmp_path / "test.db")
+    broken = (("CREATE TABLE a (x)", "INSERT INTO a VALUES (1)", "CREATE TABLE b (y"),)
+    with pytest.raises(sqlite3.OperationalError):
+        migrate(conn, broken, "test")
+    assert tables(conn) == set()
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == 0
+
+    fixed = (("CREATE TABLE a (x)", "INSERT INTO a VALUES (1)", "CREATE TABLE b (y)"),
+             ("CREATE INDEX b_y ON b (y)",))
+    assert migrate(conn, fixed, "test") == 2
+    assert tables(conn) == {"a", "b"}
+    assert conn.execute("SELECT x FROM a").fetchall() == [(1,)]
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == 2
+    assert conn.isolation_level == ""
+    conn.close()
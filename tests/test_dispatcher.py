@@ -0,0 +1,76 @@
+"""Which handlers the Dispatcher routes a channel line to."""
+from types import SimpleNamespace
+
+import pytest
+from gevent.queue import Queue
+from pydantic import SecretStr
+
+from src.client.dispatcher import Dispatcher
+
+
+class RecordingPool:
+    """Stands in for the FairPool and records the label of each handler run."""
+
+    def __init__(self):
+        self.labels = []
+
+    def spawn(self, key, func, handler, label, *args, **kwargs):
+        self.labels.append(label)
+
+
+def make_config(channel_commands):
+    secret = SecretStr("test")
+    return SimpleNamespace(
+        irc_nick="garybot",
+        irc_main_channel="#main",
+        channels=["#main", "#sports"],
+        irc_channel_commands=channel_commands,
+        irc_ignore_list="NickServ",
+        irc_admin_nick="",
+        dispatcher_pool_size=10,
+        convo_max_lines=50,
+        convo_max_bytes=0,
+        wolfram_api_key=secret,
+        nasa_api_key=secret,
+    )
+
+
+@pytest.fixture
+def dispatcher():
+    app_config = make_config({"#Sports": [".SB", "youtube"]})
+    actor = SimpleNamespace(inbox=Queue())
+    return Dispatcher(Queue(), actor, actor, None, app_config, pool=RecordingPool(),
+                      user_logs_db=None, http=None, llm=None, youtube=None, odds=None, metrics=None)
+
+
+def routed(dispatcher, channel, text):
+    dispatcher._pool.labels.clear()
+    dispatcher._dispatch(f":alice!~alice@example.com PRIVMSG {channel} :{text}")
+    return dispatcher._pool.labels
+
+
+def test_listed_channel_only_runs_its_commands(dispatcher):
+    assert routed(dispatcher, "#sports", ".sb nfl chiefs") == [".sb"]
+    assert routed(dispatcher, "#sports", ".spaghetti") == []
+    assert routed(dispatcher, "#sports", ".sbmove nfl chiefs") == []
+
+
+def test_listed_channel_only_runs_its_passive_triggers(dispatcher):
+    assert routed(dispatcher, "#sports", "https://youtu.be/dQw4w9WgXcQ") == ["youtube"]
+    assert routed(dispatcher, "#sports", "there is no reason to") == []
+
+
+def test_channel_and_command_names_ignore_case(dispatcher):
+    assert routed(dispatcher, "#SPORTS", ".SB nfl chiefs") == [".sb"]
+
+
+def test_unlisted_channel_runs_everything(dispatcher):
+    assert routed(dispatcher, "#main", ".spaghetti") == [".spaghetti"]
+    assert routed(dispatcher, "#main", "no reason to watch youtu.be/dQw4w9WgXcQ") == ["reason", "youtube"]
+
+
+def test_disabled_actor_command_is_not_queued(dispatcher):
+    routed(dispatcher, "#sports", ".tr")
+    assert dispatcher._inboxes["trivia"].empty()
+    routed(dispatcher, "#main", ".tr")
+    assert dispatcher._inboxes["trivia"].qsize() == 1
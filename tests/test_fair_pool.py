@@ -0,0 +1,88 @@
+"""FairPool capacity limits and turn-taking between keys."""
+import gevent
+from gevent.event import Event
+
+from src.client.fair_pool import FairPool
+
+
+def settle(pool):
+    """Let jobs run until nothing is running or waiting."""
+    with gevent.Timeout(2):
+        while pool.running() or pool.waiting():
+            gevent.sleep(0.001)
+
+
+def test_per_key_cap_leaves_room_for_other_keys():
+    pool = FairPool(size=4, per_key=2)
+    gate = Event()
+    for _ in range(3):
+        pool.spawn("#busy", gate.wait)
+    assert (pool.running(), pool.waiting()) == (2, 1)
+    assert pool.spawn("#quiet", gate.wait) is not None
+    assert (pool.running(), pool.waiting()) == (3, 1)
+    gate.set()
+    settle(pool)
+
+
+def test_size_caps_all_keys_together():
+    pool = FairPool(size=2)
+    gate = Event()
+    assert pool.spawn("#a", gate.wait) is not None
+    assert pool.spawn("#b", gate.wait) is not None
+    assert pool.spawn("#c", gate.wait) is None
+    assert (pool.running(), pool.waiting()) == (2, 1)
+    gate.set()
+    settle(pool)
+
+
+def test_waiting_keys_take_turns():
+    pool = FairPool(size=1)
+    started = []
+    for name in ("a1", "a2", "a3", "a4"):
+        pool.spawn("#a", started.append, name)
+    for name in ("b1", "b2"):
+        pool.spawn("#b", started.append, name)
+    settle(pool)
+    assert started == ["a1", "a2", "b1", "a3", "b2", "a4"]
+
+
+def test_key_jobs_stay_in_order_behind_queued_ones():
+    pool = FairPool(size=2, per_key=1)
+    gate = Event()
+    started = []
+    pool.spawn("#a", gate.wait)
+    pool.spawn("#a", started.append, "queued")
+    # a slot is free, but #a is at its cap, so its next job still waits
+    assert pool.waiting() == 1
+    gate.set()
+    settle(pool)
+    assert started == ["queued"]
+
+
+def test_key_at_its_cap_keeps_its_turn():
+    pool = FairPool(size=3, per_key=1)
+    gate_a, gate_b = Event(), Event()
+    started = []
+    pool.spawn("#a", gate_a.wait)
+    pool.spawn("#b", gate_b.wait)
+    pool.spawn("#a", started.append, "a2")
+    pool.spawn("#b", started.append, "b2")
+    gate_b.set()
+    gevent.sleep(0.01)
+    assert started == ["b2"]
+    gate_a.set()
+    settle(pool)
+    assert started == ["b2", "a2"]
+
+
+def test_full_queue_drops_new_jobs():
+    pool = FairPool(size=1, max_queued=2)
+    gate = Event()
+    started = []
+    pool.spawn("#a", gate.wait)
+    for name in ("1", "2", "3"):
+        pool.spawn("#a", started.append, name)
+    assert pool.waiting() == 2
+    gate.set()
+    settle(pool)
+    assert started == ["1", "2"]
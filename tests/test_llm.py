@@ -0,0 +1,80 @@
+"""LLMService prompt caching and its fallback to a plain system instruction."""
+from types import SimpleNamespace
+
+import pytest
+from google.genai import errors
+
+import src.channel_functions.llm as llm_module
+from src.channel_functions.llm import LLMService
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeClient:
+    """Records cache creations and requests; `cache_error` makes creation fail."""
+
+    def __init__(self, cache_error=None):
+        self.cache_error = cache_error
+        self.created = []
+        self.requests = []
+        self.caches = SimpleNamespace(create=self._create)
+        self.models = SimpleNamespace(generate_content=self._generate)
+
+    def _create(self, model, config):
+        if self.cache_error is not None:
+            raise self.cache_error
+        self.created.append(config.system_instruction)
+        return SimpleNamespace(name=f"cachedContents/{len(self.created)}")
+
+    def _generate(self, model, config, contents):
+        self.requests.append((config.cached_content, config.system_instruction, contents))
+        return "response"
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(llm_module.time, "monotonic", clock)
+    return clock
+
+
+def service(tmp_path, client):
+    path = tmp_path / "prompt"
+    path.write_text("You are {client_nick}.")
+    llm = LLMService("key", "model", path, "garybot")
+    llm._client = client
+    return llm
+
+
+def test_requests_refer_to_the_cache_and_send_only_the_conversation(tmp_path, clock):
+    client = FakeClient()
+    llm = service(tmp_path, client)
+    llm.generate("alice", "hi", "<bob> hello")
+    llm.generate("alice", "again", "<bob> hello\n<alice> hi")
+    assert client.created == ["You are garybot."]
+    assert client.requests == [
+        ("cachedContents/1", None, ["<bob> hello", "<alice> hi"]),
+        ("cachedContents/1", None, ["<bob> hello\n<alice> hi", "<alice> again"]),
+    ]
+    clock.now += LLMService._CACHE_TTL
+    llm.generate("alice", "later", "")
+    assert client.requests[-1][0] == "cachedContents/2"
+
+
+def test_prompt_is_sent_inline_when_it_cannot_be_cached(tmp_path, clock):
+    client = FakeClient(cache_error=errors.ClientError(400, {"error": {"message": "too small"}}))
+    llm = service(tmp_path, client)
+    llm.generate("alice", "hi", "<bob> hello")
+    llm.generate("alice", "hi", "<bob> hello")
+    assert client.requests[-1] == (None, "You are garybot.", ["<bob> hello", "<alice> hi"])
+    client.cache_error = None
+    assert not client.created
+    clock.now += LLMService._CACHE_RETRY
+    llm.generate("alice", "hi", "")
+    assert client.requests[-1][0] == "cachedContents/1"
@@ -0,0 +1,38 @@
+"""Metrics rendering of Writer totals across connections."""
+from types import SimpleNamespace
+
+from gevent.event import Event
+
+from src.client.metrics import Metrics
+
+
+def writer(lines, bytes_, flushes, most, requeued=0, dropped=0):
+    return SimpleNamespace(lines_sent=lines, bytes_sent=bytes_, flushes=flushes, max_lines_per_flush=most,
+                           lines_requeued=requeued, lines_dropped=dropped)
+
+
+def test_flush_stats_span_connections():
+    metrics = Metrics(Event())
+    metrics.track_writer(writer(lines=6, bytes_=600, flushes=2, most=5))
+    metrics.track_writer(writer(lines=2, bytes_=200, flushes=2, most=1))
+    assert metrics.writer_coalescing() == (2.0, 200.0, 5)
+    rendered = metrics.render().splitlines()
+    assert "garybot_writer_lines_per_flush 2.000" in rendered
+    assert "garybot_writer_bytes_per_flush 200.000" in rendered
+    assert "garybot_writer_max_lines_per_flush 5" in rendered
+    assert "2.0 lines/flush (max 5)" in metrics.summary()
+
+
+def test_flush_stats_before_any_send():
+    metrics = Metrics(Event())
+    assert metrics.writer_coalescing() == (0.0, 0.0, 0)
+    assert "garybot_writer_max_lines_per_flush 0" in metrics.render().splitlines()
+
+
+def test_failed_send_counts_span_connections():
+    metrics = Metrics(Event())
+    metrics.track_writer(writer(lines=1, bytes_=10, flushes=1, most=1, requeued=3, dropped=1))
+    metrics.track_writer(writer(lines=0, bytes_=0, flushes=0, most=0, requeued=2))
+    rendered = metrics.render().splitlines()
+    assert "garybot_writer_lines_requeued_total 5" in rendered
+    assert "garybot_writer_lines_dropped_total 1" in rendered
@@ -0,0 +1,170 @@
+"""Outbox ordering, fairness and flood pacing."""
+import pytest
+from gevent.event import Event
+from gevent.queue import Empty
+
+import src.client.outbox as outbox_module
+from src.client.outbox import ADMIN, PROTOCOL, REPLY, Outbox
+from src.client.tracing import TracedLine
+from src.client.writer import Writer
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(outbox_module.time, "monotonic", clock)
+    return clock
+
+
+def drain(outbox):
+    lines = []
+    while True:
+        try:
+            lines.append(outbox.get_nowait())
+        except Empty:
+            return lines
+
+
+def test_priority_order():
+    outbox = Outbox(burst=10)
+    outbox.put("PRIVMSG #a :reply")
+    outbox.put("PRIVMSG #a :admin", ADMIN)
+    outbox.put("PONG :server")
+    assert drain(outbox) == ["PONG :server", "PRIVMSG #a :admin", "PRIVMSG #a :reply"]
+
+
+def test_default_priority():
+    outbox = Outbox(burst=10)
+    outbox.put("JOIN #a")
+    outbox.put("PRIVMSG #a :hi")
+    assert outbox._queues[PROTOCOL] and outbox._queues[REPLY]
+
+
+def test_keys_take_turns():
+    outbox = Outbox(burst=10)
+    for n in range(3):
+        outbox.put(f"PRIVMSG #a :alice {n}", key="alice")
+    outbox.put("PRIVMSG #a :bob 0", key="bob")
+    outbox.put("PRIVMSG #a :bob 1", key="bob")
+    assert [line.split(":", 1)[1] for line in drain(outbox)] == [
+        "alice 0", "bob 0", "alice 1", "bob 1", "alice 2",
+    ]
+
+
+def test_key_defaults_to_target():
+    outbox = Outbox(burst=10)
+    outbox.put("PRIVMSG #a :1")
+    outbox.put("PRIVMSG #a :2")
+    outbox.put("PRIVMSG #b :3")
+    assert drain(outbox) == ["PRIVMSG #a :1", "PRIVMSG #b :3", "PRIVMSG #a :2"]
+
+
+def test_burst_then_rate(clock):
+    outbox = Outbox(burst=3, rate=2.0)
+    for n in range(6):
+        outbox.put(f"PRIVMSG #a :{n}")
+    assert len(drain(outbox)) == 3
+    clock.now += 0.4
+    assert drain(outbox) == []
+    clock.now += 0.1
+    assert drain(outbox) == ["PRIVMSG #a :3"]
+    clock.now += 10
+    assert drain(outbox) == ["PRIVMSG #a :4", "PRIVMSG #a :5"]
+
+
+def test_bucket_never_exceeds_burst(clock):
+    outbox = Outbox(burst=2, rate=1.0)
+    clock.now += 3600
+    for n in range(4):
+        outbox.put(f"PRIVMSG #a :{n}")
+    assert len(drain(outbox)) == 2
+
+
+def test_protocol_lines_skip_pacing(clock):
+    outbox = Outbox(burst=1, rate=1.0)
+    outbox.put("PRIVMSG #a :spent")
+    outbox.put("PRIVMSG #a :held")
+    assert drain(outbox) == ["PRIVMSG #a :spent"]
+    outbox.put("PONG :server")
+    assert drain(outbox) == ["PONG :server"]
+
+
+def test_get_waits_for_pacing():
+    outbox = Outbox(burst=1, rate=20.0)
+    outbox.put("PRIVMSG #a :1")
+    outbox.put("PRIVMSG #a :2")
+    outbox.get_nowait()
+    with pytest.raises(Empty):
+        outbox.get(timeout=0.01)
+    assert outbox.get(timeout=1) == "PRIVMSG #a :2"
+
+
+@pytest.mark.parametrize("text", ["word " * 600, "ключ " * 400, "日本語" * 500], ids=["ascii", "2-byte", "3-byte"])
+def test_long_line_is_split_like_the_writer(text):
+    line = f"PRIVMSG #a :{text}"
+    outbox = Outbox(burst=100)
+    outbox.put(line)
+    pieces = drain(outbox)
+    assert pieces == [framed[:-2].decode() for framed in Writer(None, None, None)._frame(line)]
+    assert len(pieces) > 1
+    assert all(len(piece.encode()) <= 510 and piece.startswith("PRIVMSG #a :") for piece in pieces)
+
+
+def test_long_line_is_paced_per_slice(clock):
+    outbox = Outbox(burst=2, rate=1.0)
+    outbox.put("PRIVMSG #a :" + "x" * 3000)
+    assert len(drain(outbox)) == 2
+    assert outbox.qsize() == 5
+    clock.now += 1
+    assert len(drain(outbox)) == 1
+
+
+def test_trace_goes_with_last_slice():
+    outbox = Outbox(burst=100)
+    span = object()
+    outbox.put(TracedLine("PRIVMSG #a :" + "x" * 1200, span))
+    pieces = drain(outbox)
+    assert [getattr(piece, "trace", None) for piece in pieces] == [None, None, span]
+
+
+def test_unencodable_line_is_left_whole():
+    outbox = Outbox(burst=100)
+    line = "PRIVMSG #a :\ud800" + "x" * 600
+    outbox.put(line)
+    assert drain(outbox) == [line]
+
+
+class BrokenSocket:
+    def sendall(self, payload):
+        raise OSError("connection reset")
+
+
+def test_failed_send_requeues_lines_in_order():
+    outbox = Outbox(burst=100)
+    outbox.put("PRIVMSG #a :1")
+    outbox.put("PONG :server")
+    outbox.put("PRIVMSG #b :2")
+    outbox.put("PRIVMSG #a :3")
+    stop = Event()
+    writer = Writer(BrokenSocket(), stop, outbox)
+    writer.start()
+    writer.join(timeout=2)
+    assert stop.is_set()
+    assert (writer.lines_requeued, writer.lines_dropped) == (3, 1)
+    outbox.put("PRIVMSG #c :new")
+    assert drain(outbox) == ["PRIVMSG #a :1", "PRIVMSG #b :2", "PRIVMSG #c :new", "PRIVMSG #a :3"]
+
+
+def test_requeue_drops_what_no_longer_fits():
+    outbox = Outbox(maxsize=2, burst=100)
+    outbox.put("PRIVMSG #a :queued")
+    assert outbox.requeue(["PRIVMSG #a :1", "PRIVMSG #a :2"]) == 1
+    assert drain(outbox) == ["PRIVMSG #a :2", "PRIVMSG #a :queued"]
@@ -0,0 +1,98 @@
+"""League-less `.sb` searches and ambiguous team names."""
+from types import SimpleNamespace
+
+from gevent.event import Event
+
+from src.channel_functions.sportsbook import SPORT_KEYS, OddsBook, _build_index, sportsbook
+
+
+def game(away, home, commence):
+    return {
+        'id': f"{away}-{home}-{commence}",
+        'away_team': away,
+        'home_team': home,
+        'commence_time': commence,
+        'bookmakers': [{'markets': [
+            {'key': 'h2h', 'outcomes': [{'name': away, 'price': 120}, {'name': home, 'price': -140}]},
+        ]}],
+    }
+
+
+LEAGUES = {
+    'nfl': [game('Kansas City Chiefs', 'Los Angeles Rams', '2026-10-18T20:25:00Z'),
+            game('Kansas City Chiefs', 'Denver Broncos', '2026-10-25T17:00:00Z'),
+            game('New York Giants', 'Philadelphia Eagles', '2026-10-19T17:00:00Z')],
+    'nba': [game('Los Angeles Lakers', 'Boston Celtics', '2026-10-19T23:30:00Z')],
+    'nhl': [game('Boston Bruins', 'Los Angeles Kings', '2026-10-20T23:00:00Z')],
+    'mlb': [game('San Francisco Giants', 'Los Angeles Dodgers', '2026-10-18T02:10:00Z')],
+    'cfb': [],
+}
+
+
+class FakeOddsBook:
+    """Serves fixed games, except for the leagues in `failing`, whose fetch
+    fails."""
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.requested = []
+
+    def get_many(self, leagues, hot=False):
+        self.requested.append((sorted(leagues), hot))
+        return {league: (LEAGUES[league], _build_index(LEAGUES[league]))
+                for league in leagues if league not in self.failing}
+
+
+def test_league_less_search_covers_every_league_at_once():
+    odds = FakeOddsBook()
+    assert sportsbook('alice', ['.sb', 'lakers'], odds).startswith('alice: Los Angeles Lakers @ Boston Celtics')
+    assert odds.requested == [(['cfb', 'mlb', 'nba', 'nfl', 'nhl'], False)]
+
+
+def test_name_in_two_leagues_is_ambiguous_whatever_is_cached():
+    reply = sportsbook('alice', ['.sb', 'giants'], FakeOddsBook())
+    assert 'San Francisco Giants' in reply and 'New York Giants' in reply
+
+
+def test_leagues_that_could_not_be_fetched_are_named():
+    reply = sportsbook('alice', ['.sb', 'giants'], FakeOddsBook(failing=['nfl', 'cfb']))
+    assert reply.startswith('alice: San Francisco Giants @ Los Angeles Dodgers')
+    assert reply.endswith("(couldn't search NFL, CFB)")
+    reply = sportsbook('alice', ['.sb', 'nobody'], FakeOddsBook(failing=['nhl']))
+    assert reply == "alice: No upcoming game found for 'nobody'. (couldn't search NHL)"
+
+
+def test_ambiguous_name_lists_the_teams():
+    odds = FakeOddsBook()
+    reply = sportsbook('alice', ['.sb', 'LA'], odds)
+    assert reply.startswith("alice: 'la' could be ")
+    for team in ('Los Angeles Rams', 'Los Angeles Lakers', 'Los Angeles Kings'):
+        assert team in reply
+
+
+def test_league_narrows_an_ambiguous_name():
+    odds = FakeOddsBook()
+    assert 'Los Angeles Lakers @' in sportsbook('alice', ['.sb', 'nba', 'los', 'angeles'], odds)
+    assert odds.requested == [(['nba'], True)]
+
+
+def test_one_team_with_several_games_gets_the_soonest():
+    odds = FakeOddsBook()
+    assert 'Chiefs @ Los Angeles Rams' in sportsbook('alice', ['.sb', 'kc'], odds)
+
+
+def test_partial_cache_still_finds_teams_in_uncached_leagues(monkeypatch):
+    config = SimpleNamespace(odds_api_key=SimpleNamespace(get_secret_value=lambda: 'key'))
+    odds = OddsBook(Event(), config, http=None)
+    by_sport_key = {sport_key: LEAGUES[league] for league, sport_key in SPORT_KEYS.items()}
+    fetched = []
+
+    def fetch(sport_key):
+        fetched.append(sport_key)
+        return by_sport_key[sport_key]
+
+    monkeypatch.setattr(odds, '_fetch', fetch)
+    odds.get('mlb')  # only MLB is cached
+    reply = sportsbook('alice', ['.sb', 'giants'], odds)
+    assert 'San Francisco Giants' in reply and 'New York Giants' in reply
+    assert sorted(fetched) == sorted(SPORT_KEYS.values())
@@ -0,0 +1,106 @@
+"""Scoreboard ranking, eviction and write-back across restarts."""
+import pytest
+
+from src.channel_functions.trivia import Scoreboard
+from src.client.database import Database
+
+
+class CountingDatabase(Database):
+    """Counts the statements run, so the answer path can be checked for I/O."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.calls = 0
+
+    def execute(self, *args, **kwargs):
+        self.calls += 1
+        return super().execute(*args, **kwargs)
+
+    def run(self, *args, **kwargs):
+        self.calls += 1
+        return super().run(*args, **kwargs)
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "trivia.db")
+
+
+def play(scoreboard, nick, asked, correct):
+    scoreboard.record(nick, asked=asked)
+    scoreboard.record(nick, correct=correct)
+
+
+def expected(stats):
+    """The leaderboard by brute force from `{nick: (asked, correct)}`."""
+    return sorted(((-c, a, nick.lower(), nick) for nick, (a, c) in stats.items() if a))
+
+
+def test_top_comes_from_memory_and_follows_record(path):
+    db = CountingDatabase(path, name="trivia")
+    scoreboard = Scoreboard(db)
+    scoreboard.migrate()
+    play(scoreboard, "alice", 4, 3)
+    play(scoreboard, "Bob", 2, 2)
+    play(scoreboard, "carol", 2, 2)
+    db.calls = 0
+    assert scoreboard.top(2) == [("alice", 4, 3), ("Bob", 2, 2)]
+    play(scoreboard, "carol", 1, 1)
+    assert scoreboard.top(5) == [("carol", 3, 3), ("alice", 4, 3), ("Bob", 2, 2)]
+    assert db.calls == 0
+    assert [scoreboard.rank(nick) for nick in ("alice", "bob", "carol")] == [2, 3, 1]
+    assert scoreboard.rank("dave") is None
+    scoreboard.close()
+
+
+def test_rank_is_exact_across_flushes_and_evictions(path):
+    scoreboard = Scoreboard(Database(path, name="trivia"))
+    scoreboard.migrate()
+    stats = {}
+    for i, (asked, correct) in enumerate([(3, 1), (5, 4), (2, 2), (4, 2), (6, 4), (1, 0)]):
+        play(scoreboard, f"p{i}", asked, correct)
+        stats[f"p{i}"] = (asked, correct)
+    scoreboard.flush()
+    assert scoreboard.evict(0) == 6
+    # unsaved changes for some players, stale rows in the database for them
+    for nick, (asked, correct) in [("p0", (3, 3)), ("p3", (2, 0)), ("p5", (1, 1))]:
+        play(scoreboard, nick, asked, correct)
+        stats[nick] = (stats[nick][0] + asked, stats[nick][1] + correct)
+    ranked = [entry[3] for entry in expected(stats)]
+    assert [scoreboard.rank(nick) for nick in ranked] == list(range(1, len(ranked) + 1))
+    assert [nick for nick, _, _ in scoreboard.top(6)] == ranked
+    scoreboard.close()
+
+
+def test_top_reloads_when_leaders_drop_out(path, monkeypatch):
+    monkeypatch.setattr(Scoreboard, "_TOP_KEEP", 2)
+    scoreboard = Scoreboard(Database(path, name="trivia"))
+    scoreboard.migrate()
+    play(scoreboard, "alice", 1, 1)
+    play(scoreboard, "bob", 2, 1)
+    play(scoreboard, "carol", 3, 1)
+    assert [nick for nick, _, _ in scoreboard.top(2)] == ["alice", "bob"]
+    scoreboard.flush()
+    scoreboard.evict(0)
+    play(scoreboard, "alice", 5, 0)
+    play(scoreboard, "bob", 5, 0)
+    assert [nick for nick, _, _ in scoreboard.top(2)] == ["carol", "alice"]
+    scoreboard.close()
+
+
+def test_flushed_scores_survive_a_restart(path):
+    scoreboard = Scoreboard(Database(path, name="trivia"))
+    scoreboard.migrate()
+    play(scoreboard, "alice", 2, 1)
+    play(scoreboard, "bob", 2, 2)
+    assert scoreboard.flush() == 2
+    assert scoreboard.flush() == 0
+    scoreboard.close()
+
+    scoreboard = Scoreboard(Database(path, name="trivia"))
+    scoreboard.migrate()
+    assert scoreboard.top(5) == [("bob", 2, 2), ("alice", 2, 1)]
+    play(scoreboard, "alice", 1, 1)
+    assert scoreboard.rank("alice") == 2
+    assert scoreboard.get("alice") == (3, 2)
+    scoreboard.close()
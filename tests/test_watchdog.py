@@ -0,0 +1,141 @@
+"""When the Watchdog restarts an actor, and when it leaves it alone."""
+import time
+
+import pytest
+from gevent.event import Event
+from gevent.queue import Queue
+
+from src.client.watchdog import Watchdog
+
+
+class FakeActor:
+    """Just the parts of an actor the Watchdog looks at."""
+
+    def __init__(self, heartbeat_age=0.0, queued=0, dead=False, started=True, inbox=None):
+        self.heartbeat = time.monotonic() - heartbeat_age
+        self.inbox = inbox if inbox is not None else Queue()
+        for n in range(queued):
+            self.inbox.put(n)
+        self.dead = dead
+        self.started = started
+        self.exception = None
+        self.killed = False
+        self.start_calls = 0
+
+    def ready(self):
+        return self.dead
+
+    def kill(self, block=True):
+        self.killed = True
+
+    def start(self):
+        self.start_calls += 1
+
+
+@pytest.fixture
+def stop_event():
+    return Event()
+
+
+@pytest.fixture
+def watchdog(stop_event):
+    return Watchdog(stop_event, stall_after=60)
+
+
+def replaced_by():
+    """A factory that builds a FakeActor around the failed actor's inbox."""
+    built = []
+
+    def factory(old):
+        built.append(FakeActor(inbox=old.inbox))
+        return built[-1]
+    return factory, built
+
+
+def test_dead_actor_is_replaced(watchdog):
+    actor = FakeActor(dead=True)
+    actor.exception = RuntimeError("boom")
+    factory, built = replaced_by()
+    watchdog.watch("logger", actor, factory)
+    watchdog._check("logger")
+    assert len(built) == 1
+    assert watchdog.actor("logger") is built[0]
+    assert built[0].inbox is actor.inbox
+    assert built[0].start_calls == 1
+    assert watchdog.restarts == {"logger": 1}
+    assert not actor.killed
+
+
+def test_stalled_actor_with_queued_work_is_killed_and_replaced(watchdog):
+    actor = FakeActor(heartbeat_age=120, queued=3)
+    factory, built = replaced_by()
+    watchdog.watch("trivia", actor, factory)
+    watchdog._check("trivia")
+    assert actor.killed
+    assert watchdog.actor("trivia") is built[0]
+    assert built[0].inbox.qsize() == 3
+    assert watchdog.restarts == {"trivia": 1}
+
+
+def test_idle_actor_is_left_alone(watchdog):
+    actor = FakeActor(heartbeat_age=120, queued=0)
+    factory, built = replaced_by()
+    watchdog.watch("trivia", actor, factory)
+    watchdog._check("trivia")
+    assert not built and not actor.killed
+    assert watchdog.actor("trivia") is actor
+    assert watchdog.restarts == {}
+
+
+def test_busy_actor_within_stall_limit_is_left_alone(watchdog):
+    actor = FakeActor(heartbeat_age=5, queued=10)
+    factory, built = replaced_by()
+    watchdog.watch("dispatcher", actor, factory)
+    watchdog._check("dispatcher")
+    assert not built and not actor.killed
+
+
+def test_unstarted_actor_is_left_alone(watchdog):
+    actor = FakeActor(heartbeat_age=120, queued=3, started=False)
+    factory, built = replaced_by()
+    watchdog.watch("logger", actor, factory)
+    watchdog._check("logger")
+    assert not built
+
+
+def test_factory_returning_none_stops_supervision(watchdog):
+    actor = FakeActor(heartbeat_age=120, queued=1)
+    recovered = []
+    watchdog.watch("writer", actor, recovered.append)
+    watchdog._check("writer")
+    assert recovered == [actor]
+    assert actor.killed
+    assert watchdog.actor("writer") is None
+    assert watchdog.restarts == {"writer": 1}
+
+
+def test_nothing_is_restarted_once_stopping(watchdog, stop_event):
+    actor = FakeActor(dead=True)
+    factory, built = replaced_by()
+    watchdog.watch("logger", actor, factory)
+    stop_event.set()
+    watchdog._check("logger")
+    assert not built
+    assert watchdog.restarts == {}
+
+
+def test_unwatched_actor_is_not_restarted(watchdog):
+    actor = FakeActor(dead=True)
+    factory, built = replaced_by()
+    watchdog.watch("writer", actor, factory)
+    watchdog.unwatch("writer", actor)
+    watchdog._check("writer")
+    assert not built
+    assert watchdog.actor("writer") is None
+
+
+def test_unwatch_ignores_a_newer_actor(watchdog):
+    old, new = FakeActor(), FakeActor()
+    watchdog.watch("writer", new, lambda _: None)
+    watchdog.unwatch("writer", old)
+    assert watchdog.actor("writer") is new
@@ -0,0 +1,83 @@
+"""YouTubeMetadata batching and request de-duplication."""
+import gevent
+import pytest
+from gevent.event import Event
+
+from src.channel_functions.youtube import YouTubeMetadata
+
+
+def item(video_id):
+    return {
+        "id": video_id,
+        "snippet": {"publishedAt": "2026-10-18T00:00:00Z", "title": f"Video {video_id}", "channelTitle": "chan"},
+        "contentDetails": {"duration": "PT3M"},
+        "statistics": {"viewCount": "10"},
+    }
+
+
+class FakeResponse:
+    def __init__(self, items, error=None):
+        self._items = items
+        self._error = error
+
+    def raise_for_status(self):
+        if self._error is not None:
+            raise self._error
+
+    def json(self):
+        return {"items": self._items}
+
+
+class FakeHttp:
+    """Answers video requests once `release` is set, recording the IDs asked for."""
+
+    def __init__(self, error=None):
+        self.release = Event()
+        self.requests = []
+        self.error = error
+
+    def get(self, url, params):
+        ids = params["id"].split(",")
+        self.requests.append(ids)
+        self.release.wait()
+        return FakeResponse([item(video_id) for video_id in ids if video_id != "missing0000"], self.error)
+
+
+def test_repeat_of_an_inflight_id_shares_its_request():
+    http = FakeHttp()
+    youtube = YouTubeMetadata("key", http, window=0.01)
+    first = gevent.spawn(youtube.lookup, ["aaaaaaaaaaa"])
+    gevent.sleep(0.05)  # the batch is sent and waiting on the API
+    assert http.requests == [["aaaaaaaaaaa"]]
+    second = gevent.spawn(youtube.lookup, ["aaaaaaaaaaa", "bbbbbbbbbbb"])
+    gevent.sleep(0.05)
+    assert http.requests == [["aaaaaaaaaaa"], ["bbbbbbbbbbb"]]
+    http.release.set()
+    gevent.joinall([first, second], timeout=2, raise_error=True)
+    assert list(first.value) == ["aaaaaaaaaaa"]
+    assert first.value["aaaaaaaaaaa"].startswith("[YouTube] Video aaaaaaaaaaa")
+    assert list(second.value) == ["aaaaaaaaaaa", "bbbbbbbbbbb"]
+    assert youtube.api_calls == 2
+
+
+def test_ids_are_batched_and_cached():
+    http = FakeHttp()
+    http.release.set()
+    youtube = YouTubeMetadata("key", http, window=0.01)
+    jobs = [gevent.spawn(youtube.lookup, [video_id]) for video_id in ("aaaaaaaaaaa", "missing0000")]
+    gevent.joinall(jobs, timeout=2, raise_error=True)
+    assert http.requests == [["aaaaaaaaaaa", "missing0000"]]
+    assert jobs[1].value == {"missing0000": None}
+    assert youtube.lookup(["aaaaaaaaaaa", "missing0000"]) == {**jobs[0].value, **jobs[1].value}
+    assert youtube.api_calls == 1 and youtube.hits == 2
+
+
+def test_failed_request_is_retried_by_the_next_lookup():
+    http = FakeHttp(error=OSError("down"))
+    http.release.set()
+    youtube = YouTubeMetadata("key", http, window=0.01)
+    with pytest.raises(OSError):
+        youtube.lookup(["aaaaaaaaaaa"])
+    http.error = None
+    assert youtube.lookup(["aaaaaaaaaaa"])["aaaaaaaaaaa"].startswith("[YouTube]")
+    assert youtube.api_calls == 2